@@ -0,0 +1,337 @@
+"""
+Columnar in-memory snapshot of firm, staff and sales data for analytics
+"""
+from typing import Dict, List, Any, Callable, Iterable, Optional, Sequence, Tuple, Union
+import logging
+import threading
+import time
+from datetime import date
+import numpy as np
+from config import config
+
+logger = logging.getLogger(__name__)
+
+FIRM_COLUMNS = "firm_id, firm_name, industry, founded_year, total_capital"
+STAFF_COLUMNS = "firm_id, salary, performance_score, department, role, hire_date"
+SALES_COLUMNS = ("sale_id, firm_id, sale_date, total_amount, quantity, product_id, "
+                 "territory, customer_segment")
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def encode_categories(values: Sequence[Optional[str]]) -> Tuple[np.ndarray, List[str]]:
+    """Dictionary-encode strings into compact integer codes (-1 for NULL)"""
+    lookup: Dict[str, int] = {}
+    codes = np.empty(len(values), dtype=np.int32)
+    for i, value in enumerate(values):
+        if value is None:
+            codes[i] = -1
+        else:
+            codes[i] = lookup.setdefault(value, len(lookup))
+    
+    categories = list(lookup)
+    return _shrink_codes(codes, categories), categories
+
+
+def to_days(values: Sequence[Optional[date]]) -> np.ndarray:
+    """Convert dates to int32 days since the epoch (NULL becomes the minimum int32)"""
+    missing = np.iinfo(np.int32).min
+    days = np.array([
+        missing if value is None else value.toordinal() - _EPOCH_ORDINAL
+        for value in values
+    ], dtype=np.int32)
+    return days
+
+
+def month_index(days: np.ndarray) -> np.ndarray:
+    """Convert epoch days to months since 1970-01"""
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int32)
+
+
+def date_to_day(value) -> int:
+    """Convert a date or ISO date string to epoch days"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return value.toordinal() - _EPOCH_ORDINAL
+
+
+def _shrink_codes(codes: np.ndarray, categories: List[str]) -> np.ndarray:
+    """Store category codes as int16 when the dictionary is small enough"""
+    if len(categories) < np.iinfo(np.int16).max:
+        return codes.astype(np.int16)
+    return codes
+
+
+def format_period(month: int) -> str:
+    """Format a month index as 'YYYY-MM' (same as DATE_FORMAT(.., '%Y-%m'))"""
+    return f"{1970 + month // 12:04d}-{month % 12 + 1:02d}"
+
+
+class SalesColumns:
+    """Growing column arrays for sales rows added in chunks
+    
+    Each chunk is converted to columns as it arrives and the arrays double
+    in capacity when full, so a streamed sales table is never held as a
+    list of row dicts. Strings are dictionary-encoded across chunks.
+    """
+    
+    DTYPES = {'sale_id': np.int32, 'firm_id': np.int64, 'day': np.int32, 'amount': np.float64,
+              'quantity': np.int32, 'product': np.int32, 'territory': np.int32, 'segment': np.int32}
+    
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self._arrays = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.DTYPES.items()}
+        self._territories: Dict[str, int] = {}
+        self._segments: Dict[str, int] = {}
+    
+    def _reserve(self, count: int):
+        capacity = len(self._arrays['sale_id'])
+        if self.size + count <= capacity:
+            return
+        capacity = max(capacity * 2, self.size + count)
+        for name, array in self._arrays.items():
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self._arrays[name] = grown
+    
+    def add(self, rows: Sequence[Dict[str, Any]]):
+        """Append a chunk of rows with the SALES_COLUMNS fields"""
+        count = len(rows)
+        self._reserve(count)
+        lo, hi = self.size, self.size + count
+        columns = self._arrays
+        territories, segments = self._territories, self._segments
+        columns['sale_id'][lo:hi] = [row['sale_id'] for row in rows]
+        columns['firm_id'][lo:hi] = [row['firm_id'] for row in rows]
+        columns['day'][lo:hi] = to_days([row['sale_date'] for row in rows])
+        columns['amount'][lo:hi] = [float(row['total_amount']) for row in rows]
+        columns['quantity'][lo:hi] = [row['quantity'] or 0 for row in rows]
+        columns['product'][lo:hi] = [-1 if row['product_id'] is None else row['product_id'] for row in rows]
+        columns['territory'][lo:hi] = [
+            -1 if row['territory'] is None else territories.setdefault(row['territory'], len(territories))
+            for row in rows]
+        columns['segment'][lo:hi] = [
+            -1 if row['customer_segment'] is None else segments.setdefault(row['customer_segment'], len(segments))
+            for row in rows]
+        self.size = hi
+    
+    def extend(self, chunks: Iterable[Sequence[Dict[str, Any]]]) -> 'SalesColumns':
+        """Append every chunk, e.g. from DatabaseConnector.stream_query"""
+        for rows in chunks:
+            self.add(rows)
+        return self
+    
+    def column(self, name: str) -> np.ndarray:
+        return self._arrays[name][:self.size]
+    
+    @property
+    def territory_categories(self) -> List[str]:
+        return list(self._territories)
+    
+    @property
+    def segment_categories(self) -> List[str]:
+        return list(self._segments)
+
+
+class AnalyticsSnapshot:
+    """Immutable columnar copy of the firm, staff and sales tables
+    
+    Strings are dictionary-encoded, dates are stored as epoch days and sales
+    are sorted by (firm, date) so per-firm and date-window aggregates are
+    array slices. Per-firm totals are precomputed at build time. Sales may
+    be given as rows or as SalesColumns built from streamed chunks.
+    """
+    
+    def __init__(self, firms: List[Dict[str, Any]], staff: List[Dict[str, Any]],
+                 sales: Union[List[Dict[str, Any]], SalesColumns]):
+        self.built_at = time.time()
+        
+        # Firms, ordered by firm_id
+        firms = sorted(firms, key=lambda row: row['firm_id'])
+        self.firm_ids = np.array([row['firm_id'] for row in firms], dtype=np.int64)
+        self.firm_names = [row['firm_name'] for row in firms]
+        self.firm_industry, self.industry_categories = encode_categories(
+            [row.get('industry') for row in firms])
+        self.firm_founded_year = np.array(
+            [row.get('founded_year') or 0 for row in firms], dtype=np.int32)
+        self.firm_total_capital = np.array(
+            [float(row.get('total_capital') or 0) for row in firms], dtype=np.float64)
+        self._firm_position = {int(firm_id): idx for idx, firm_id in enumerate(self.firm_ids)}
+        n_firms = len(self.firm_ids)
+        
+        # Staff
+        self.staff_firm = self._firm_positions([row['firm_id'] for row in staff])
+        self.staff_salary = np.array([float(row['salary'] or 0) for row in staff], dtype=np.float64)
+        self.staff_performance = np.array(
+            [float(row['performance_score'] or 0) for row in staff], dtype=np.float32)
+        self.staff_department, self.department_categories = encode_categories(
+            [row['department'] for row in staff])
+        self.staff_role, self.role_categories = encode_categories([row['role'] for row in staff])
+        self.staff_hire_day = to_days([row['hire_date'] for row in staff])
+        
+        # Sales, sorted by firm then date
+        if not isinstance(sales, SalesColumns):
+            sales = SalesColumns(len(sales)).extend([sales])
+        sales_firm = self._firm_positions_array(sales.column('firm_id'))
+        sales_day = sales.column('day')
+        order = np.lexsort((sales_day, sales_firm))
+        
+        self.sales_firm = sales_firm[order]
+        self.sales_day = sales_day[order]
+        self.sales_month = month_index(self.sales_day)
+        self.sales_id = sales.column('sale_id')[order]
+        self.sales_amount = sales.column('amount')[order]
+        self.sales_quantity = sales.column('quantity')[order]
+        self.sales_product = sales.column('product')[order]
+        self.territory_categories = sales.territory_categories
+        self.segment_categories = sales.segment_categories
+        self.sales_territory = _shrink_codes(sales.column('territory'), self.territory_categories)[order]
+        self.sales_segment = _shrink_codes(sales.column('segment'), self.segment_categories)[order]
+        
+        # Per-firm slices for O(log n) date-window lookups
+        self.firm_offsets = np.searchsorted(self.sales_firm, np.arange(n_firms + 1))
+        
+        # Precomputed per-firm totals (rows for unknown firms carry index -1 and are dropped)
+        known_staff = self.staff_firm >= 0
+        self.staff_count_by_firm = np.bincount(
+            self.staff_firm[known_staff], minlength=n_firms).astype(np.int64)
+        self.salary_by_firm = np.bincount(
+            self.staff_firm[known_staff], weights=self.staff_salary[known_staff], minlength=n_firms)
+        self.transactions_by_firm = np.diff(self.firm_offsets).astype(np.int64)
+        known_sales = self.sales_firm >= 0
+        self.revenue_by_firm_total = np.bincount(
+            self.sales_firm[known_sales], weights=self.sales_amount[known_sales], minlength=n_firms)
+        quantity_cumsum = np.concatenate(([0], np.cumsum(self.sales_quantity, dtype=np.int64)))
+        self.quantity_by_firm = quantity_cumsum[self.firm_offsets[1:]] - \
+            quantity_cumsum[self.firm_offsets[:-1]]
+    
+    def _firm_positions(self, firm_ids: Sequence[int]) -> np.ndarray:
+        """Map firm ids to row positions (-1 for firms missing from the firm table)"""
+        get = self._firm_position.get
+        return np.array([get(firm_id, -1) for firm_id in firm_ids], dtype=np.int32)
+    
+    def _firm_positions_array(self, firm_ids: np.ndarray) -> np.ndarray:
+        """Vectorized _firm_positions for an array of ids (firm_ids is sorted)"""
+        if not len(self.firm_ids):
+            return np.full(len(firm_ids), -1, dtype=np.int32)
+        positions = np.minimum(np.searchsorted(self.firm_ids, firm_ids), len(self.firm_ids) - 1)
+        return np.where(self.firm_ids[positions] == firm_ids, positions, -1).astype(np.int32)
+    
+    @property
+    def n_firms(self) -> int:
+        return len(self.firm_ids)
+    
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the column arrays"""
+        return sum(value.nbytes for value in vars(self).values() if isinstance(value, np.ndarray))
+    
+    def firm_index(self, firm_id: int) -> Optional[int]:
+        """Get the row position of a firm (None if not in the snapshot)"""
+        return self._firm_position.get(int(firm_id))
+    
+    def _window_bounds(self, idx: int, start_date=None, end_date=None) -> Tuple[int, int]:
+        lo, hi = int(self.firm_offsets[idx]), int(self.firm_offsets[idx + 1])
+        days = self.sales_day[lo:hi]
+        if start_date:
+            lo += int(np.searchsorted(days, date_to_day(start_date), side='left'))
+            days = self.sales_day[lo:hi]
+        if end_date:
+            hi = lo + int(np.searchsorted(days, date_to_day(end_date), side='right'))
+        return lo, hi
+    
+    def firm_revenue(self, firm_id: int, start_date=None, end_date=None) -> float:
+        """Total revenue of one firm, optionally within an inclusive date window"""
+        idx = self.firm_index(firm_id)
+        if idx is None:
+            return 0.0
+        if not start_date and not end_date:
+            return float(self.revenue_by_firm_total[idx])
+        lo, hi = self._window_bounds(idx, start_date, end_date)
+        return float(self.sales_amount[lo:hi].sum())
+    
+    def revenue_by_firm(self, start_date=None, end_date=None) -> np.ndarray:
+        """Revenue of every firm, optionally within an inclusive date window"""
+        if not start_date and not end_date:
+            return self.revenue_by_firm_total
+        mask = self.sales_firm >= 0
+        if start_date:
+            mask &= self.sales_day >= date_to_day(start_date)
+        if end_date:
+            mask &= self.sales_day <= date_to_day(end_date)
+        return np.bincount(self.sales_firm[mask], weights=self.sales_amount[mask],
+                           minlength=self.n_firms)
+    
+    def firm_metric(self, values: np.ndarray, firm_id: int, default=0):
+        """Look up a per-firm array value by firm id"""
+        idx = self.firm_index(firm_id)
+        return default if idx is None else values[idx].item()
+    
+    def firm_monthly_revenue(self, firm_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Months with sales and their revenue for one firm, in chronological order"""
+        idx = self.firm_index(firm_id)
+        if idx is None:
+            return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64)
+        lo, hi = int(self.firm_offsets[idx]), int(self.firm_offsets[idx + 1])
+        months, starts = np.unique(self.sales_month[lo:hi], return_index=True)
+        revenue = np.add.reduceat(self.sales_amount[lo:hi], starts) if hi > lo else np.empty(0)
+        return months, revenue
+    
+    def monthly_aggregates(self, start_date=None) -> Dict[str, np.ndarray]:
+        """Per (firm, month) transaction count and revenue for months with sales
+        
+        Rows are ordered by firm then month, like GROUP BY firm_id, period.
+        """
+        mask = self.sales_firm >= 0
+        if start_date:
+            mask &= self.sales_day >= date_to_day(start_date)
+        firm = self.sales_firm[mask]
+        month = self.sales_month[mask]
+        
+        # Sales are sorted by (firm, day), so (firm, month) groups are contiguous
+        boundaries = np.flatnonzero((np.diff(firm) != 0) | (np.diff(month) != 0)) + 1
+        starts = np.concatenate(([0], boundaries)) if len(firm) else np.empty(0, dtype=np.int64)
+        
+        return {
+            'firm_idx': firm[starts],
+            'month': month[starts],
+            'transaction_count': np.diff(np.append(starts, len(firm))),
+            'revenue': np.add.reduceat(self.sales_amount[mask], starts) if len(firm) else np.empty(0)
+        }
+
+
+class SnapshotManager:
+    """Holds the current snapshot and rebuilds it after the refresh interval
+    
+    Readers always get a complete snapshot; a rebuild swaps the reference
+    once the new snapshot is ready.
+    """
+    
+    def __init__(self, refresh_seconds: int = None):
+        self.refresh_seconds = config.SNAPSHOT_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._snapshot: Optional[AnalyticsSnapshot] = None
+        self._lock = threading.Lock()
+    
+    def is_stale(self) -> bool:
+        snapshot = self._snapshot
+        return snapshot is None or time.time() - snapshot.built_at > self.refresh_seconds
+    
+    def get(self, connection_factory: Callable) -> AnalyticsSnapshot:
+        """Get the current snapshot, rebuilding it first if stale"""
+        if self.is_stale():
+            with self._lock:
+                if self.is_stale():
+                    self.refresh(connection_factory)
+        return self._snapshot
+    
+    def refresh(self, connection_factory: Callable) -> AnalyticsSnapshot:
+        """Rebuild the snapshot from the database"""
+        from data_loader import DataLoader
+        
+        with connection_factory() as db:
+            snapshot = DataLoader(db).load_snapshot()
+        self._snapshot = snapshot
+        return snapshot
+
+
+snapshot_manager = SnapshotManager()
@@ -1,19 +1,33 @@
 """
 FastAPI application for Merger ROI Dashboard
 """
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Body
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional, List
+from fastapi.responses import StreamingResponse
+from typing import Optional, List, Dict, Any, Tuple
+from pydantic import BaseModel
+from datetime import date, datetime
+from decimal import Decimal
+import json
 import logging
 
 from config import config
-from database import get_db_connection
+from database import get_db_connection, get_pool
+from cache import result_cache, cache_stats
 from data_loader import DataLoader, DataValidator
+from pagination import InvalidCursorError
 from roi_calculator import ROICalculator
 from capital_analyzer import CapitalAnalyzer
 from bottleneck_detector import BottleneckDetector
 from resource_optimizer import ResourceOptimizer
 from merger_analyzer import MergerAnalyzer
+from merger_simulation import MergerSimulator
+from merger_scoring import score_pairs, score_batcher
+from model_registry import model_registry, ModelNotFoundError
+from summary_aggregator import running_summary
+from analytics_snapshot import snapshot_manager
+from bottleneck_stream import bottleneck_monitor
+from sales_cube import get_sales_cube
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -29,6 +43,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def start_background_monitors():
+    if config.BOTTLENECK_STREAM_ENABLED:
+        bottleneck_monitor.start(get_db_connection)
+
 @app.get("/")
 def root():
     return {"message": "Merger ROI Dashboard API", "version": "1.0.0"}
@@ -38,75 +57,439 @@ def health_check():
     """Health check endpoint"""
     try:
         with get_db_connection() as db:
-            db.execute_query("SELECT 1")
-        return {"status": "healthy", "database": "connected"}
+            db.execute_query("SELECT 1", cache=False)
+        return {"status": "healthy", "database": "connected", "pool": get_pool().stats()}
     except Exception as e:
-        return {"status": "unhealthy", "error": str(e)}
+        return {"status": "unhealthy", "error": str(e), "pool": get_pool().stats()}
 
 @app.get("/api/firms")
-def get_firms(limit: Optional[int] = Query(None, le=100)):
-    """Get all firms"""
+def get_firms(limit: Optional[int] = Query(None, le=100), cursor: Optional[str] = None,
+              page_size: Optional[int] = Query(None, ge=1, le=config.MAX_KEYSET_PAGE_SIZE)):
+    """Get all firms (keyset-paginated when cursor or page_size is given)"""
     try:
         with get_db_connection() as db:
             loader = DataLoader(db)
+            if cursor or page_size:
+                page = loader.load_firms_page(cursor=cursor, page_size=page_size)
+                return {"firms": page['items'], "count": len(page['items']),
+                        "next_cursor": page['next_cursor']}
             firms = loader.load_firms(limit=limit)
         return {"firms": firms, "count": len(firms)}
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/staff")
+def get_staff(firm_id: Optional[int] = None, cursor: Optional[str] = None,
+              page_size: Optional[int] = Query(None, ge=1, le=config.MAX_KEYSET_PAGE_SIZE)):
+    """Get a keyset-paginated page of staff"""
+    try:
+        with get_db_connection() as db:
+            loader = DataLoader(db)
+            page = loader.load_staff_page(firm_id=firm_id, cursor=cursor, page_size=page_size)
+        return {"staff": page['items'], "count": len(page['items']),
+                "next_cursor": page['next_cursor']}
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/sales")
+def get_sales(firm_id: Optional[int] = None, start_date: Optional[str] = None,
+              end_date: Optional[str] = None, cursor: Optional[str] = None,
+              page_size: Optional[int] = Query(None, ge=1, le=config.MAX_KEYSET_PAGE_SIZE)):
+    """Get a keyset-paginated page of sales"""
+    try:
+        with get_db_connection() as db:
+            loader = DataLoader(db)
+            page = loader.load_sales_page(firm_id=firm_id, start_date=start_date,
+                                          end_date=end_date, cursor=cursor,
+                                          page_size=page_size)
+        return {"sales": page['items'], "count": len(page['items']),
+                "next_cursor": page['next_cursor']}
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _json_default(value):
+    """Serialize MySQL column types that json does not handle natively"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class SaleRecord(BaseModel):
+    firm_id: int
+    sale_date: date
+    unit_price: float
+    quantity: int = 1
+    total_amount: Optional[float] = None
+    product_id: Optional[int] = None
+    product_name: Optional[str] = None
+    territory: Optional[str] = None
+    customer_segment: Optional[str] = None
+
+class SalesIngestRequest(BaseModel):
+    sales: List[SaleRecord]
+
+@app.post("/api/sales/ingest")
+def ingest_sales(request: SalesIngestRequest):
+    """Insert new sales and fold them into the live bottleneck monitor"""
+    if not request.sales or len(request.sales) > config.MAX_INGEST_ROWS:
+        raise HTTPException(status_code=400,
+                            detail=f"Provide between 1 and {config.MAX_INGEST_ROWS} sales")
+    future = [sale.sale_date for sale in request.sales if sale.sale_date > date.today()]
+    if future:
+        raise HTTPException(status_code=400, detail=f"sale_date is in the future: {min(future).isoformat()}")
+    
+    rows = [
+        (sale.firm_id, sale.product_id, sale.product_name, sale.sale_date, sale.quantity,
+         sale.unit_price, sale.total_amount if sale.total_amount is not None else sale.quantity * sale.unit_price,
+         sale.territory, sale.customer_segment)
+        for sale in request.sales
+    ]
+    try:
+        bottleneck_monitor.ensure_loaded(get_db_connection)
+        with get_db_connection() as db:
+            with running_summary.recording():
+                inserted = db.execute_many("""
+                    INSERT INTO sales (firm_id, product_id, product_name, sale_date, quantity,
+                                       unit_price, total_amount, territory, customer_segment)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, rows)
+                for row in rows:
+                    running_summary.record_sale(row[0], row[6])
+            applied = bottleneck_monitor.poll(db)
+        bottleneck_monitor.evaluate()
+        return {"inserted": inserted, "applied": applied,
+                "bottleneck_count": len(bottleneck_monitor.bottlenecks())}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/sales/export")
+def export_sales(firm_id: Optional[int] = None, start_date: Optional[str] = None,
+                 end_date: Optional[str] = None):
+    """Stream sales as newline-delimited JSON"""
+    def generate():
+        with get_db_connection() as db:
+            loader = DataLoader(db)
+            for chunk in loader.iter_sales(firm_id, start_date, end_date,
+                                           chunk_size=config.STREAM_CHUNK_SIZE):
+                yield "".join(json.dumps(row, default=_json_default) + "\n" for row in chunk)
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+ANALYTICS_TABLES = ('firm', 'staff', 'sales')
+
+def get_analytics_snapshot():
+    """Get the columnar snapshot when snapshot mode is enabled, else None"""
+    if not config.USE_ANALYTICS_SNAPSHOT:
+        return None
+    return snapshot_manager.get(get_db_connection)
+
 @app.get("/api/roi")
 def get_roi(firm_id: Optional[int] = None):
     """Get ROI metrics"""
-    try:
+    def compute():
+        snapshot = get_analytics_snapshot()
         with get_db_connection() as db:
-            calculator = ROICalculator(db)
+            calculator = ROICalculator(db, snapshot=snapshot)
             if firm_id:
-                roi = calculator.calculate_roi(firm_id)
-                return roi
-            else:
-                roi_list = calculator.calculate_all_firms_roi()
-                return {"roi_metrics": roi_list, "count": len(roi_list)}
+                return calculator.calculate_roi(firm_id)
+            roi_list = calculator.calculate_all_firms_roi()
+            return {"roi_metrics": roi_list, "count": len(roi_list)}
+    
+    try:
+        return result_cache.get_or_compute(('roi', firm_id), compute, ANALYTICS_TABLES)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class BulkFirmsRequest(BaseModel):
+    firm_ids: List[int]
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+
+def _bulk_firm_ids(request: BulkFirmsRequest) -> Tuple[int, ...]:
+    firm_ids = tuple(dict.fromkeys(request.firm_ids))
+    if not firm_ids or len(firm_ids) > config.BULK_MAX_FIRMS:
+        raise HTTPException(status_code=400, detail=f"Provide between 1 and {config.BULK_MAX_FIRMS} firm ids")
+    return firm_ids
+
+@app.post("/api/roi/bulk")
+def get_roi_bulk(request: BulkFirmsRequest):
+    """Get ROI metrics for many firms at once, keyed by firm_id"""
+    firm_ids = _bulk_firm_ids(request)
+    
+    def compute():
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            return ROICalculator(db, snapshot=snapshot).calculate_roi_bulk(
+                firm_ids, request.start_date, request.end_date)
+    
+    try:
+        key = ('roi_bulk', firm_ids, request.start_date, request.end_date)
+        return result_cache.get_or_compute(key, compute, ANALYTICS_TABLES)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/capital/productivity")
 def get_capital_productivity(firm_id: Optional[int] = None):
     """Get capital productivity metrics"""
-    try:
+    def compute():
+        snapshot = get_analytics_snapshot()
         with get_db_connection() as db:
-            analyzer = CapitalAnalyzer(db)
+            analyzer = CapitalAnalyzer(db, snapshot=snapshot)
             if firm_id:
-                metrics = analyzer.calculate_capital_productivity(firm_id)
-                return metrics
-            else:
-                aggregate = analyzer.calculate_aggregate_metrics()
-                outliers = analyzer.identify_productivity_outliers()
-                return {"aggregate": aggregate, "outliers": outliers}
+                return analyzer.calculate_capital_productivity(firm_id)
+            aggregate = analyzer.calculate_aggregate_metrics()
+            outliers = analyzer.identify_productivity_outliers()
+            return {"aggregate": aggregate, "outliers": outliers}
+    
+    try:
+        return result_cache.get_or_compute(('capital_productivity', firm_id), compute, ANALYTICS_TABLES)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/capital/productivity/bulk")
+def get_capital_productivity_bulk(request: BulkFirmsRequest):
+    """Get capital productivity for many firms at once, keyed by firm_id"""
+    firm_ids = _bulk_firm_ids(request)
+    
+    def compute():
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            return CapitalAnalyzer(db, snapshot=snapshot).calculate_productivity_bulk(
+                firm_ids, request.start_date, request.end_date)
+    
+    try:
+        key = ('capital_productivity_bulk', firm_ids, request.start_date, request.end_date)
+        return result_cache.get_or_compute(key, compute, ANALYTICS_TABLES)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/capital/efficiency/bulk")
+def get_staff_efficiency_bulk(request: BulkFirmsRequest):
+    """Get staff efficiency for many firms at once, keyed by firm_id"""
+    firm_ids = _bulk_firm_ids(request)
+    
+    def compute():
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            return CapitalAnalyzer(db, snapshot=snapshot).calculate_staff_efficiency_bulk(
+                firm_ids, request.start_date, request.end_date)
+    
+    try:
+        key = ('staff_efficiency_bulk', firm_ids, request.start_date, request.end_date)
+        return result_cache.get_or_compute(key, compute, ANALYTICS_TABLES)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/capital/outliers")
+def get_productivity_outliers(method: str = Query("mad", description="mad, iqr, percentile or band"),
+                              threshold: Optional[float] = Query(None, ge=0),
+                              start_date: Optional[str] = None, end_date: Optional[str] = None,
+                              limit: int = Query(100, ge=1, le=10000)):
+    """Get firms with unusual capital productivity using robust statistics"""
+    def compute():
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            analyzer = CapitalAnalyzer(db, snapshot=snapshot)
+            return analyzer.detect_productivity_outliers(method, threshold, start_date, end_date, limit)
+    
+    try:
+        key = ('productivity_outliers', method, threshold, start_date, end_date, limit)
+        return result_cache.get_or_compute(key, compute, ANALYTICS_TABLES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/capital/departments")
+def get_department_breakdown(firm_id: Optional[int] = None,
+                             level: str = Query("firm_department", description="firm_department, firm_role, firm_department_role, department or role")):
+    """Get salary mass, headcount, performance-weighted cost and attributed revenue per group"""
+    try:
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            rows = CapitalAnalyzer(db, snapshot=snapshot).calculate_department_breakdown(firm_id, level)
+        return {"level": level, "rows": rows, "count": len(rows)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/capital/departments/top")
+def get_top_departments(n: int = Query(10, ge=1, le=1000),
+                        metric: str = Query("productivity"),
+                        level: str = Query("firm_department"),
+                        min_headcount: int = Query(1, ge=0),
+                        department: Optional[str] = None,
+                        role: Optional[str] = None,
+                        ascending: bool = False):
+    """Get the most (or least) productive departments across the portfolio"""
+    try:
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            rows = CapitalAnalyzer(db, snapshot=snapshot).top_departments(
+                n, metric, level, min_headcount, department, role, ascending)
+        return {"metric": metric, "level": level, "rows": rows, "count": len(rows)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/bottlenecks")
 def get_bottlenecks():
     """Get identified bottlenecks"""
-    try:
+    def compute():
+        snapshot = get_analytics_snapshot()
         with get_db_connection() as db:
-            detector = BottleneckDetector(db)
+            detector = BottleneckDetector(db, snapshot=snapshot)
             bottlenecks = detector.detect_sales_bottlenecks()
         return {"bottlenecks": bottlenecks, "count": len(bottlenecks)}
+    
+    try:
+        return result_cache.get_or_compute(('bottlenecks',), compute, ('sales',))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/bottlenecks/live")
+def get_live_bottlenecks():
+    """Get bottlenecks from the incrementally maintained monitor"""
+    try:
+        bottleneck_monitor.ensure_loaded(get_db_connection)
+        if not bottleneck_monitor.stats()['poller_running']:
+            with get_db_connection() as db:
+                bottleneck_monitor.poll(db)
+        bottlenecks = bottleneck_monitor.bottlenecks()
+        return {"bottlenecks": bottlenecks, "count": len(bottlenecks),
+                "monitor": bottleneck_monitor.stats()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/bottlenecks/scan")
+def scan_bottlenecks(detectors: Optional[str] = Query(None, description="Comma-separated: zscore,cusum,trend,seasonal"),
+                     lookback_months: int = Query(config.BOTTLENECK_LOOKBACK_MONTHS, ge=3, le=120)):
+    """Run the statistical bottleneck detectors over all firms"""
+    selected = tuple(name.strip() for name in detectors.split(',') if name.strip()) if detectors else None
+    
+    def compute():
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            detector = BottleneckDetector(db, snapshot=snapshot)
+            bottlenecks = detector.detect_bottlenecks(detectors=selected, lookback_months=lookback_months)
+        return {"bottlenecks": bottlenecks, "count": len(bottlenecks)}
+    
+    try:
+        return result_cache.get_or_compute(('bottleneck_scan', selected, lookback_months), compute, ('sales',))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _cube_filters(firm_id: Optional[str], territory: Optional[str], customer_segment: Optional[str],
+                  product_id: Optional[str], start_period: Optional[str],
+                  end_period: Optional[str]) -> Dict[str, Any]:
+    """Parse comma-separated cube slice filters from query parameters"""
+    def split(value, cast=str):
+        return [cast(v.strip()) for v in value.split(',') if v.strip()] if value else None
+    
+    return {
+        'firm_id': split(firm_id, int),
+        'territory': split(territory),
+        'customer_segment': split(customer_segment),
+        'product_id': split(product_id, int),
+        'start_period': start_period,
+        'end_period': end_period
+    }
+
+@app.get("/api/cube/rollup")
+def cube_rollup(by: str = Query("territory", description="Comma-separated: firm_id,territory,customer_segment,product_id,period"),
+                firm_id: Optional[str] = None, territory: Optional[str] = None,
+                customer_segment: Optional[str] = None, product_id: Optional[str] = None,
+                start_period: Optional[str] = None, end_period: Optional[str] = None,
+                limit: int = Query(100, ge=1, le=10000)):
+    """Aggregate sales over any slice of the cached sales cube"""
+    try:
+        dims = [dim.strip() for dim in by.split(',') if dim.strip()]
+        filters = _cube_filters(firm_id, territory, customer_segment, product_id, start_period, end_period)
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            cube = get_sales_cube(db, snapshot)
+        rows = cube.rollup(dims, filters, limit)
+        return {"by": dims, "rows": rows, "count": len(rows), "cells": cube.n_cells}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/cube/bottlenecks")
+def cube_bottlenecks(by: str = Query("territory,customer_segment", description="Comma-separated grouping dimensions"),
+                     detectors: Optional[str] = Query(None, description="Comma-separated: zscore,cusum,trend,seasonal"),
+                     firm_id: Optional[str] = None, territory: Optional[str] = None,
+                     customer_segment: Optional[str] = None, product_id: Optional[str] = None,
+                     start_period: Optional[str] = None, end_period: Optional[str] = None):
+    """Run the bottleneck detectors per group of a sales cube slice"""
+    try:
+        dims = [dim.strip() for dim in by.split(',') if dim.strip()]
+        selected = [name.strip() for name in detectors.split(',') if name.strip()] if detectors else None
+        filters = _cube_filters(firm_id, territory, customer_segment, product_id, start_period, end_period)
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            cube = get_sales_cube(db, snapshot)
+        bottlenecks = cube.detect_bottlenecks(dims, filters, selected)
+        bottlenecks.sort(key=lambda b: b['impact'], reverse=True)
+        return {"by": dims, "bottlenecks": bottlenecks, "count": len(bottlenecks)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/resources/recommendations")
 def get_resource_recommendations():
     """Get resource allocation recommendations"""
-    try:
+    def compute():
+        snapshot = get_analytics_snapshot()
         with get_db_connection() as db:
-            optimizer = ResourceOptimizer(db)
+            optimizer = ResourceOptimizer(db, snapshot=snapshot)
             recommendations = optimizer.recommend_staff_reallocation()
         return {"recommendations": recommendations, "count": len(recommendations)}
+    
+    try:
+        return result_cache.get_or_compute(('resource_recommendations',), compute, ANALYTICS_TABLES)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/resources/plan")
+def get_resource_plan(headcount_budget: Optional[int] = Query(None, ge=0, description="Default: current headcount"),
+                      salary_budget: Optional[float] = Query(None, ge=0, description="Default: current salary total"),
+                      max_change: float = Query(config.RESOURCE_MAX_CHANGE, ge=0, le=1),
+                      min_return: float = Query(0.0, ge=0, description="Minimum annual revenue per salary dollar"),
+                      limit: int = Query(500, ge=1, le=100000)):
+    """Optimize staff allocation across firms and departments under budget constraints"""
+    def compute():
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            optimizer = ResourceOptimizer(db, snapshot=snapshot)
+            return optimizer.optimize_allocation(headcount_budget, salary_budget, max_change,
+                                                 min_return, limit=limit)
+    
+    try:
+        key = ('resource_plan', headcount_budget, salary_budget, max_change, min_return, limit)
+        return result_cache.get_or_compute(key, compute, ANALYTICS_TABLES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/cache/stats")
+def get_cache_stats():
+    """Get query and result cache statistics"""
+    return cache_stats()
+
 @app.post("/api/merger/analyze")
 def analyze_merger(firm_a_id: int, firm_b_id: int):
     """Analyze merger opportunity"""
@@ -118,32 +501,92 @@ def analyze_merger(firm_a_id: int, firm_b_id: int):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+class SimulationBatchRequest(BaseModel):
+    pairs: List[Tuple[int, int]]
+    n_draws: Optional[int] = None
+    seed: Optional[int] = None
+    assumptions: Optional[Dict[str, Dict[str, Any]]] = None
+
+@app.post("/api/merger/simulate")
+def simulate_merger(firm_a_id: int, firm_b_id: int,
+                    n_draws: int = Query(config.SIMULATION_DRAWS, ge=100, le=config.SIMULATION_MAX_DRAWS),
+                    seed: Optional[int] = None,
+                    assumptions: Optional[Dict[str, Dict[str, Any]]] = Body(None)):
+    """Monte Carlo simulation of a merger's ROI distribution"""
+    try:
+        with get_db_connection() as db:
+            simulator = MergerSimulator(db)
+            return simulator.simulate_merger(firm_a_id, firm_b_id, n_draws, seed, assumptions)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/merger/simulate/batch")
+def simulate_merger_batch(request: SimulationBatchRequest):
+    """Monte Carlo simulation for many merger pairs"""
+    n_draws = request.n_draws or config.SIMULATION_DRAWS
+    if not 100 <= n_draws <= config.SIMULATION_MAX_DRAWS:
+        raise HTTPException(status_code=400, detail="n_draws out of range")
+    if not request.pairs or len(request.pairs) > config.SIMULATION_MAX_PAIRS:
+        raise HTTPException(status_code=400,
+                            detail=f"Provide between 1 and {config.SIMULATION_MAX_PAIRS} pairs")
+    
+    try:
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            simulator = MergerSimulator(db, snapshot=snapshot)
+            results = simulator.simulate_batch(request.pairs, n_draws, request.seed, request.assumptions)
+        return {"simulations": results, "count": len(results)}
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class ScoreRequest(BaseModel):
+    pairs: List[Tuple[int, int]]
+    threshold: float = 0.5
+
+@app.post("/api/merger/score")
+def score_mergers(request: ScoreRequest):
+    """Score merger success probability for many pairs with the PSNN model"""
+    if not request.pairs or len(request.pairs) > config.SCORING_MAX_PAIRS:
+        raise HTTPException(status_code=400,
+                            detail=f"Provide between 1 and {config.SCORING_MAX_PAIRS} pairs")
+    
+    try:
+        snapshot = get_analytics_snapshot()
+        return score_pairs(get_db_connection, request.pairs, request.threshold, snapshot)
+    except ModelNotFoundError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/merger/score/stats")
+def get_score_stats():
+    """Get achieved scoring batch sizes and loaded model versions"""
+    return {"batcher": score_batcher.stats(), "models": model_registry.stats()}
+
+@app.get("/api/merger/screen")
+def screen_mergers(top_k: int = Query(20, ge=1, le=1000), per_firm_k: int = Query(3, ge=0, le=50)):
+    """Screen all firm pairs for the best merger candidates"""
+    def compute():
+        snapshot = get_analytics_snapshot()
+        with get_db_connection() as db:
+            analyzer = MergerAnalyzer(db, snapshot=snapshot)
+            return analyzer.screen_all_pairs(top_k=top_k, per_firm_k=per_firm_k)
+    
+    try:
+        return result_cache.get_or_compute(('merger_screen', top_k, per_firm_k), compute, ANALYTICS_TABLES)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/api/dashboard/summary")
 def get_dashboard_summary():
     """Get executive summary metrics"""
     try:
-        with get_db_connection() as db:
-            # Total revenue
-            revenue_query = "SELECT COALESCE(SUM(total_amount), 0) as total FROM sales"
-            total_revenue = db.execute_query(revenue_query)[0]['total']
-            
-            # Total firms
-            firms_query = "SELECT COUNT(*) as count FROM firm"
-            total_firms = db.execute_query(firms_query)[0]['count']
-            
-            # Total staff
-            staff_query = "SELECT COUNT(*) as count FROM staff"
-            total_staff = db.execute_query(staff_query)[0]['count']
-            
-            # Average ROI
-            calculator = ROICalculator(db)
-            avg_roi = calculator.calculate_average_roi()
-            
-        return {
-            "total_revenue": float(total_revenue),
-            "total_firms": int(total_firms),
-            "total_staff": int(total_staff),
-            "average_roi": avg_roi
-        }
+        return running_summary.get(get_db_connection)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
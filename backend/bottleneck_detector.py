@@ -1,33 +1,336 @@
 """
 Bottleneck detection using statistical analysis
 """
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Sequence, Tuple
 import logging
-from statistics import mean, stdev
+from datetime import date
+from statistics import mean
+import numpy as np
+from config import config
 from database import get_db_connection
+from analytics_snapshot import format_period
 
 logger = logging.getLogger(__name__)
 
+DETECTORS = ('zscore', 'cusum', 'trend', 'seasonal')
+
+# Expected false positives on 36 months of Gaussian noise: zscore and cusum
+# each flag about 0.9% of firms. The seasonal rate depends on volatility,
+# about 2% of firms at a 10% monthly coefficient of variation and 16% at 20%.
+DEFAULT_THRESHOLDS: Dict[str, float] = {
+    'min_months': 6,               # Observed months a firm needs before it is scored
+    'zscore_window': 12,           # Trailing months the latest months are compared against
+    'zscore_threshold': 3.0,       # Flag at z <= -threshold
+    'zscore_recent_months': 1,
+    'cusum_baseline_months': 12,   # Leading months that define the in-control level
+    'cusum_k': 1.0,                # Allowance, in baseline standard deviations
+    'cusum_h': 5.5,                # Decision interval
+    'cusum_recent_months': 3,      # Months averaged for the reported impact
+    'trend_months': 24,
+    'trend_threshold': 0.02,       # Flag a fitted decline of 2% of the mean per month
+    'trend_min_r2': 0.3,           # ...when the line explains at least this share of variance
+    'seasonal_months': 3,
+    'seasonal_threshold': 0.15     # Flag a 15% drop against the same months a year earlier
+}
+
+
+def month_of(value: date) -> int:
+    """Month index since 1970-01 (same as analytics_snapshot.month_index)"""
+    return (value.year - 1970) * 12 + value.month - 1
+
+
+def month_start(month: int) -> date:
+    return date(1970 + month // 12, month % 12 + 1, 1)
+
+
+def _masked_stats(X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Row-wise count, mean and std ignoring NaN (NaN where a row has no values)"""
+    observed = ~np.isnan(X)
+    count = observed.sum(axis=1)
+    values = np.where(observed, X, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mu = values.sum(axis=1) / count
+        var = np.where(observed, (X - mu[:, None]) ** 2, 0.0).sum(axis=1) / count
+    return count, mu, np.sqrt(var)
+
+
+def run_detectors(revenue: np.ndarray, thresholds: Dict[str, float] = None,
+                  detectors: Sequence[str] = DETECTORS) -> Dict[str, Dict[str, np.ndarray]]:
+    """Run the statistical detectors over a firm x month revenue matrix
+    
+    Rows are firms and columns consecutive months, oldest first. Months
+    before a firm's first sale are NaN; later months without sales are 0.
+    Every detector returns per-firm 'flag', 'score' and 'impact' (percent
+    decline) arrays plus the column it refers to in 'month'.
+    """
+    t = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    revenue = np.asarray(revenue, dtype=np.float64)
+    n_firms, n_months = revenue.shape
+    observed_months = (~np.isnan(revenue)).sum(axis=1)
+    eligible = observed_months >= t['min_months']
+    results = {}
+    
+    if 'zscore' in detectors:
+        window, recent = int(t['zscore_window']), int(t['zscore_recent_months'])
+        best_z = np.full(n_firms, np.inf)
+        best_month = np.full(n_firms, -1)
+        impact = np.zeros(n_firms)
+        for col in range(max(window, n_months - recent), n_months):
+            count, mu, sd = _masked_stats(revenue[:, col - window:col])
+            with np.errstate(invalid='ignore', divide='ignore'):
+                z = (revenue[:, col] - mu) / sd
+            valid = (count >= 2) & (sd > 0) & ~np.isnan(z)
+            better = valid & (z < best_z)
+            best_z[better] = z[better]
+            best_month[better] = col
+            impact[better] = (mu[better] - revenue[better, col]) / mu[better] * 100
+        flag = eligible & (best_z <= -t['zscore_threshold'])
+        results['zscore'] = {'flag': flag, 'score': np.where(np.isinf(best_z), np.nan, best_z),
+                             'impact': impact, 'month': best_month}
+    
+    if 'cusum' in detectors:
+        baseline = int(t['cusum_baseline_months'])
+        count, mu, sd = _masked_stats(revenue[:, :baseline])
+        valid = eligible & (count >= 3) & (sd > 0)
+        k, h = t['cusum_k'], t['cusum_h']
+        s = np.zeros(n_firms)
+        peak = np.zeros(n_firms)
+        alarm_month = np.full(n_firms, -1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for col in range(baseline, n_months):
+                z = np.where(valid, np.nan_to_num((revenue[:, col] - mu) / sd), 0.0)
+                s = np.maximum(0.0, s - z - k)
+                peak = np.maximum(peak, s)
+                alarm_month[(s > h) & (alarm_month < 0)] = col
+                alarm_month[s == 0] = -1  # Run ended; wait for the next one
+            recent = revenue[:, max(baseline, n_months - int(t['cusum_recent_months'])):]
+            recent_mu = _masked_stats(recent)[1]
+            impact = np.where(valid, (mu - recent_mu) / mu * 100, 0.0)
+        flag = valid & (s > h)
+        results['cusum'] = {'flag': flag, 'score': np.where(valid, peak, np.nan),
+                            'impact': np.nan_to_num(impact), 'month': alarm_month}
+    
+    if 'trend' in detectors:
+        span = min(int(t['trend_months']), n_months)
+        window = revenue[:, n_months - span:]
+        observed = ~np.isnan(window)
+        count = observed.sum(axis=1)
+        x = np.arange(span, dtype=np.float64)
+        values = np.where(observed, window, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x_bar = (observed * x).sum(axis=1) / count
+            y_bar = values.sum(axis=1) / count
+            dx = np.where(observed, x - x_bar[:, None], 0.0)
+            dy = np.where(observed, values - y_bar[:, None], 0.0)
+            sxx = (dx ** 2).sum(axis=1)
+            sxy = (dx * dy).sum(axis=1)
+            slope = sxy / sxx
+            relative = slope / y_bar
+            r2 = sxy ** 2 / (sxx * (dy ** 2).sum(axis=1))
+            
+            # Decline of the fitted line over the observed span, relative to its start
+            x_first = np.argmax(observed, axis=1)
+            fitted_start = y_bar + slope * (x_first - x_bar)
+            fitted_end = y_bar + slope * (span - 1 - x_bar)
+            impact = (fitted_start - fitted_end) / fitted_start * 100
+        valid = eligible & (count >= t['min_months']) & (y_bar > 0) & np.isfinite(relative)
+        flag = valid & (relative <= -t['trend_threshold']) & (r2 >= t['trend_min_r2'])
+        results['trend'] = {'flag': flag, 'score': np.where(valid, relative, np.nan),
+                            'impact': np.where(valid & (fitted_start > 0), np.clip(impact, 0, 100), 0.0),
+                            'month': np.full(n_firms, n_months - 1)}
+    
+    if 'seasonal' in detectors:
+        months = int(t['seasonal_months'])
+        if n_months >= 12 + months:
+            current = revenue[:, n_months - months:].sum(axis=1)
+            prior = revenue[:, n_months - 12 - months:n_months - 12].sum(axis=1)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                change = current / prior - 1
+            valid = eligible & (prior > 0) & np.isfinite(change)
+        else:
+            change = np.full(n_firms, np.nan)
+            valid = np.zeros(n_firms, dtype=bool)
+        flag = valid & (change <= -t['seasonal_threshold'])
+        results['seasonal'] = {'flag': flag, 'score': np.where(valid, change, np.nan),
+                               'impact': np.where(valid, -change * 100, 0.0),
+                               'month': np.full(n_firms, n_months - 1)}
+    
+    return results
+
+
+_FINDINGS = {
+    'zscore': ('revenue_anomaly', 'Revenue in {period} is {magnitude:.1f} standard deviations below the trailing average',
+               'Investigate the drop in monthly sales'),
+    'cusum': ('revenue_shift', 'Sustained downward shift in revenue detected since {period}',
+              'Review sales strategy and market conditions'),
+    'trend': ('sales_trend_decline', 'Revenue trending down {rate:.1f}% of average per month',
+              'Review sales strategy and market conditions'),
+    'seasonal': ('seasonal_decline', 'Revenue {impact:.1f}% below the same months last year',
+                 'Compare with seasonal plans and adjust sales targets')
+}
+
+
+def describe_findings(firm_ids: np.ndarray, first_month: int,
+                      results: Dict[str, Dict[str, np.ndarray]]) -> List[Dict[str, Any]]:
+    """Turn detector flags into bottleneck records (same shape as detect_sales_bottlenecks)"""
+    bottlenecks = []
+    for detector, result in results.items():
+        kind, template, recommendation = _FINDINGS[detector]
+        for idx in np.flatnonzero(result['flag']).tolist():
+            score = float(result['score'][idx])
+            impact = float(result['impact'][idx])
+            month = int(result['month'][idx])
+            bottlenecks.append({
+                'firm_id': int(firm_ids[idx]),
+                'type': kind,
+                'detector': detector,
+                'severity': 'high' if impact > 20 else 'medium',
+                'description': template.format(period=format_period(first_month + month),
+                                               magnitude=abs(score), impact=impact, rate=-score * 100),
+                'impact': impact,
+                'score': score,
+                'period': format_period(first_month + month),
+                'recommendation': recommendation
+            })
+    bottlenecks.sort(key=lambda b: b['impact'], reverse=True)
+    return bottlenecks
+
 class BottleneckDetector:
     """Detects workflow bottlenecks using statistical methods"""
     
-    def __init__(self, db):
+    def __init__(self, db, snapshot=None):
         self.db = db
+        self.snapshot = snapshot
     
-    def detect_sales_bottlenecks(self) -> List[Dict[str, Any]]:
-        """Detect bottlenecks in sales performance"""
+    def _load_monthly_rows(self) -> List[Dict[str, Any]]:
+        """Monthly transaction count and revenue per firm over the last 12 months
+        
+        The rollup table (USE_ROLLUP_TABLES) only has whole months, so it
+        includes all of the month 12 months ago rather than part of it.
+        """
+        if self.snapshot is not None:
+            today = date.today()
+            try:
+                since = today.replace(year=today.year - 1)
+            except ValueError:  # 29 February
+                since = today.replace(year=today.year - 1, day=28)
+            
+            monthly = self.snapshot.monthly_aggregates(start_date=since)
+            firm_ids = self.snapshot.firm_ids[monthly['firm_idx']]
+            return [
+                {
+                    'firm_id': firm_id,
+                    'period': format_period(month),
+                    'transaction_count': transaction_count,
+                    'revenue': revenue
+                }
+                for firm_id, month, transaction_count, revenue in zip(
+                    firm_ids.tolist(), monthly['month'].tolist(),
+                    monthly['transaction_count'].tolist(), monthly['revenue'].tolist()
+                )
+            ]
+        
         query = """
             SELECT 
                 firm_id,
-                DATE_FORMAT(sale_date, '%Y-%m') as period,
+                DATE_FORMAT(sale_date, '%%Y-%%m') as period,
                 COUNT(*) as transaction_count,
                 SUM(total_amount) as revenue
             FROM sales
             WHERE sale_date >= DATE_SUB(CURDATE(), INTERVAL 12 MONTH)
-            GROUP BY firm_id, DATE_FORMAT(sale_date, '%Y-%m')
+            GROUP BY firm_id, DATE_FORMAT(sale_date, '%%Y-%%m')
             ORDER BY firm_id, period
         """
-        results = self.db.execute_query(query)
+        if config.USE_ROLLUP_TABLES:
+            query = """
+                SELECT firm_id, period, transaction_count, total_revenue as revenue
+                FROM sales_monthly_rollup
+                WHERE period >= %s AND transaction_count > 0
+                ORDER BY firm_id, period
+            """
+            return self.db.execute_query(query, (format_period(month_of(date.today()) - 12),), cache=True)
+        return self.db.execute_query(query, cache=True)
+    
+    def load_revenue_matrix(self, lookback_months: int = None, include_current_month: bool = False,
+                            max_sale_id: int = None) -> Dict[str, Any]:
+        """Pivot monthly revenue into a dense firm x month matrix
+        
+        Months before a firm's first sale in the window are NaN and later
+        months without sales are 0. The in-progress month is left out
+        unless include_current_month is set. max_sale_id limits the
+        database path to sales up to a known high-water mark; without one
+        it reads the rollup table when USE_ROLLUP_TABLES is set.
+        """
+        lookback_months = lookback_months or config.BOTTLENECK_LOOKBACK_MONTHS
+        last_month = month_of(date.today()) - (0 if include_current_month else 1)
+        first_month = last_month - lookback_months + 1
+        
+        if self.snapshot is not None:
+            monthly = self.snapshot.monthly_aggregates(start_date=month_start(first_month))
+            keep = monthly['month'] <= last_month
+            firm_ids = self.snapshot.firm_ids
+            firm_pos = monthly['firm_idx'][keep].astype(np.int64)
+            months = monthly['month'][keep].astype(np.int64)
+            revenue = monthly['revenue'][keep]
+        else:
+            if config.USE_ROLLUP_TABLES and max_sale_id is None:
+                query = """
+                    SELECT firm_id, period, total_revenue as revenue
+                    FROM sales_monthly_rollup
+                    WHERE period >= %s AND period <= %s AND transaction_count > 0
+                """
+                params = [format_period(first_month), format_period(last_month)]
+            else:
+                query = """
+                    SELECT 
+                        firm_id,
+                        DATE_FORMAT(sale_date, '%%Y-%%m') as period,
+                        SUM(total_amount) as revenue
+                    FROM sales
+                    WHERE sale_date >= %s AND sale_date < %s{}
+                    GROUP BY firm_id, DATE_FORMAT(sale_date, '%%Y-%%m')
+                """
+                params = [month_start(first_month), month_start(last_month + 1)]
+                if max_sale_id is not None:
+                    params.append(max_sale_id)
+                query = query.format(" AND sale_id <= %s" if max_sale_id is not None else "")
+            rows = self.db.execute_query(query, tuple(params), cache=True)
+            firm_ids = np.array(sorted({row['firm_id'] for row in rows}), dtype=np.int64)
+            firm_pos = np.searchsorted(firm_ids, [row['firm_id'] for row in rows])
+            months = np.array([(int(row['period'][:4]) - 1970) * 12 + int(row['period'][5:7]) - 1
+                               for row in rows], dtype=np.int64)
+            revenue = np.array([float(row['revenue']) for row in rows], dtype=np.float64)
+        
+        matrix = np.zeros((len(firm_ids), lookback_months))
+        columns = months - first_month
+        matrix[firm_pos, columns] = revenue
+        
+        # Months before each firm's first sale in the window are unobserved
+        first_seen = np.full(len(firm_ids), lookback_months)
+        np.minimum.at(first_seen, firm_pos, columns)
+        matrix[np.arange(lookback_months)[None, :] < first_seen[:, None]] = np.nan
+        
+        return {'firm_ids': firm_ids, 'first_month': first_month, 'revenue': matrix}
+    
+    def detect_bottlenecks(self, detectors: Sequence[str] = None,
+                           thresholds: Dict[str, float] = None, lookback_months: int = None,
+                           include_current_month: bool = False) -> List[Dict[str, Any]]:
+        """Run the vectorized detectors over all firms at once"""
+        detectors = list(detectors or DETECTORS)
+        unknown = set(detectors) - set(DETECTORS)
+        if unknown:
+            raise ValueError(f"Unknown detectors: {sorted(unknown)}")
+        unknown = set(thresholds or {}) - set(DEFAULT_THRESHOLDS)
+        if unknown:
+            raise ValueError(f"Unknown thresholds: {sorted(unknown)}")
+        
+        data = self.load_revenue_matrix(lookback_months, include_current_month)
+        results = run_detectors(data['revenue'], thresholds, detectors)
+        return describe_findings(data['firm_ids'], data['first_month'], results)
+    
+    def detect_sales_bottlenecks(self) -> List[Dict[str, Any]]:
+        """Detect bottlenecks in sales performance"""
+        results = self._load_monthly_rows()
         
         # Group by firm
         firm_data = {}
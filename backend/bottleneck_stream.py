@@ -0,0 +1,318 @@
+"""
+Incremental bottleneck detection fed by new sales rows
+"""
+from typing import Dict, List, Any, Callable, Iterable, Optional, Sequence
+import calendar
+import logging
+import threading
+import time
+from datetime import date
+import numpy as np
+from config import config
+from bottleneck_detector import (BottleneckDetector, DETECTORS, run_detectors,
+                                 describe_findings, month_of, month_start)
+
+logger = logging.getLogger(__name__)
+
+NEW_SALES_QUERY = """
+    SELECT sale_id, firm_id, sale_date, total_amount
+    FROM sales
+    WHERE sale_id > %s
+    ORDER BY sale_id
+    LIMIT %s
+"""
+
+WINDOW_IDS_QUERY = """
+    SELECT sale_id
+    FROM sales
+    WHERE sale_id > %s AND sale_id <= %s
+"""
+
+
+def _as_date(value) -> date:
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if hasattr(value, 'date') and callable(value.date):
+        return value.date()
+    return value
+
+
+class BottleneckMonitor:
+    """Keeps per-firm rolling monthly revenue windows current from new sales
+    
+    The window holds ``lookback_months`` completed months plus the month in
+    progress. Sales arrive through ``apply_sales`` (e.g. after an ingest)
+    or ``poll``, which reads rows past the sale_id high-water mark. Only
+    firms whose windows changed are re-evaluated, and the current
+    bottleneck list is kept ready to serve.
+    
+    Detectors see the completed months, or, once ``project_after_days``
+    days of the current month have passed, the current month's revenue
+    projected to a full month in place of the oldest month.
+    
+    Inserts can commit out of sale_id order, so each poll re-reads the
+    last ``poll_lag_ids`` ids below the high-water mark and applies the
+    ones not seen yet. Rows committing later than that are picked up by
+    the full reload every ``reload_seconds``.
+    """
+    
+    def __init__(self, lookback_months: int = None, thresholds: Dict[str, float] = None,
+                 detectors: Sequence[str] = None, project_after_days: Optional[int] = None,
+                 poll_lag_ids: int = None, reload_seconds: float = None):
+        self.lookback_months = lookback_months or config.BOTTLENECK_LOOKBACK_MONTHS
+        self.thresholds = thresholds
+        self.detectors = tuple(detectors or DETECTORS)
+        self.project_after_days = config.BOTTLENECK_PROJECT_AFTER_DAYS \
+            if project_after_days is None else project_after_days
+        self.poll_lag_ids = config.BOTTLENECK_POLL_LAG_IDS if poll_lag_ids is None else poll_lag_ids
+        self.reload_seconds = config.BOTTLENECK_RELOAD_SECONDS if reload_seconds is None else reload_seconds
+        self._lock = threading.RLock()
+        self._poll_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._reset()
+    
+    def _reset(self):
+        self._revenue = np.empty((0, self.lookback_months + 1))
+        self._firm_ids: List[int] = []
+        self._row: Dict[int, int] = {}
+        self._first_month = month_of(date.today()) - self.lookback_months
+        self._high_water = 0
+        self._floor = 0  # Ids at or below this are never re-read
+        self._seen: set = set()  # Applied ids above the floor
+        self._dirty: set = set()
+        self._findings: Dict[int, List[Dict[str, Any]]] = {}
+        self._bottlenecks: List[Dict[str, Any]] = []
+        self._eval_key = None
+        self._loaded_at: Optional[float] = None
+        self._stats = {
+            'sales_applied': 0,
+            'sales_skipped': 0,
+            'future_sales': 0,
+            'late_sales': 0,
+            'reloads': 0,
+            'polls': 0,
+            'evaluations': 0,
+            'last_evaluated_firms': 0,
+            'last_evaluation_ms': 0.0
+        }
+    
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+    
+    def load(self, db):
+        """Rebuild the windows from the database and set the high-water mark"""
+        high_water = db.execute_query("SELECT COALESCE(MAX(sale_id), 0) as max_id FROM sales",
+                                      cache=False)[0]['max_id']
+        data = BottleneckDetector(db).load_revenue_matrix(
+            self.lookback_months + 1, include_current_month=True, max_sale_id=high_water)
+        floor = max(int(high_water) - self.poll_lag_ids, 0)
+        seen = {row['sale_id'] for row in db.execute_query(WINDOW_IDS_QUERY, (floor, high_water), cache=False)}
+        
+        with self._lock:
+            reloads = self._stats['reloads'] + (1 if self.loaded else 0)
+            self._reset()
+            self._stats['reloads'] = reloads
+            self._revenue = data['revenue']
+            self._firm_ids = data['firm_ids'].tolist()
+            self._row = {firm_id: idx for idx, firm_id in enumerate(self._firm_ids)}
+            self._first_month = data['first_month']
+            self._high_water = int(high_water)
+            self._floor = floor
+            self._seen = seen
+            self._dirty = set(range(len(self._firm_ids)))
+            self._loaded_at = time.time()
+            self.evaluate()
+        
+        logger.info(f"Loaded bottleneck windows for {len(self._firm_ids)} firms "
+                    f"up to sale_id {self._high_water}")
+    
+    def _reload_due(self) -> bool:
+        return not self.loaded or (self.reload_seconds > 0 and
+                                   time.time() - self._loaded_at > self.reload_seconds)
+    
+    def ensure_loaded(self, connection_factory: Callable):
+        """Load the windows on first use, and reload them once reload_seconds have passed"""
+        if self._reload_due():
+            with self._poll_lock:
+                if self._reload_due():
+                    with connection_factory() as db:
+                        self.load(db)
+    
+    def _roll_to(self, month: int):
+        """Advance the window so ``month`` is its last column"""
+        last_month = self._first_month + self.lookback_months
+        shift = month - last_month
+        if shift <= 0:
+            return
+        active = ~np.isnan(self._revenue).all(axis=1)
+        if shift > self.lookback_months:
+            self._revenue[:] = np.nan
+        else:
+            self._revenue[:, :-shift] = self._revenue[:, shift:]
+            self._revenue[:, -shift:] = np.nan
+        # Firms with sales still in the window get 0 revenue for the new months
+        self._revenue[np.ix_(active, np.arange(self._revenue.shape[1] - shift, self._revenue.shape[1]))] = 0.0
+        self._first_month += shift
+        self._dirty.update(range(len(self._firm_ids)))
+    
+    def _firm_row(self, firm_id: int) -> int:
+        idx = self._row.get(firm_id)
+        if idx is None:
+            idx = len(self._firm_ids)
+            self._firm_ids.append(firm_id)
+            self._row[firm_id] = idx
+            row = np.full((1, self._revenue.shape[1]), np.nan)
+            self._revenue = np.vstack([self._revenue, row])
+        return idx
+    
+    def apply_sales(self, sales: Iterable[Dict[str, Any]]) -> int:
+        """Fold sales rows (sale_id, firm_id, sale_date, total_amount) into the windows
+        
+        Rows already applied (or loaded) are skipped, so the same rows can
+        be delivered more than once; ids at or below the re-read floor are
+        assumed counted. Rows without a sale_id are always applied; newly
+        inserted rows should go through poll so they are not counted twice.
+        Rows dated after the current month are skipped and counted under
+        'future_sales', so they cannot roll the window forward.
+        """
+        applied = 0
+        with self._lock:
+            self._roll_to(month_of(date.today()))
+            for sale in sales:
+                sale_id = sale.get('sale_id')
+                if sale_id is not None:
+                    if sale_id <= self._floor or sale_id in self._seen:
+                        continue
+                    self._seen.add(sale_id)
+                    if sale_id < self._high_water:
+                        self._stats['late_sales'] += 1
+                col = month_of(_as_date(sale['sale_date'])) - self._first_month
+                if col > self.lookback_months:
+                    self._stats['future_sales'] += 1
+                elif col < 0:
+                    self._stats['sales_skipped'] += 1
+                else:
+                    idx = self._firm_row(sale['firm_id'])
+                    row = self._revenue[idx]
+                    if np.isnan(row[col]):
+                        # Earlier first sale: the months up to the old first sale become 0
+                        observed = np.flatnonzero(~np.isnan(row))
+                        end = observed[0] if len(observed) else len(row)
+                        row[col:end] = 0.0
+                    row[col] += float(sale['total_amount'])
+                    self._dirty.add(idx)
+                    applied += 1
+                if sale_id is not None:
+                    self._high_water = max(self._high_water, int(sale_id))
+            self._stats['sales_applied'] += applied
+            floor = self._high_water - self.poll_lag_ids
+            if floor > self._floor:
+                self._floor = floor
+                self._seen = {sale_id for sale_id in self._seen if sale_id > floor}
+        return applied
+    
+    def poll(self, db, batch_size: int = None) -> int:
+        """Apply sales inserted since the high-water mark, or committed late below it"""
+        batch_size = batch_size or config.STREAM_CHUNK_SIZE
+        applied = 0
+        with self._poll_lock:
+            after = self._floor
+            while True:
+                rows = db.execute_query(NEW_SALES_QUERY, (after, batch_size), cache=False)
+                applied += self.apply_sales(rows)
+                if len(rows) < batch_size:
+                    break
+                after = rows[-1]['sale_id']
+            self._stats['polls'] += 1
+        return applied
+    
+    def _evaluation_view(self):
+        """Columns the detectors see, and the month index of the first one"""
+        today = date.today()
+        project = self.project_after_days is not None and today.day >= self.project_after_days
+        if not project:
+            return self._revenue[:, :-1], self._first_month, False
+        
+        view = self._revenue[:, 1:].copy()
+        days_in_month = calendar.monthrange(today.year, today.month)[1]
+        view[:, -1] *= days_in_month / today.day
+        return view, self._first_month + 1, True
+    
+    def evaluate(self) -> int:
+        """Re-run the detectors for firms whose windows changed"""
+        with self._lock:
+            self._roll_to(month_of(date.today()))
+            view, first_month, projected = self._evaluation_view()
+            eval_key = (first_month, projected)
+            if eval_key != self._eval_key:
+                self._dirty.update(range(len(self._firm_ids)))
+                self._eval_key = eval_key
+            if not self._dirty:
+                return 0
+            
+            started = time.perf_counter()
+            rows = np.fromiter(sorted(self._dirty), dtype=np.int64)
+            firm_ids = np.array(self._firm_ids, dtype=np.int64)[rows]
+            results = run_detectors(view[rows], self.thresholds, self.detectors)
+            
+            for firm_id in firm_ids.tolist():
+                self._findings.pop(firm_id, None)
+            for finding in describe_findings(firm_ids, first_month, results):
+                if projected:
+                    finding['projected'] = True
+                self._findings.setdefault(finding['firm_id'], []).append(finding)
+            
+            self._bottlenecks = sorted((f for findings in self._findings.values() for f in findings),
+                                       key=lambda b: b['impact'], reverse=True)
+            self._dirty.clear()
+            self._stats['evaluations'] += 1
+            self._stats['last_evaluated_firms'] = len(rows)
+            self._stats['last_evaluation_ms'] = (time.perf_counter() - started) * 1000
+            return len(rows)
+    
+    def bottlenecks(self) -> List[Dict[str, Any]]:
+        """Current bottleneck list (re-evaluating changed firms first)"""
+        self.evaluate()
+        return self._bottlenecks
+    
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                **self._stats,
+                'firms': len(self._firm_ids),
+                'high_water_sale_id': self._high_water,
+                'reread_floor_sale_id': self._floor,
+                'pending_firms': len(self._dirty),
+                'window_start': month_start(self._first_month).isoformat(),
+                'loaded_at': self._loaded_at,
+                'poller_running': self._thread is not None and self._thread.is_alive()
+            }
+    
+    def start(self, connection_factory: Callable, interval: float = None):
+        """Poll for new sales in a background thread"""
+        interval = interval or config.BOTTLENECK_POLL_SECONDS
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.ensure_loaded(connection_factory)
+                    with connection_factory() as db:
+                        self.poll(db)
+                    self.evaluate()
+                except Exception as e:
+                    logger.error(f"Bottleneck poll failed: {e}")
+                self._stop.wait(interval)
+        
+        self._thread = threading.Thread(target=run, name='bottleneck-poller', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+
+
+bottleneck_monitor = BottleneckMonitor()
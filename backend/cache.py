@@ -0,0 +1,164 @@
+"""
+Bounded LRU + TTL cache for query and analytics results
+"""
+from typing import Dict, Any, Callable, Hashable, Iterable, Set, Tuple
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from config import config
+
+logger = logging.getLogger(__name__)
+
+_READ_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+`?(\w+)`?', re.IGNORECASE)
+_WRITE_TABLES = re.compile(
+    r'^\s*(?:INSERT(?:\s+IGNORE)?\s+INTO|REPLACE\s+INTO|UPDATE|DELETE\s+FROM|TRUNCATE(?:\s+TABLE)?)\s+`?(\w+)`?',
+    re.IGNORECASE
+)
+
+# Tables maintained by triggers on another table (see database/schema.sql)
+DERIVED_TABLES: Dict[str, Tuple[str, ...]] = {
+    'sales': ('sales_monthly_rollup',),
+    'staff': ('firm_staff_totals',)
+}
+
+
+def tables_read(query: str) -> Set[str]:
+    """Extract the tables a SELECT statement reads from"""
+    return {name.lower() for name in _READ_TABLES.findall(query)}
+
+
+def tables_written(query: str) -> Set[str]:
+    """Extract the table an INSERT/UPDATE/DELETE statement writes to (plus trigger-maintained tables)"""
+    tables = {name.lower() for name in _WRITE_TABLES.findall(query)}
+    for table in list(tables):
+        tables.update(DERIVED_TABLES.get(table, ()))
+    return tables
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a TTL
+    
+    Each entry is tagged with the tables it was derived from so writes can
+    invalidate exactly the affected entries. Cached values are shared
+    between callers and must be treated as read-only.
+    """
+    
+    def __init__(self, max_entries: int = None, ttl: float = None, enabled: bool = None):
+        self.enabled = config.CACHE_ENABLED if enabled is None else enabled
+        self.max_entries = config.CACHE_MAX_ENTRIES if max_entries is None else max_entries
+        self.ttl = config.CACHE_TTL_SECONDS if ttl is None else ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, frozenset]]" = OrderedDict()
+        self._by_table: Dict[str, Set[Hashable]] = {}
+        self._counters = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0
+        }
+    
+    def _remove(self, key: Hashable):
+        _, _, tables = self._entries.pop(key)
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a cached value, counting hits and misses"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._counters['misses'] += 1
+                return default
+            if entry[0] < time.monotonic():
+                self._remove(key)
+                self._counters['expirations'] += 1
+                self._counters['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry[1]
+    
+    def set(self, key: Hashable, value: Any, tables: Iterable[str] = (), ttl: float = None):
+        """Store a value tagged with the tables it depends on"""
+        tables = frozenset(table.lower() for table in tables)
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, value, tables)
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._counters['evictions'] += 1
+    
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any],
+                       tables: Iterable[str] = (), ttl: float = None) -> Any:
+        """Return the cached value for key, computing and storing it on a miss"""
+        if not self.enabled:
+            return compute()
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = compute()
+            self.set(key, value, tables, ttl)
+        return value
+    
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Drop every entry derived from any of the given tables"""
+        removed = 0
+        with self._lock:
+            for table in tables:
+                for key in list(self._by_table.get(table.lower(), ())):
+                    if key in self._entries:
+                        self._remove(key)
+                        removed += 1
+            self._counters['invalidations'] += removed
+        return removed
+    
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hit_rate': self._counters['hits'] / lookups if lookups else 0.0,
+                **self._counters
+            }
+
+
+query_cache = TTLCache()
+result_cache = TTLCache()
+
+
+def invalidate_tables(tables: Iterable[str]) -> int:
+    """Invalidate query and result cache entries for the given tables"""
+    tables = list(tables)
+    return query_cache.invalidate_tables(tables) + result_cache.invalidate_tables(tables)
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Get statistics for all caches"""
+    return {
+        'enabled': config.CACHE_ENABLED,
+        'query_cache': query_cache.stats(),
+        'result_cache': result_cache.stats()
+    }
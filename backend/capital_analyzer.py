@@ -1,20 +1,295 @@
 """
 Capital measurement and productivity analysis
 """
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Sequence, Tuple
 import logging
+import numpy as np
 from database import get_db_connection
+from cache import result_cache
+from analytics_snapshot import encode_categories, date_to_day
 
 logger = logging.getLogger(__name__)
 
+BREAKDOWN_LEVELS: Dict[str, Tuple[str, ...]] = {
+    'firm_department': ('firm', 'department'),
+    'firm_role': ('firm', 'role'),
+    'firm_department_role': ('firm', 'department', 'role'),
+    'department': ('department',),
+    'role': ('role',)
+}
+BREAKDOWN_METRICS = ('headcount', 'salary_mass', 'attributed_revenue', 'revenue_per_employee',
+                     'productivity', 'avg_performance', 'performance_weighted_cost')
+
+STAFF_GROUP_QUERY = """
+    SELECT
+        firm_id,
+        department,
+        role,
+        COUNT(*) as headcount,
+        COALESCE(SUM(salary), 0) as salary_mass,
+        COALESCE(SUM(performance_score), 0) as performance_sum,
+        COALESCE(SUM(salary * performance_score), 0) as performance_salary
+    FROM staff
+    GROUP BY firm_id, department, role
+"""
+
+FIRM_REVENUE_QUERY = """
+    SELECT firm_id, SUM(total_amount) as revenue
+    FROM sales
+    GROUP BY firm_id
+"""
+
+
+OUTLIER_METHODS: Dict[str, float] = {
+    'mad': 3.5,          # |robust z| above this (median/MAD scaled to the normal sd)
+    'iqr': 1.5,          # Outside Q1 - k*IQR .. Q3 + k*IQR
+    'percentile': 5.0,   # Bottom/top this many percent
+    'band': 0.1          # Legacy: more than this fraction off the aggregate productivity
+}
+
+
+def robust_statistics(values: np.ndarray) -> Dict[str, Any]:
+    """Median/MAD, quartiles and mid-rank percentiles of a vector in one pass"""
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n == 0:
+        return {'count': 0, 'median': None, 'mad': None, 'q1': None, 'q3': None,
+                'robust_z': np.empty(0), 'percentile': np.empty(0)}
+    
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    mad = float(np.median(np.abs(values - median)))
+    scale = 1.4826 * mad
+    with np.errstate(divide='ignore', invalid='ignore'):
+        robust_z = np.where(scale > 0, (values - median) / scale, 0.0)
+    
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    mid_rank = (np.cumsum(counts) - (counts - 1) / 2.0)[inverse]
+    return {
+        'count': n,
+        'median': float(median),
+        'mad': mad,
+        'q1': float(q1),
+        'q3': float(q3),
+        'robust_z': robust_z,
+        'percentile': (mid_rank - 0.5) / n * 100
+    }
+
+
+class DepartmentBreakdown:
+    """Firm x department x role capital metrics held as columnar arrays
+    
+    Built from one grouped pass over staff. Firm revenue is attributed to
+    each cell by its share of the firm's performance-weighted salary
+    (salary x performance_score), falling back to salary and then headcount
+    shares for firms without scores. Rollups to coarser levels are computed
+    once per level and keep a descending order per metric, so portfolio-wide
+    top-N queries are slices.
+    """
+    
+    def __init__(self, firm_ids: np.ndarray, cell_firm: np.ndarray, cell_department: np.ndarray,
+                 cell_role: np.ndarray, department_categories: List[str], role_categories: List[str],
+                 headcount: np.ndarray, salary_mass: np.ndarray, performance_sum: np.ndarray,
+                 performance_salary: np.ndarray, firm_revenue: np.ndarray):
+        self.firm_ids = firm_ids
+        self.department_categories = department_categories
+        self.role_categories = role_categories
+        self.codes = {'firm': cell_firm.astype(np.int32), 'department': cell_department.astype(np.int32),
+                      'role': cell_role.astype(np.int32)}
+        self.headcount = headcount.astype(np.int64)
+        self.salary_mass = salary_mass.astype(np.float64)
+        self.performance_sum = performance_sum.astype(np.float64)
+        self.performance_salary = performance_salary.astype(np.float64)
+        self.attributed_revenue = self._attribute(firm_revenue)
+        self._levels: Dict[str, Dict[str, Any]] = {}
+    
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict[str, Any]], revenue_rows: Sequence[Dict[str, Any]]
+                  ) -> 'DepartmentBreakdown':
+        """Build from the grouped staff query and per-firm revenue rows"""
+        firm_ids = np.array(sorted({row['firm_id'] for row in rows}), dtype=np.int64)
+        department, department_categories = encode_categories([row['department'] for row in rows])
+        role, role_categories = encode_categories([row['role'] for row in rows])
+        
+        firm_revenue = np.zeros(len(firm_ids))
+        if len(firm_ids):
+            revenue_firms = np.array([row['firm_id'] for row in revenue_rows], dtype=np.int64)
+            positions = np.minimum(np.searchsorted(firm_ids, revenue_firms), len(firm_ids) - 1)
+            known = firm_ids[positions] == revenue_firms
+            firm_revenue[positions[known]] = [float(row['revenue'] or 0)
+                                              for row, hit in zip(revenue_rows, known.tolist()) if hit]
+        
+        return cls(
+            firm_ids, np.searchsorted(firm_ids, [row['firm_id'] for row in rows]), department, role,
+            department_categories, role_categories,
+            np.array([int(row['headcount']) for row in rows], dtype=np.int64),
+            np.array([float(row['salary_mass']) for row in rows], dtype=np.float64),
+            np.array([float(row['performance_sum']) for row in rows], dtype=np.float64),
+            np.array([float(row['performance_salary']) for row in rows], dtype=np.float64),
+            firm_revenue
+        )
+    
+    @classmethod
+    def from_snapshot(cls, snapshot) -> 'DepartmentBreakdown':
+        """Build from the analytics snapshot's staff columns"""
+        known = snapshot.staff_firm >= 0
+        n_departments = len(snapshot.department_categories) + 1
+        n_roles = len(snapshot.role_categories) + 1
+        key = (snapshot.staff_firm[known].astype(np.int64) * n_departments +
+               snapshot.staff_department[known] + 1) * n_roles + snapshot.staff_role[known] + 1
+        cells, inverse = np.unique(key, return_inverse=True)
+        used_firms, cell_firm = np.unique(cells // (n_departments * n_roles), return_inverse=True)
+        
+        salary = snapshot.staff_salary[known]
+        performance = snapshot.staff_performance[known].astype(np.float64)
+        return cls(
+            snapshot.firm_ids[used_firms], cell_firm,
+            (cells // n_roles) % n_departments - 1, cells % n_roles - 1,
+            snapshot.department_categories, snapshot.role_categories,
+            np.bincount(inverse, minlength=len(cells)),
+            np.bincount(inverse, weights=salary, minlength=len(cells)),
+            np.bincount(inverse, weights=performance, minlength=len(cells)),
+            np.bincount(inverse, weights=salary * performance, minlength=len(cells)),
+            snapshot.revenue_by_firm_total[used_firms]
+        )
+    
+    def _attribute(self, firm_revenue: np.ndarray) -> np.ndarray:
+        """Split each firm's revenue across its cells"""
+        firm = self.codes['firm']
+        n_firms = len(self.firm_ids)
+        share = np.zeros(len(firm), dtype=np.float64)
+        assigned = np.zeros(n_firms, dtype=bool)
+        for weights in (self.performance_salary, self.salary_mass, self.headcount.astype(np.float64)):
+            totals = np.bincount(firm, weights=weights, minlength=n_firms)
+            use = ~assigned & (totals > 0)
+            cells = use[firm]
+            share[cells] = weights[cells] / totals[firm[cells]]
+            assigned |= use
+        return firm_revenue[firm] * share
+    
+    @property
+    def n_cells(self) -> int:
+        return len(self.headcount)
+    
+    def level(self, name: str) -> Dict[str, Any]:
+        """Metric arrays rolled up to a breakdown level (computed once)"""
+        if name not in BREAKDOWN_LEVELS:
+            raise ValueError(f"Unknown level: {name}. Expected one of {sorted(BREAKDOWN_LEVELS)}")
+        cached = self._levels.get(name)
+        if cached is not None:
+            return cached
+        
+        dims = BREAKDOWN_LEVELS[name]
+        sizes = tuple(len(self.firm_ids) if dim == 'firm' else
+                      len(getattr(self, f'{dim}_categories')) + 1 for dim in dims)
+        key = np.ravel_multi_index(tuple(self.codes[dim] + (dim != 'firm') for dim in dims), sizes)
+        groups, inverse = np.unique(key, return_inverse=True)
+        group_codes = np.unravel_index(groups, sizes)
+        
+        def total(values):
+            return np.bincount(inverse, weights=values, minlength=len(groups))
+        
+        headcount = total(self.headcount)
+        salary_mass = total(self.salary_mass)
+        performance_sum = total(self.performance_sum)
+        revenue = total(self.attributed_revenue)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            data = {
+                'codes': {dim: codes - (dim != 'firm') for dim, codes in zip(dims, group_codes)},
+                'headcount': headcount.astype(np.int64),
+                'salary_mass': salary_mass,
+                'attributed_revenue': revenue,
+                'revenue_per_employee': np.where(headcount > 0, revenue / headcount, 0.0),
+                'productivity': np.where(salary_mass > 0, revenue / salary_mass, 0.0),
+                'avg_salary': np.where(headcount > 0, salary_mass / headcount, 0.0),
+                'avg_performance': np.where(headcount > 0, performance_sum / headcount, 0.0),
+                'performance_weighted_cost': np.where(performance_sum > 0, salary_mass / performance_sum, 0.0),
+                'order': {}
+            }
+        self._levels[name] = data
+        return data
+    
+    def _order(self, data: Dict[str, Any], metric: str) -> np.ndarray:
+        order = data['order'].get(metric)
+        if order is None:
+            order = np.argsort(-data[metric], kind='stable')
+            data['order'][metric] = order
+        return order
+    
+    def _records(self, data: Dict[str, Any], rows: np.ndarray) -> List[Dict[str, Any]]:
+        columns = {}
+        for dim, codes in data['codes'].items():
+            if dim == 'firm':
+                columns['firm_id'] = self.firm_ids[codes[rows]].tolist()
+            else:
+                labels = getattr(self, f'{dim}_categories')
+                columns[dim] = [labels[code] if code >= 0 else None for code in codes[rows].tolist()]
+        for metric in ('headcount', 'salary_mass', 'avg_salary', 'avg_performance',
+                       'performance_weighted_cost', 'attributed_revenue', 'revenue_per_employee',
+                       'productivity'):
+            columns[metric] = data[metric][rows].tolist()
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+    
+    def rows(self, level: str = 'firm_department') -> List[Dict[str, Any]]:
+        """All groups of a level"""
+        data = self.level(level)
+        return self._records(data, np.arange(len(data['headcount'])))
+    
+    def firm(self, firm_id: int, level: str = 'firm_department') -> List[Dict[str, Any]]:
+        """Breakdown rows for one firm"""
+        data = self.level(level)
+        if 'firm' not in data['codes']:
+            raise ValueError(f"Level {level} is not broken down by firm")
+        position = int(np.searchsorted(self.firm_ids, firm_id))
+        if position >= len(self.firm_ids) or self.firm_ids[position] != firm_id:
+            return []
+        # Groups are sorted with the firm as the leading key
+        codes = data['codes']['firm']
+        start, end = np.searchsorted(codes, [position, position + 1])
+        rows = np.arange(start, end)
+        return self._records(data, rows[np.argsort(-data['attributed_revenue'][rows], kind='stable')])
+    
+    def top(self, n: int = 10, metric: str = 'productivity', level: str = 'firm_department',
+            min_headcount: int = 1, department: Optional[str] = None, role: Optional[str] = None,
+            ascending: bool = False) -> List[Dict[str, Any]]:
+        """Top (or bottom) groups across the whole portfolio by a metric"""
+        if metric not in BREAKDOWN_METRICS:
+            raise ValueError(f"Unknown metric: {metric}. Expected one of {list(BREAKDOWN_METRICS)}")
+        data = self.level(level)
+        order = self._order(data, metric)
+        if ascending:
+            order = order[::-1]
+        
+        keep = data['headcount'][order] >= min_headcount
+        for dim, value in (('department', department), ('role', role)):
+            if value is None:
+                continue
+            if dim not in data['codes']:
+                raise ValueError(f"Level {level} is not broken down by {dim}")
+            categories = getattr(self, f'{dim}_categories')
+            code = categories.index(value) if value in categories else -2
+            keep &= data['codes'][dim][order] == code
+        return self._records(data, order[keep][:n])
+
+
 class CapitalAnalyzer:
     """Measures capital and productivity metrics"""
     
-    def __init__(self, db):
+    def __init__(self, db, snapshot=None):
         self.db = db
+        self.snapshot = snapshot
     
     def calculate_human_capital(self, firm_id: int) -> Dict[str, Any]:
         """Calculate human capital metrics for a firm"""
+        if self.snapshot is not None:
+            staff_count = self.snapshot.firm_metric(self.snapshot.staff_count_by_firm, firm_id)
+            total_salary = float(self.snapshot.firm_metric(self.snapshot.salary_by_firm, firm_id, 0.0))
+            return {
+                'firm_id': firm_id,
+                'staff_count': int(staff_count),
+                'total_salary': total_salary,
+                'avg_salary': total_salary / staff_count if staff_count > 0 else 0.0
+            }
+        
         query = """
             SELECT 
                 COUNT(*) as staff_count,
@@ -23,7 +298,7 @@ class CapitalAnalyzer:
             FROM staff
             WHERE firm_id = %s
         """
-        result = self.db.execute_query(query, (firm_id,))
+        result = self.db.execute_query(query, (firm_id,), cache=True)
         
         return {
             'firm_id': firm_id,
@@ -35,13 +310,16 @@ class CapitalAnalyzer:
     def calculate_capital_productivity(self, firm_id: int) -> Dict[str, Any]:
         """Calculate capital productivity metrics"""
         # Get revenue
-        revenue_query = """
-            SELECT COALESCE(SUM(total_amount), 0) as total_revenue
-            FROM sales
-            WHERE firm_id = %s
-        """
-        revenue_result = self.db.execute_query(revenue_query, (firm_id,))
-        total_revenue = float(revenue_result[0]['total_revenue'])
+        if self.snapshot is not None:
+            total_revenue = self.snapshot.firm_revenue(firm_id)
+        else:
+            revenue_query = """
+                SELECT COALESCE(SUM(total_amount), 0) as total_revenue
+                FROM sales
+                WHERE firm_id = %s
+            """
+            revenue_result = self.db.execute_query(revenue_query, (firm_id,), cache=True)
+            total_revenue = float(revenue_result[0]['total_revenue'])
         
         # Get human capital
         human_capital = self.calculate_human_capital(firm_id)
@@ -63,6 +341,45 @@ class CapitalAnalyzer:
     
     def calculate_aggregate_metrics(self) -> Dict[str, Any]:
         """Calculate aggregate capital metrics across all firms"""
+        if self.snapshot is not None:
+            row = self._snapshot_aggregate_row()
+        else:
+            row = self._query_aggregate_row()
+        
+        firm_count = int(row['firm_count'])
+        total_staff = int(row['total_staff'])
+        total_salary = float(row['total_salary'])
+        total_revenue = float(row['total_revenue'])
+        
+        avg_revenue_per_employee = total_revenue / total_staff if total_staff > 0 else 0
+        avg_capital_productivity = total_revenue / total_salary if total_salary > 0 else 0
+        
+        return {
+            'firm_count': firm_count,
+            'total_staff': total_staff,
+            'total_salary': total_salary,
+            'total_revenue': total_revenue,
+            'avg_revenue_per_employee': avg_revenue_per_employee,
+            'avg_capital_productivity': avg_capital_productivity
+        }
+    
+    def _snapshot_aggregate_row(self) -> Dict[str, Any]:
+        """Snapshot equivalent of the aggregate query
+        
+        The query joins firm revenue onto every staff row, so each firm's
+        revenue is counted once per employee (once if it has none).
+        """
+        snapshot = self.snapshot
+        revenue_weight = np.maximum(snapshot.staff_count_by_firm, 1)
+        return {
+            'firm_count': snapshot.n_firms,
+            'total_staff': int(snapshot.staff_count_by_firm.sum()),
+            'total_salary': float(snapshot.salary_by_firm.sum()),
+            'total_revenue': float((snapshot.revenue_by_firm_total * revenue_weight).sum())
+        }
+    
+    def _query_aggregate_row(self) -> Dict[str, Any]:
+        """Run the aggregate capital query"""
         query = """
             SELECT 
                 COUNT(DISTINCT f.firm_id) as firm_count,
@@ -77,61 +394,218 @@ class CapitalAnalyzer:
                 GROUP BY firm_id
             ) sales ON f.firm_id = sales.firm_id
         """
-        result = self.db.execute_query(query)
+        return self.db.execute_query(query, cache=True)[0]
+    
+    def load_firm_productivity(self, start_date: str = None, end_date: str = None,
+                               firm_ids: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+        """Revenue, sales volume, headcount and salary per firm in one grouped query
         
-        firm_count = int(result[0]['firm_count'])
-        total_staff = int(result[0]['total_staff'])
-        total_salary = float(result[0]['total_salary'])
-        total_revenue = float(result[0]['total_revenue'])
+        Returns aligned arrays ordered by firm_id. The sales window is
+        inclusive; staff figures are current. When firm_ids is given, only
+        those firms are loaded (ids not in the firm table are left out),
+        using chunked IN lists.
+        """
+        if self.snapshot is not None:
+            return self._snapshot_firm_productivity(start_date, end_date, firm_ids)
         
-        avg_revenue_per_employee = total_revenue / total_staff if total_staff > 0 else 0
-        avg_capital_productivity = total_revenue / total_salary if total_salary > 0 else 0
+        window, params = "", []
+        if start_date:
+            window += " AND sale_date >= %s"
+            params.append(start_date)
+        if end_date:
+            window += " AND sale_date <= %s"
+            params.append(end_date)
         
+        firm_filter = "" if firm_ids is None else " AND firm_id IN ({ids})"
+        query = f"""
+            SELECT 
+                f.firm_id,
+                COALESCE(st.staff_count, 0) as staff_count,
+                COALESCE(st.total_salary, 0) as total_salary,
+                COALESCE(sa.total_revenue, 0) as total_revenue,
+                COALESCE(sa.transaction_count, 0) as transaction_count,
+                COALESCE(sa.total_quantity, 0) as total_quantity
+            FROM firm f
+            LEFT JOIN (
+                SELECT firm_id, COUNT(*) as staff_count, SUM(salary) as total_salary
+                FROM staff
+                WHERE 1=1{firm_filter}
+                GROUP BY firm_id
+            ) st ON f.firm_id = st.firm_id
+            LEFT JOIN (
+                SELECT
+                    firm_id,
+                    SUM(total_amount) as total_revenue,
+                    COUNT(*) as transaction_count,
+                    SUM(quantity) as total_quantity
+                FROM sales
+                WHERE 1=1{firm_filter}{window}
+                GROUP BY firm_id
+            ) sa ON f.firm_id = sa.firm_id
+            {"" if firm_ids is None else "WHERE f.firm_id IN ({ids})"}
+            ORDER BY f.firm_id
+        """
+        params = tuple(params) if params else None
+        if firm_ids is None:
+            rows = self.db.execute_query(query, params, cache=True)
+        else:
+            rows = sorted(self.db.execute_query_in(query, firm_ids, params), key=lambda row: row['firm_id'])
         return {
-            'firm_count': firm_count,
-            'total_staff': total_staff,
-            'total_salary': total_salary,
-            'total_revenue': total_revenue,
-            'avg_revenue_per_employee': avg_revenue_per_employee,
-            'avg_capital_productivity': avg_capital_productivity
+            'firm_ids': np.array([row['firm_id'] for row in rows], dtype=np.int64),
+            'revenue': np.array([float(row['total_revenue']) for row in rows], dtype=np.float64),
+            'transaction_count': np.array([int(row['transaction_count']) for row in rows], dtype=np.int64),
+            'total_quantity': np.array([int(row['total_quantity']) for row in rows], dtype=np.int64),
+            'staff_count': np.array([int(row['staff_count']) for row in rows], dtype=np.int64),
+            'total_salary': np.array([float(row['total_salary']) for row in rows], dtype=np.float64)
         }
     
-    def identify_productivity_outliers(self) -> Dict[str, List[Dict[str, Any]]]:
-        """Identify firms with above/below average productivity"""
-        # Get all firms
-        firms_query = "SELECT firm_id FROM firm"
-        firms = self.db.execute_query(firms_query)
-        
-        # Calculate productivity for each firm
-        productivity_data = []
-        for firm in firms:
-            metrics = self.calculate_capital_productivity(firm['firm_id'])
-            productivity_data.append(metrics)
-        
-        # Calculate average
-        avg_metrics = self.calculate_aggregate_metrics()
-        avg_productivity = avg_metrics['avg_capital_productivity']
-        
-        # Identify outliers
-        above_average = [
-            p for p in productivity_data 
-            if p['capital_productivity'] > avg_productivity * 1.1
-        ]
-        below_average = [
-            p for p in productivity_data 
-            if p['capital_productivity'] < avg_productivity * 0.9
-        ]
-        
-        # Sort by productivity
-        above_average.sort(key=lambda x: x['capital_productivity'], reverse=True)
-        below_average.sort(key=lambda x: x['capital_productivity'])
-        
-        logger.info(f"Found {len(above_average)} above-average and {len(below_average)} below-average firms")
+    def _snapshot_firm_productivity(self, start_date: str = None, end_date: str = None,
+                                    firm_ids: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+        """Snapshot equivalent of load_firm_productivity"""
+        snapshot = self.snapshot
+        if start_date or end_date:
+            mask = snapshot.sales_firm >= 0
+            if start_date:
+                mask &= snapshot.sales_day >= date_to_day(start_date)
+            if end_date:
+                mask &= snapshot.sales_day <= date_to_day(end_date)
+            sales_firm = snapshot.sales_firm[mask]
+            transactions = np.bincount(sales_firm, minlength=snapshot.n_firms).astype(np.int64)
+            quantity = np.bincount(sales_firm, weights=snapshot.sales_quantity[mask],
+                                   minlength=snapshot.n_firms).astype(np.int64)
+        else:
+            transactions, quantity = snapshot.transactions_by_firm, snapshot.quantity_by_firm
+        
+        if firm_ids is None:
+            rows = slice(None)
+        else:
+            positions = {snapshot.firm_index(firm_id) for firm_id in firm_ids}
+            rows = np.array(sorted(positions - {None}), dtype=np.int64)
+        return {
+            'firm_ids': snapshot.firm_ids[rows],
+            'revenue': snapshot.revenue_by_firm(start_date, end_date)[rows],
+            'transaction_count': transactions[rows],
+            'total_quantity': quantity[rows],
+            'staff_count': snapshot.staff_count_by_firm[rows],
+            'total_salary': snapshot.salary_by_firm[rows]
+        }
+    
+    @staticmethod
+    def _productivity_records(totals: Dict[str, np.ndarray], rows: np.ndarray,
+                              extra: Dict[str, np.ndarray] = None) -> List[Dict[str, Any]]:
+        columns = {
+            'firm_id': totals['firm_ids'][rows].tolist(),
+            'total_revenue': totals['revenue'][rows].tolist(),
+            'staff_count': totals['staff_count'][rows].tolist(),
+            'total_salary': totals['total_salary'][rows].tolist(),
+            'revenue_per_employee': totals['revenue_per_employee'][rows].tolist(),
+            'capital_productivity': totals['capital_productivity'][rows].tolist()
+        }
+        for name, values in (extra or {}).items():
+            columns[name] = values[rows].tolist()
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+    
+    def _with_ratios(self, totals: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        staff_count, total_salary, revenue = totals['staff_count'], totals['total_salary'], totals['revenue']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return {
+                **totals,
+                'revenue_per_employee': np.where(staff_count > 0, revenue / staff_count, 0.0),
+                'capital_productivity': np.where(total_salary > 0, revenue / total_salary, 0.0)
+            }
+    
+    def identify_productivity_outliers(self, start_date: str = None,
+                                       end_date: str = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Identify firms with above/below average productivity (+/-10% bands)
+        
+        The average is the aggregate metric's revenue-to-salary ratio, and
+        every firm is scored from one batched load.
+        """
+        totals = self._with_ratios(self.load_firm_productivity(start_date, end_date))
+        avg_productivity = self._aggregate_productivity(totals)
+        productivity = totals['capital_productivity']
+        
+        above = np.flatnonzero(productivity > avg_productivity * 1.1)
+        below = np.flatnonzero(productivity < avg_productivity * 0.9)
+        above = above[np.argsort(-productivity[above], kind='stable')]
+        below = below[np.argsort(productivity[below], kind='stable')]
+        
+        logger.info(f"Found {len(above)} above-average and {len(below)} below-average firms")
         
         return {
             'average_productivity': avg_productivity,
-            'above_average': above_average,
-            'below_average': below_average
+            'above_average': self._productivity_records(totals, above),
+            'below_average': self._productivity_records(totals, below)
+        }
+    
+    @staticmethod
+    def _aggregate_productivity(totals: Dict[str, np.ndarray]) -> float:
+        """Same ratio as calculate_aggregate_metrics (firm revenue counted once per employee)"""
+        total_salary = float(totals['total_salary'].sum())
+        total_revenue = float((totals['revenue'] * np.maximum(totals['staff_count'], 1)).sum())
+        return total_revenue / total_salary if total_salary > 0 else 0
+    
+    def detect_productivity_outliers(self, method: str = 'mad', threshold: float = None,
+                                     start_date: str = None, end_date: str = None,
+                                     limit: int = None) -> Dict[str, Any]:
+        """Flag firms with unusual capital productivity using robust statistics
+        
+        Methods: 'mad' (robust z-score from median/MAD), 'iqr' (Tukey
+        fences), 'percentile' (top/bottom percentile ranks) or 'band'
+        (the legacy +/-10% around the aggregate). Firms without salary
+        cost have no productivity and are left out of the statistics.
+        """
+        if method not in OUTLIER_METHODS:
+            raise ValueError(f"Unknown method: {method}. Expected one of {list(OUTLIER_METHODS)}")
+        threshold = OUTLIER_METHODS[method] if threshold is None else threshold
+        
+        totals = self._with_ratios(self.load_firm_productivity(start_date, end_date))
+        scored = np.flatnonzero(totals['total_salary'] > 0)
+        productivity = totals['capital_productivity'][scored]
+        stats = robust_statistics(productivity)
+        
+        fences = (None, None)
+        if stats['count']:
+            k = threshold if method == 'iqr' else OUTLIER_METHODS['iqr']
+            iqr = stats['q3'] - stats['q1']
+            fences = (stats['q1'] - k * iqr, stats['q3'] + k * iqr)
+        if method == 'mad':
+            high, low = stats['robust_z'] > threshold, stats['robust_z'] < -threshold
+        elif method == 'iqr':
+            high, low = productivity > fences[1], productivity < fences[0]
+        elif method == 'percentile':
+            high, low = stats['percentile'] >= 100 - threshold, stats['percentile'] <= threshold
+        else:
+            average = self._aggregate_productivity(totals)
+            high, low = productivity > average * (1 + threshold), productivity < average * (1 - threshold)
+        
+        robust_z = np.zeros(len(totals['firm_ids']))
+        percentile = np.full(len(totals['firm_ids']), np.nan)
+        robust_z[scored] = stats['robust_z']
+        percentile[scored] = stats['percentile']
+        extra = {'robust_z': robust_z, 'percentile_rank': percentile}
+        
+        high_count, low_count = int(high.sum()), int(low.sum())
+        high = scored[high][np.argsort(-productivity[high], kind='stable')][:limit]
+        low = scored[low][np.argsort(productivity[low], kind='stable')][:limit]
+        return {
+            'method': method,
+            'threshold': threshold,
+            'window': {'start_date': start_date, 'end_date': end_date},
+            'statistics': {
+                'firms': len(totals['firm_ids']),
+                'scored_firms': stats['count'],
+                'median': stats['median'],
+                'mad': stats['mad'],
+                'q1': stats['q1'],
+                'q3': stats['q3'],
+                'lower_fence': fences[0],
+                'upper_fence': fences[1]
+            },
+            'high_count': high_count,
+            'low_count': low_count,
+            'high_outliers': self._productivity_records(totals, high, extra),
+            'low_outliers': self._productivity_records(totals, low, extra)
         }
     
     def calculate_staff_efficiency(self, firm_id: int) -> Dict[str, Any]:
@@ -139,17 +613,21 @@ class CapitalAnalyzer:
         productivity = self.calculate_capital_productivity(firm_id)
         
         # Get sales volume
-        sales_query = """
-            SELECT 
-                COUNT(*) as transaction_count,
-                COALESCE(SUM(quantity), 0) as total_quantity
-            FROM sales
-            WHERE firm_id = %s
-        """
-        sales_result = self.db.execute_query(sales_query, (firm_id,))
-        
-        transaction_count = int(sales_result[0]['transaction_count'])
-        total_quantity = int(sales_result[0]['total_quantity'])
+        if self.snapshot is not None:
+            transaction_count = int(self.snapshot.firm_metric(self.snapshot.transactions_by_firm, firm_id))
+            total_quantity = int(self.snapshot.firm_metric(self.snapshot.quantity_by_firm, firm_id))
+        else:
+            sales_query = """
+                SELECT 
+                    COUNT(*) as transaction_count,
+                    COALESCE(SUM(quantity), 0) as total_quantity
+                FROM sales
+                WHERE firm_id = %s
+            """
+            sales_result = self.db.execute_query(sales_query, (firm_id,), cache=True)
+            
+            transaction_count = int(sales_result[0]['transaction_count'])
+            total_quantity = int(sales_result[0]['total_quantity'])
         staff_count = productivity['staff_count']
         
         transactions_per_employee = transaction_count / staff_count if staff_count > 0 else 0
@@ -164,3 +642,69 @@ class CapitalAnalyzer:
             'transactions_per_employee': transactions_per_employee,
             'units_per_employee': units_per_employee
         }
+    
+    def calculate_productivity_bulk(self, firm_ids: Sequence[int], start_date: str = None,
+                                    end_date: str = None) -> Dict[str, Any]:
+        """Capital productivity for a list of firms, keyed by firm_id"""
+        totals = self._with_ratios(self.load_firm_productivity(start_date, end_date, firm_ids))
+        records = self._productivity_records(totals, np.arange(len(totals['firm_ids'])))
+        return self._keyed(firm_ids, records)
+    
+    def calculate_staff_efficiency_bulk(self, firm_ids: Sequence[int], start_date: str = None,
+                                        end_date: str = None) -> Dict[str, Any]:
+        """Staff efficiency for a list of firms, keyed by firm_id"""
+        totals = self._with_ratios(self.load_firm_productivity(start_date, end_date, firm_ids))
+        staff_count = totals['staff_count']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            transactions_per_employee = np.where(staff_count > 0, totals['transaction_count'] / staff_count, 0.0)
+            units_per_employee = np.where(staff_count > 0, totals['total_quantity'] / staff_count, 0.0)
+        
+        records = [{
+            'firm_id': firm_id,
+            'staff_count': count,
+            'transaction_count': transactions,
+            'total_quantity': quantity,
+            'revenue_per_employee': rpe,
+            'transactions_per_employee': tpe,
+            'units_per_employee': upe
+        } for firm_id, count, transactions, quantity, rpe, tpe, upe in zip(
+            totals['firm_ids'].tolist(), staff_count.tolist(), totals['transaction_count'].tolist(),
+            totals['total_quantity'].tolist(), totals['revenue_per_employee'].tolist(),
+            transactions_per_employee.tolist(), units_per_employee.tolist()
+        )]
+        return self._keyed(firm_ids, records)
+    
+    @staticmethod
+    def _keyed(firm_ids: Sequence[int], records: List[Dict[str, Any]]) -> Dict[str, Any]:
+        results = {record['firm_id']: record for record in records}
+        return {
+            'results': results,
+            'missing': [firm_id for firm_id in dict.fromkeys(firm_ids) if firm_id not in results],
+            'count': len(results)
+        }
+    
+    def department_breakdown(self) -> DepartmentBreakdown:
+        """Firm x department x role breakdown, cached until staff or sales change"""
+        def build() -> DepartmentBreakdown:
+            if self.snapshot is not None:
+                return DepartmentBreakdown.from_snapshot(self.snapshot)
+            return DepartmentBreakdown.from_rows(self.db.execute_query(STAFF_GROUP_QUERY, cache=False),
+                                                 self.db.execute_query(FIRM_REVENUE_QUERY, cache=True))
+        
+        key = ('department_breakdown', self.snapshot.built_at if self.snapshot is not None else None)
+        return result_cache.get_or_compute(key, build, ('staff', 'sales'))
+    
+    def calculate_department_breakdown(self, firm_id: Optional[int] = None,
+                                       level: str = 'firm_department') -> List[Dict[str, Any]]:
+        """Salary mass, headcount, performance-weighted cost and attributed revenue per group"""
+        breakdown = self.department_breakdown()
+        if firm_id is not None:
+            return breakdown.firm(firm_id, level)
+        return breakdown.rows(level)
+    
+    def top_departments(self, n: int = 10, metric: str = 'productivity', level: str = 'firm_department',
+                        min_headcount: int = 1, department: Optional[str] = None,
+                        role: Optional[str] = None, ascending: bool = False) -> List[Dict[str, Any]]:
+        """Most (or least) productive departments across the portfolio"""
+        return self.department_breakdown().top(n, metric, level, min_headcount, department, role,
+                                               ascending)
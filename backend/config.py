@@ -18,6 +18,11 @@ class Config:
     DB_POOL_SIZE: int = 10
     DB_MAX_OVERFLOW: int = 20
     DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 3600  # Max connection lifetime in seconds
+    DB_POOL_PRE_PING: bool = True
+    DB_STREAM_WRITE_TIMEOUT: int = 3600  # Seconds the server waits on a slow streaming consumer
+    STREAM_CHUNK_SIZE: int = 5000
+    BULK_IN_CHUNK_SIZE: int = 500  # Ids per IN (...) list in bulk lookups
     
     # API Configuration
     API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
@@ -30,8 +35,49 @@ class Config:
     JWT_EXPIRATION_MINUTES: int = 30
     
     # Performance
+    CACHE_ENABLED: bool = os.getenv("CACHE_ENABLED", "true").lower() == "true"
     CACHE_TTL_SECONDS: int = 300  # 5 minutes
+    CACHE_MAX_ENTRIES: int = 1024
     MAX_PAGE_SIZE: int = 100
+    MAX_KEYSET_PAGE_SIZE: int = 1000
+    BULK_MAX_FIRMS: int = 5000  # Firm ids per bulk request
+    MERGER_SCREEN_BLOCK_ELEMENTS: int = 2_000_000  # Pair cells evaluated per block
+    BOTTLENECK_LOOKBACK_MONTHS: int = 36
+    BOTTLENECK_STREAM_ENABLED: bool = os.getenv("BOTTLENECK_STREAM_ENABLED", "false").lower() == "true"
+    BOTTLENECK_POLL_SECONDS: float = float(os.getenv("BOTTLENECK_POLL_SECONDS", "5"))
+    BOTTLENECK_PROJECT_AFTER_DAYS: int = 7  # Project the current month once this many days have passed
+    BOTTLENECK_POLL_LAG_IDS: int = 5000  # sale_ids below the high-water mark re-read for late commits
+    BOTTLENECK_RELOAD_SECONDS: float = float(os.getenv("BOTTLENECK_RELOAD_SECONDS", "3600"))  # Full reconcile
+    MAX_INGEST_ROWS: int = 10_000
+    INGEST_BATCH_ROWS: int = 5000  # Rows per executemany (multi-row INSERT) call
+    INGEST_COMMIT_ROWS: int = 50_000  # Rows per transaction (and checkpoint) in bulk loads
+    INGEST_QUEUE_BATCHES: int = 8  # Parsed batches buffered between the parser and the writer
+    INGEST_PROGRESS_SECONDS: float = 5.0
+    SALES_CUBE_LOOKBACK_MONTHS: int = 36
+    RESOURCE_HISTORY_MONTHS: int = 24  # Months of revenue/headcount history for elasticities
+    RESOURCE_MAX_CHANGE: float = 0.2  # Largest relative headcount change per firm and department
+    
+    # Merger Simulation
+    SIMULATION_DRAWS: int = 100_000
+    SIMULATION_MAX_DRAWS: int = 1_000_000
+    SIMULATION_SEED: int = 42
+    SIMULATION_WORKERS: int = int(os.getenv("SIMULATION_WORKERS", str(os.cpu_count() or 1)))
+    SIMULATION_PARALLEL_MIN_PAIRS: int = 8
+    SIMULATION_MAX_PAIRS: int = 1000  # Per batch request
+    SUMMARY_REFRESH_SECONDS: int = 300
+    USE_ANALYTICS_SNAPSHOT: bool = os.getenv("USE_ANALYTICS_SNAPSHOT", "false").lower() == "true"
+    SNAPSHOT_REFRESH_SECONDS: int = int(os.getenv("SNAPSHOT_REFRESH_SECONDS", "300"))
+    USE_ROLLUP_TABLES: bool = os.getenv("USE_ROLLUP_TABLES", "false").lower() == "true"  # After migration 001
+    
+    # Model Selection
+    MODEL_SELECTION_FOLDS: int = 5
+    MODEL_SELECTION_WORKERS: int = int(os.getenv("MODEL_SELECTION_WORKERS", str(os.cpu_count() or 1)))
+    MODEL_DIR: str = os.getenv("MODEL_DIR", os.path.join(os.path.dirname(__file__), "models"))
+    DEFAULT_MODEL_NAME: str = "merger_success"
+    MODEL_REFRESH_SECONDS: int = 30  # How often workers look for newly published versions
+    SCORING_MAX_BATCH_SIZE: int = int(os.getenv("SCORING_MAX_BATCH_SIZE", "1024"))
+    SCORING_MAX_WAIT_MS: float = float(os.getenv("SCORING_MAX_WAIT_MS", "2"))
+    SCORING_MAX_PAIRS: int = 100_000  # Per request
     
     # CORS
     CORS_ORIGINS: list = ["*"]
@@ -1,13 +1,45 @@
 """
 Data loading and validation module
 """
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Optional, Set, Tuple, Iterator, Union
 import logging
-from datetime import datetime
+import math
+from datetime import date, datetime
 from database import get_db_connection
+from config import config
+from pagination import encode_cursor, decode_cursor
+from analytics_snapshot import AnalyticsSnapshot, SalesColumns, FIRM_COLUMNS, STAFF_COLUMNS, SALES_COLUMNS
 
 logger = logging.getLogger(__name__)
 
+# Column order of the values returned by DataValidator.validate_sales_row
+SALES_INSERT_COLUMNS = ('firm_id', 'product_id', 'product_name', 'sale_date', 'quantity',
+                        'unit_price', 'total_amount', 'territory', 'customer_segment')
+SALES_TEXT_LIMITS = {'product_name': 255, 'territory': 100, 'customer_segment': 100}
+MAX_UNIT_PRICE = 1e8  # DECIMAL(10, 2)
+MAX_TOTAL_AMOUNT = 1e13  # DECIMAL(15, 2)
+
+
+def _whole_number(value: Any) -> int:
+    """Parse an integer field, rejecting booleans and fractional values like 2.7"""
+    if isinstance(value, bool):
+        raise TypeError("boolean is not an integer")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().lstrip('+-').isdigit():
+        return int(value)
+    number = float(value)
+    if not number.is_integer():
+        raise ValueError(f"not a whole number: {value!r}")
+    return int(number)
+
+
+def _number(value: Any) -> float:
+    """Parse a numeric field, rejecting booleans"""
+    if isinstance(value, bool):
+        raise TypeError("boolean is not a number")
+    return float(value)
+
 class DataValidator:
     """Validates data integrity and completeness"""
     
@@ -91,6 +123,93 @@ class DataValidator:
         except Exception as e:
             errors.append(f"Missing data check error: {str(e)}")
             return False, errors
+    
+    @staticmethod
+    def validate_sales_row(row: Dict[str, Any], firm_ids: Optional[Set[int]] = None
+                           ) -> Tuple[Optional[tuple], List[str]]:
+        """Validate one incoming sales record and normalize it for insertion
+        
+        Returns the values in SALES_INSERT_COLUMNS order and no errors, or
+        None and the errors. Empty strings count as missing, quantity
+        defaults to 1 and total_amount to quantity * unit_price. Ids and
+        quantity must be whole numbers, and booleans are never numbers.
+        sale_date may not be in the future. When firm_ids is given, the firm
+        must be one of them.
+        """
+        errors = []
+        
+        def present(name):
+            value = row.get(name)
+            return None if value is None or value == '' else value
+        
+        firm_id = present('firm_id')
+        try:
+            firm_id = _whole_number(firm_id)
+            if firm_ids is not None and firm_id not in firm_ids:
+                errors.append(f"Unknown firm_id: {firm_id}")
+        except (TypeError, ValueError):
+            errors.append(f"Invalid or missing firm_id: {firm_id!r}")
+        
+        sale_date = present('sale_date')
+        try:
+            if isinstance(sale_date, datetime):
+                sale_date = sale_date.date()
+            elif not isinstance(sale_date, date):
+                sale_date = date.fromisoformat(sale_date[:10])
+            if sale_date > date.today():
+                errors.append(f"sale_date is in the future: {sale_date.isoformat()}")
+        except (TypeError, ValueError):
+            errors.append(f"Invalid or missing sale_date: {sale_date!r}")
+        
+        quantity = present('quantity')
+        try:
+            quantity = 1 if quantity is None else _whole_number(quantity)
+            if quantity <= 0:
+                errors.append(f"quantity must be positive: {quantity}")
+        except (TypeError, ValueError):
+            errors.append(f"Invalid quantity: {quantity!r}")
+        
+        unit_price = present('unit_price')
+        try:
+            unit_price = _number(unit_price)
+            if not 0 <= unit_price < MAX_UNIT_PRICE:
+                errors.append(f"unit_price out of range: {unit_price}")
+        except (TypeError, ValueError):
+            errors.append(f"Invalid or missing unit_price: {unit_price!r}")
+        
+        total_amount = present('total_amount')
+        if total_amount is None:
+            if not errors:
+                total_amount = round(quantity * unit_price, 2)
+        else:
+            try:
+                total_amount = _number(total_amount)
+                if not (math.isfinite(total_amount) and abs(total_amount) < MAX_TOTAL_AMOUNT):
+                    errors.append(f"total_amount out of range: {total_amount}")
+            except (TypeError, ValueError):
+                errors.append(f"Invalid total_amount: {total_amount!r}")
+        
+        product_id = present('product_id')
+        if product_id is not None:
+            try:
+                product_id = _whole_number(product_id)
+            except (TypeError, ValueError):
+                errors.append(f"Invalid product_id: {product_id!r}")
+        
+        text = {}
+        for name, limit in SALES_TEXT_LIMITS.items():
+            value = present(name)
+            if value is not None:
+                value = str(value).strip() or None
+                if value is not None and len(value) > limit:
+                    errors.append(f"{name} longer than {limit} characters")
+            text[name] = value
+        
+        if errors:
+            return None, errors
+        return (firm_id, product_id, text['product_name'], sale_date.isoformat(), quantity,
+                round(unit_price, 2), round(total_amount, 2), text['territory'],
+                text['customer_segment']), []
 
 class DataLoader:
     """Loads data from database"""
@@ -102,10 +221,12 @@ class DataLoader:
         """Load firm data"""
         try:
             query = "SELECT * FROM firm"
+            params = None
             if limit:
-                query += f" LIMIT {limit}"
+                query += " LIMIT %s"
+                params = (int(limit),)
             
-            firms = self.db.execute_query(query)
+            firms = self.db.execute_query(query, params)
             logger.info(f"Loaded {len(firms)} firms")
             return firms
         except Exception as e:
@@ -116,43 +237,54 @@ class DataLoader:
         """Load staff data"""
         try:
             query = "SELECT * FROM staff"
-            params = None
+            params = []
             
             if firm_id:
                 query += " WHERE firm_id = %s"
-                params = (firm_id,)
+                params.append(firm_id)
             
             if limit:
-                query += f" LIMIT {limit}"
+                query += " LIMIT %s"
+                params.append(int(limit))
             
-            staff = self.db.execute_query(query, params)
+            staff = self.db.execute_query(query, tuple(params) if params else None)
             logger.info(f"Loaded {len(staff)} staff records")
             return staff
         except Exception as e:
             logger.error(f"Failed to load staff: {e}")
             raise
     
+    @staticmethod
+    def _sales_filters(firm_id: int = None, start_date: str = None,
+                       end_date: str = None) -> Tuple[str, List[Any]]:
+        """Build the WHERE clause and params for the sales filters"""
+        clause = " WHERE 1=1"
+        params = []
+        
+        if firm_id:
+            clause += " AND firm_id = %s"
+            params.append(firm_id)
+        
+        if start_date:
+            clause += " AND sale_date >= %s"
+            params.append(start_date)
+        
+        if end_date:
+            clause += " AND sale_date <= %s"
+            params.append(end_date)
+        
+        return clause, params
+    
     def load_sales(self, firm_id: int = None, start_date: str = None, 
                    end_date: str = None, limit: int = None) -> List[Dict[str, Any]]:
         """Load sales data"""
         try:
-            query = "SELECT * FROM sales WHERE 1=1"
-            params = []
-            
-            if firm_id:
-                query += " AND firm_id = %s"
-                params.append(firm_id)
-            
-            if start_date:
-                query += " AND sale_date >= %s"
-                params.append(start_date)
-            
-            if end_date:
-                query += " AND sale_date <= %s"
-                params.append(end_date)
+            where, params = self._sales_filters(firm_id, start_date, end_date)
+            query = "SELECT * FROM sales" + where
             
             if limit:
-                query += f" LIMIT {limit}"
+                query += " LIMIT %s"
+                params.append(int(limit))
             
             sales = self.db.execute_query(query, tuple(params) if params else None)
             logger.info(f"Loaded {len(sales)} sales records")
@@ -161,6 +293,72 @@ class DataLoader:
             logger.error(f"Failed to load sales: {e}")
             raise
     
+    def iter_sales(self, firm_id: int = None, start_date: str = None,
+                   end_date: str = None, chunk_size: int = None
+                   ) -> Iterator[Union[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Stream sales rows (or chunks of rows) with flat memory usage"""
+        where, params = self._sales_filters(firm_id, start_date, end_date)
+        query = "SELECT * FROM sales" + where
+        
+        row_count = 0
+        for item in self.db.stream_query(query, tuple(params) if params else None, chunk_size):
+            row_count += len(item) if chunk_size else 1
+            yield item
+        
+        logger.info(f"Streamed {row_count} sales records")
+    
+    def _load_page(self, table: str, key: str, where: str, params: List[Any],
+                   filters: Dict[str, Any], cursor: str = None,
+                   page_size: int = None) -> Dict[str, Any]:
+        """Load one keyset page ordered by the primary key
+        
+        Seeks past the last key of the previous page instead of using an
+        offset, so every page costs the same as the first.
+        """
+        page_size = page_size or config.MAX_PAGE_SIZE
+        last_key = decode_cursor(cursor, table, filters)
+        
+        query = f"SELECT * FROM {table}" + where
+        params = list(params)
+        if last_key is not None:
+            query += f" AND {key} > %s"
+            params.append(last_key)
+        query += f" ORDER BY {key} LIMIT %s"
+        params.append(page_size + 1)
+        
+        rows = self.db.execute_query(query, tuple(params))
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        
+        return {
+            'items': rows,
+            'next_cursor': encode_cursor(table, rows[-1][key], filters) if has_more else None
+        }
+    
+    def load_firms_page(self, cursor: str = None, page_size: int = None) -> Dict[str, Any]:
+        """Load a page of firms ordered by firm_id"""
+        return self._load_page('firm', 'firm_id', " WHERE 1=1", [], {}, cursor, page_size)
+    
+    def load_staff_page(self, firm_id: int = None, cursor: str = None,
+                        page_size: int = None) -> Dict[str, Any]:
+        """Load a page of staff ordered by staff_id"""
+        where, params = " WHERE 1=1", []
+        if firm_id:
+            where += " AND firm_id = %s"
+            params.append(firm_id)
+        
+        return self._load_page('staff', 'staff_id', where, params,
+                               {'firm_id': firm_id}, cursor, page_size)
+    
+    def load_sales_page(self, firm_id: int = None, start_date: str = None,
+                        end_date: str = None, cursor: str = None,
+                        page_size: int = None) -> Dict[str, Any]:
+        """Load a page of sales ordered by sale_id"""
+        where, params = self._sales_filters(firm_id, start_date, end_date)
+        filters = {'firm_id': firm_id, 'start_date': start_date, 'end_date': end_date}
+        
+        return self._load_page('sales', 'sale_id', where, params, filters, cursor, page_size)
+    
     def load_all(self) -> Dict[str, List[Dict[str, Any]]]:
         """Load all data"""
         start_time = datetime.now()
@@ -175,3 +373,23 @@ class DataLoader:
         logger.info(f"Loaded all data in {elapsed:.2f} seconds")
         
         return data
+    
+    def load_snapshot(self) -> AnalyticsSnapshot:
+        """Load firm, staff and sales into a columnar analytics snapshot
+        
+        Sales are streamed in chunks straight into column arrays instead of
+        being fetched as one list of row dicts.
+        """
+        start_time = datetime.now()
+        
+        firms = self.db.execute_query(f"SELECT {FIRM_COLUMNS} FROM firm", cache=False)
+        staff = self.db.execute_query(f"SELECT {STAFF_COLUMNS} FROM staff", cache=False)
+        sales = SalesColumns().extend(self.db.stream_query(
+            f"SELECT {SALES_COLUMNS} FROM sales", chunk_size=config.STREAM_CHUNK_SIZE))
+        snapshot = AnalyticsSnapshot(firms, staff, sales)
+        
+        elapsed = (datetime.now() - start_time).total_seconds()
+        logger.info(f"Built analytics snapshot ({sales.size} sales, "
+                    f"{snapshot.nbytes / 1e6:.1f} MB) in {elapsed:.2f} seconds")
+        
+        return snapshot
@@ -2,67 +2,385 @@
 Database connection and session management
 """
 import pymysql
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Iterator, Sequence, Union
 import logging
+import threading
+import time
+from collections import deque
 from contextlib import contextmanager
 from config import config
+from cache import query_cache, invalidate_tables, tables_read, tables_written
 
 logger = logging.getLogger(__name__)
 
+
+def _open_connection() -> pymysql.connections.Connection:
+    """Open a new MySQL connection with the configured settings"""
+    return pymysql.connect(
+        host=config.DB_HOST,
+        port=config.DB_PORT,
+        user=config.DB_USER,
+        password=config.DB_PASSWORD,
+        database=config.DB_NAME,
+        charset='utf8mb4',
+        cursorclass=pymysql.cursors.DictCursor,
+        autocommit=False
+    )
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of MySQL connections
+    
+    Keeps up to ``pool_size`` idle connections and allows ``max_overflow``
+    extra connections under load. Checkouts block for at most ``timeout``
+    seconds. Idle connections are health-checked with ``ping`` and
+    connections older than ``recycle`` seconds are replaced.
+    """
+    
+    def __init__(self, pool_size: int = None, max_overflow: int = None,
+                 timeout: float = None, recycle: int = None,
+                 pre_ping: bool = None):
+        self.pool_size = config.DB_POOL_SIZE if pool_size is None else pool_size
+        self.max_overflow = config.DB_MAX_OVERFLOW if max_overflow is None else max_overflow
+        self.timeout = config.DB_POOL_TIMEOUT if timeout is None else timeout
+        self.recycle = config.DB_POOL_RECYCLE if recycle is None else recycle
+        self.pre_ping = config.DB_POOL_PRE_PING if pre_ping is None else pre_ping
+        
+        self._cond = threading.Condition()
+        self._idle: deque = deque()  # Idle connections; creation times are in _created_at
+        self._created_at: Dict[int, float] = {}
+        self._total = 0
+        self._in_use = 0
+        self._counters = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'connections_invalidated': 0
+        }
+    
+    @property
+    def max_connections(self) -> int:
+        return self.pool_size + self.max_overflow
+    
+    def _count(self, counter: str):
+        with self._cond:
+            self._counters[counter] += 1
+    
+    def _create(self) -> pymysql.connections.Connection:
+        connection = _open_connection()
+        with self._cond:
+            self._created_at[id(connection)] = time.monotonic()
+            self._counters['connections_created'] += 1
+        return connection
+    
+    def _close(self, connection: pymysql.connections.Connection):
+        with self._cond:
+            self._created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+    
+    def _is_expired(self, connection: pymysql.connections.Connection) -> bool:
+        if not self.recycle or self.recycle < 0:
+            return False
+        created_at = self._created_at.get(id(connection), 0.0)
+        return time.monotonic() - created_at > self.recycle
+    
+    def _is_healthy(self, connection: pymysql.connections.Connection) -> bool:
+        if not self.pre_ping:
+            return True
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+    
+    def acquire(self) -> pymysql.connections.Connection:
+        """Check out a connection, waiting up to the pool timeout"""
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        
+        with self._cond:
+            while True:
+                if self._idle:
+                    connection = self._idle.pop()
+                    break
+                if self._total < self.max_connections:
+                    self._total += 1
+                    connection = None
+                    break
+                
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s "
+                        f"({self._in_use} in use, max {self.max_connections})"
+                    )
+                if not waited:
+                    waited = True
+                    self._counters['waits'] += 1
+                self._cond.wait(remaining)
+            
+            self._in_use += 1
+            self._counters['checkouts'] += 1
+        
+        try:
+            if connection is not None and self._is_expired(connection):
+                self._close(connection)
+                self._count('connections_recycled')
+                connection = None
+            elif connection is not None and not self._is_healthy(connection):
+                self._close(connection)
+                self._count('connections_invalidated')
+                connection = None
+            
+            if connection is None:
+                connection = self._create()
+            return connection
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+    
+    def release(self, connection: pymysql.connections.Connection, discard: bool = False):
+        """Return a connection to the pool
+        
+        Any open transaction is rolled back so the next borrower does not
+        inherit uncommitted writes or a stale read snapshot.
+        """
+        if not discard:
+            try:
+                connection.rollback()
+            except Exception:
+                discard = True
+        
+        keep = False
+        with self._cond:
+            self._in_use -= 1
+            if not discard and len(self._idle) < self.pool_size:
+                self._idle.append(connection)
+                keep = True
+            else:
+                self._total -= 1
+                if discard:
+                    self._counters['connections_invalidated'] += 1
+            self._cond.notify()
+        
+        if not keep:
+            self._close(connection)
+    
+    def dispose(self):
+        """Close all idle connections"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._total -= len(idle)
+        for connection in idle:
+            self._close(connection)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get pool usage statistics"""
+        with self._cond:
+            return {
+                'pool_size': self.pool_size,
+                'max_overflow': self.max_overflow,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'total': self._total,
+                **self._counters
+            }
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
 class DatabaseConnector:
     """Manages MySQL database connections"""
     
-    def __init__(self):
+    def __init__(self, pool: Optional[ConnectionPool] = None, use_cache: bool = None):
         self.connection: Optional[pymysql.connections.Connection] = None
+        self.pool = pool
+        self.use_cache = config.CACHE_ENABLED if use_cache is None else use_cache
+        self._broken = False
         
     def connect(self) -> bool:
-        """Establish database connection"""
+        """Establish database connection (checked out from the pool if one is set)"""
         try:
-            self.connection = pymysql.connect(
-                host=config.DB_HOST,
-                port=config.DB_PORT,
-                user=config.DB_USER,
-                password=config.DB_PASSWORD,
-                database=config.DB_NAME,
-                charset='utf8mb4',
-                cursorclass=pymysql.cursors.DictCursor,
-                autocommit=False
-            )
-            logger.info("Database connection established")
+            if self.pool is not None:
+                self.connection = self.pool.acquire()
+            else:
+                self.connection = _open_connection()
+                logger.info("Database connection established")
             return True
         except Exception as e:
             logger.error(f"Database connection failed: {e}")
             return False
     
     def disconnect(self):
-        """Close database connection"""
+        """Close database connection (or return it to the pool)"""
         if self.connection:
-            self.connection.close()
-            logger.info("Database connection closed")
+            if self.pool is not None:
+                self.pool.release(self.connection, discard=self._broken)
+            else:
+                self.connection.close()
+                logger.info("Database connection closed")
+            self.connection = None
     
-    def execute_query(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
-        """Execute SELECT query and return results"""
+    def execute_query(self, query: str, params: tuple = None,
+                      cache: bool = False) -> List[Dict[str, Any]]:
+        """Execute SELECT query and return results
+        
+        With cache=True, results are served from the shared query cache
+        when enabled; cached rows are shared between callers and must not
+        be mutated. Caching is opt-in so reads that need fresh data (health
+        checks, reconcile and poll reads) always reach the database.
+        """
+        cache_key = None
+        if cache and self.use_cache and query.lstrip()[:6].upper() == 'SELECT':
+            cache_key = (query, tuple(params) if params else ())
+            cached = query_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
             with self.connection.cursor() as cursor:
                 cursor.execute(query, params or ())
                 results = cursor.fetchall()
-                return results
+            if cache_key is not None:
+                query_cache.set(cache_key, results, tables_read(query))
+            return results
         except Exception as e:
+            self._mark_if_broken(e)
             logger.error(f"Query execution failed: {e}")
             raise
     
+    def stream_query(self, query: str, params: tuple = None, chunk_size: int = None
+                     ) -> Iterator[Union[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Stream SELECT results through an unbuffered server-side cursor
+        
+        Yields one row at a time, or lists of up to chunk_size rows when
+        chunk_size is given, so memory stays flat regardless of result
+        size. The connection cannot run other queries until the stream is
+        exhausted. Abandoning the stream early discards the connection
+        instead of draining the remaining rows. The longer
+        net_write_timeout set for the stream is restored afterwards, so it
+        does not stay on the pooled connection.
+        """
+        try:
+            with self.connection.cursor() as setup:
+                setup.execute("SELECT @@SESSION.net_write_timeout AS net_write_timeout")
+                previous_timeout = int(setup.fetchone()['net_write_timeout'])
+                setup.execute(f"SET SESSION net_write_timeout = {int(config.DB_STREAM_WRITE_TIMEOUT)}")
+        except Exception as e:
+            self._mark_if_broken(e)
+            raise
+        
+        cursor = self.connection.cursor(pymysql.cursors.SSDictCursor)
+        finished = False
+        try:
+            cursor.execute(query, params or ())
+            
+            if chunk_size:
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            else:
+                for row in cursor:
+                    yield row
+            finished = True
+        except Exception as e:
+            self._mark_if_broken(e)
+            logger.error(f"Streaming query failed: {e}")
+            raise
+        finally:
+            if finished:
+                cursor.close()
+                try:
+                    with self.connection.cursor() as setup:
+                        setup.execute(f"SET SESSION net_write_timeout = {previous_timeout}")
+                except Exception as e:
+                    logger.warning(f"Could not restore net_write_timeout: {e}")
+                    self._broken = True
+            else:
+                self._broken = True
+    
+    def execute_query_in(self, query: str, ids: Sequence[int], params: tuple = None,
+                         chunk_size: int = None, cache: bool = False) -> List[Dict[str, Any]]:
+        """Run a query with an ``IN ({ids})`` list once per chunk of ids
+        
+        Every ``{ids}`` in the query is replaced with a chunk of the ids,
+        which are validated as integers and inlined so any other placeholders
+        keep their params. Results of all chunks are concatenated.
+        """
+        chunk_size = chunk_size or config.BULK_IN_CHUNK_SIZE
+        ids = [int(value) for value in ids]
+        results: List[Dict[str, Any]] = []
+        for start in range(0, len(ids), chunk_size):
+            id_list = ', '.join(str(value) for value in ids[start:start + chunk_size])
+            results.extend(self.execute_query(query.replace('{ids}', id_list), params, cache=cache))
+        return results
+    
     def execute_update(self, query: str, params: tuple = None) -> int:
         """Execute INSERT/UPDATE/DELETE query"""
         try:
             with self.connection.cursor() as cursor:
                 affected_rows = cursor.execute(query, params or ())
                 self.connection.commit()
-                return affected_rows
+            invalidate_tables(tables_written(query))
+            return affected_rows
         except Exception as e:
-            self.connection.rollback()
+            self._mark_if_broken(e)
+            try:
+                self.connection.rollback()
+            except Exception:
+                self._broken = True
             logger.error(f"Update execution failed: {e}")
             raise
     
+    def execute_many(self, query: str, params_seq: List[tuple]) -> int:
+        """Execute an INSERT/UPDATE for many parameter tuples in one transaction"""
+        try:
+            with self.connection.cursor() as cursor:
+                affected_rows = cursor.executemany(query, params_seq)
+                self.connection.commit()
+            invalidate_tables(tables_written(query))
+            return affected_rows
+        except Exception as e:
+            self._mark_if_broken(e)
+            try:
+                self.connection.rollback()
+            except Exception:
+                self._broken = True
+            logger.error(f"Batch update execution failed: {e}")
+            raise
+    
+    def _mark_if_broken(self, error: Exception):
+        """Flag the connection so it is not returned to the pool after a network error"""
+        if isinstance(error, (pymysql.err.OperationalError, pymysql.err.InterfaceError)):
+            self._broken = True
+    
     def is_connected(self) -> bool:
         """Check if connection is active"""
         try:
@@ -75,8 +393,8 @@ class DatabaseConnector:
 
 @contextmanager
 def get_db_connection():
-    """Context manager for database connections"""
-    db = DatabaseConnector()
+    """Context manager for pooled database connections"""
+    db = DatabaseConnector(pool=get_pool())
     try:
         if db.connect():
             yield db
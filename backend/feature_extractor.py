@@ -0,0 +1,242 @@
+"""
+Merger candidate feature extraction for the PSNN model
+"""
+from typing import Dict, List, Any, Sequence, Tuple
+import logging
+from datetime import date, timedelta
+import numpy as np
+from cache import result_cache
+
+logger = logging.getLogger(__name__)
+
+# Per-firm feature vector layout
+FIRM_FEATURES = [
+    'revenue',
+    'salary_cost',
+    'staff_count',
+    'avg_performance',
+    'transaction_count',
+    'recent_revenue',
+    'prior_revenue',
+    'total_capital',
+    'founded_year',
+    'industry_code'
+]
+_F = {name: idx for idx, name in enumerate(FIRM_FEATURES)}
+
+# Pair feature layout expected by PartialSigmoidNN (input_size=16)
+FEATURE_NAMES = [
+    'log_combined_revenue',
+    'log_combined_salary',
+    'revenue_size_ratio',
+    'staff_size_ratio',
+    'combined_capital_productivity',
+    'capital_productivity_gap',
+    'log_combined_revenue_per_employee',
+    'revenue_per_employee_gap',
+    'mean_performance',
+    'performance_gap',
+    'mean_revenue_growth',
+    'revenue_growth_gap',
+    'same_industry',
+    'log_combined_capital',
+    'founded_year_gap',
+    'salary_level_ratio'
+]
+
+FIRM_QUERY = "SELECT firm_id, industry, founded_year, total_capital FROM firm"
+
+STAFF_QUERY = """
+    SELECT
+        firm_id,
+        COUNT(*) as staff_count,
+        COALESCE(SUM(salary), 0) as salary_cost,
+        COALESCE(AVG(performance_score), 0) as avg_performance
+    FROM staff
+    GROUP BY firm_id
+"""
+
+SALES_QUERY = """
+    SELECT
+        firm_id,
+        COALESCE(SUM(total_amount), 0) as revenue,
+        COUNT(*) as transaction_count,
+        COALESCE(SUM(CASE WHEN sale_date >= %s THEN total_amount ELSE 0 END), 0) as recent_revenue,
+        COALESCE(SUM(CASE WHEN sale_date >= %s AND sale_date < %s
+                          THEN total_amount ELSE 0 END), 0) as prior_revenue
+    FROM sales
+    GROUP BY firm_id
+"""
+
+GROWTH_WINDOW_DAYS = 182  # Recent vs prior half-year revenue
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Elementwise division returning 0 where the denominator is 0"""
+    out = np.zeros(np.broadcast(numerator, denominator).shape)
+    np.divide(numerator, denominator, out=out, where=denominator != 0)
+    return out
+
+
+def _size_ratio(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Smaller over larger value (1 for equal sizes, 0 when both are 0)"""
+    return _safe_divide(np.minimum(a, b), np.maximum(a, b))
+
+
+class FeatureExtractor:
+    """Builds PSNN feature matrices for batches of merger candidates
+    
+    Per-firm feature vectors are loaded once, in three grouped queries or
+    from an analytics snapshot, and memoized in the result cache. Pair
+    features are then vectorized combinations of two firm rows.
+    """
+    
+    def __init__(self, db, snapshot=None):
+        self.db = db
+        self.snapshot = snapshot
+    
+    def _growth_windows(self) -> Tuple[date, date]:
+        recent_start = date.today() - timedelta(days=GROWTH_WINDOW_DAYS)
+        prior_start = recent_start - timedelta(days=GROWTH_WINDOW_DAYS)
+        return recent_start, prior_start
+    
+    def firm_features(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Get (firm_ids, per-firm feature matrix), sorted by firm_id"""
+        if self.snapshot is not None:
+            key = ('firm_features', 'snapshot', self.snapshot.built_at)
+            return result_cache.get_or_compute(key, self._snapshot_firm_features)
+        return result_cache.get_or_compute(('firm_features', 'db'), self._query_firm_features,
+                                           ('firm', 'staff', 'sales'))
+    
+    def _query_firm_features(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Load per-firm features in three grouped queries"""
+        recent_start, prior_start = self._growth_windows()
+        firms = sorted(self.db.execute_query(FIRM_QUERY), key=lambda row: row['firm_id'])
+        staff = self.db.execute_query(STAFF_QUERY)
+        sales = self.db.execute_query(SALES_QUERY, (recent_start, prior_start, recent_start))
+        
+        firm_ids = np.array([row['firm_id'] for row in firms], dtype=np.int64)
+        position = {firm_id: idx for idx, firm_id in enumerate(firm_ids.tolist())}
+        industries: Dict[str, int] = {}
+        
+        features = np.zeros((len(firm_ids), len(FIRM_FEATURES)))
+        for idx, row in enumerate(firms):
+            features[idx, _F['total_capital']] = float(row['total_capital'] or 0)
+            features[idx, _F['founded_year']] = row['founded_year'] or 0
+            industry = row['industry']
+            features[idx, _F['industry_code']] = -1 if industry is None else \
+                industries.setdefault(industry, len(industries))
+        
+        for row in staff:
+            idx = position.get(row['firm_id'])
+            if idx is not None:
+                features[idx, _F['staff_count']] = row['staff_count']
+                features[idx, _F['salary_cost']] = float(row['salary_cost'])
+                features[idx, _F['avg_performance']] = float(row['avg_performance'])
+        
+        for row in sales:
+            idx = position.get(row['firm_id'])
+            if idx is not None:
+                features[idx, _F['revenue']] = float(row['revenue'])
+                features[idx, _F['transaction_count']] = row['transaction_count']
+                features[idx, _F['recent_revenue']] = float(row['recent_revenue'])
+                features[idx, _F['prior_revenue']] = float(row['prior_revenue'])
+        
+        logger.info(f"Loaded feature vectors for {len(firm_ids)} firms")
+        return firm_ids, features
+    
+    def _snapshot_firm_features(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Compute per-firm features from the analytics snapshot"""
+        from analytics_snapshot import date_to_day
+        
+        snapshot = self.snapshot
+        recent_start, prior_start = self._growth_windows()
+        n = snapshot.n_firms
+        
+        features = np.zeros((n, len(FIRM_FEATURES)))
+        features[:, _F['revenue']] = snapshot.revenue_by_firm_total
+        features[:, _F['salary_cost']] = snapshot.salary_by_firm
+        features[:, _F['staff_count']] = snapshot.staff_count_by_firm
+        features[:, _F['transaction_count']] = snapshot.transactions_by_firm
+        features[:, _F['total_capital']] = snapshot.firm_total_capital
+        features[:, _F['founded_year']] = snapshot.firm_founded_year
+        features[:, _F['industry_code']] = snapshot.firm_industry
+        
+        known = snapshot.staff_firm >= 0
+        performance_sum = np.bincount(snapshot.staff_firm[known],
+                                      weights=snapshot.staff_performance[known], minlength=n)
+        features[:, _F['avg_performance']] = _safe_divide(performance_sum, snapshot.staff_count_by_firm)
+        
+        known = snapshot.sales_firm >= 0
+        recent = known & (snapshot.sales_day >= date_to_day(recent_start))
+        prior = known & (snapshot.sales_day >= date_to_day(prior_start)) & ~recent
+        features[:, _F['recent_revenue']] = np.bincount(
+            snapshot.sales_firm[recent], weights=snapshot.sales_amount[recent], minlength=n)
+        features[:, _F['prior_revenue']] = np.bincount(
+            snapshot.sales_firm[prior], weights=snapshot.sales_amount[prior], minlength=n)
+        
+        return snapshot.firm_ids, features
+    
+    def pair_features(self, pairs: Sequence[Tuple[int, int]], dtype=np.float64) -> np.ndarray:
+        """Build the (n_pairs, 16) feature matrix for (firm_a_id, firm_b_id) pairs
+        
+        Returns a C-contiguous matrix ready for PartialSigmoidNN.predict.
+        """
+        firm_ids, firm_matrix = self.firm_features()
+        pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        
+        positions = np.searchsorted(firm_ids, pairs)
+        positions = np.minimum(positions, len(firm_ids) - 1)
+        if len(firm_ids) == 0 or not np.all(firm_ids[positions] == pairs):
+            missing = sorted(set(pairs.ravel().tolist()) - set(firm_ids.tolist()))
+            raise ValueError(f"Unknown firm ids: {missing[:10]}")
+        
+        A = firm_matrix[positions[:, 0]]
+        B = firm_matrix[positions[:, 1]]
+        return self.combine(A, B, dtype)
+    
+    @staticmethod
+    def combine(A: np.ndarray, B: np.ndarray, dtype=np.float64) -> np.ndarray:
+        """Combine per-firm feature rows of firm A and firm B into pair features"""
+        col = lambda M, name: M[:, _F[name]]
+        out = np.empty((A.shape[0], len(FEATURE_NAMES)), dtype=dtype)
+        
+        revenue_a, revenue_b = col(A, 'revenue'), col(B, 'revenue')
+        salary_a, salary_b = col(A, 'salary_cost'), col(B, 'salary_cost')
+        staff_a, staff_b = col(A, 'staff_count'), col(B, 'staff_count')
+        combined_revenue = revenue_a + revenue_b
+        combined_salary = salary_a + salary_b
+        combined_staff = staff_a + staff_b
+        
+        productivity_a = _safe_divide(revenue_a, salary_a)
+        productivity_b = _safe_divide(revenue_b, salary_b)
+        rpe_a = _safe_divide(revenue_a, staff_a)
+        rpe_b = _safe_divide(revenue_b, staff_b)
+        growth_a = np.clip(_safe_divide(col(A, 'recent_revenue'), col(A, 'prior_revenue')) - 1, -1, 5)
+        growth_b = np.clip(_safe_divide(col(B, 'recent_revenue'), col(B, 'prior_revenue')) - 1, -1, 5)
+        growth_a[col(A, 'prior_revenue') == 0] = 0
+        growth_b[col(B, 'prior_revenue') == 0] = 0
+        industry_a, industry_b = col(A, 'industry_code'), col(B, 'industry_code')
+        
+        out[:, 0] = np.log1p(combined_revenue)
+        out[:, 1] = np.log1p(combined_salary)
+        out[:, 2] = _size_ratio(revenue_a, revenue_b)
+        out[:, 3] = _size_ratio(staff_a, staff_b)
+        out[:, 4] = _safe_divide(combined_revenue, combined_salary)
+        out[:, 5] = np.abs(productivity_a - productivity_b)
+        out[:, 6] = np.log1p(_safe_divide(combined_revenue, combined_staff))
+        out[:, 7] = np.abs(np.log1p(rpe_a) - np.log1p(rpe_b))
+        out[:, 8] = (col(A, 'avg_performance') + col(B, 'avg_performance')) / 2
+        out[:, 9] = np.abs(col(A, 'avg_performance') - col(B, 'avg_performance'))
+        out[:, 10] = (growth_a + growth_b) / 2
+        out[:, 11] = np.abs(growth_a - growth_b)
+        out[:, 12] = (industry_a == industry_b) & (industry_a >= 0)
+        out[:, 13] = np.log1p(col(A, 'total_capital') + col(B, 'total_capital'))
+        out[:, 14] = np.abs(col(A, 'founded_year') - col(B, 'founded_year'))
+        out[:, 15] = _size_ratio(_safe_divide(salary_a, staff_a), _safe_divide(salary_b, staff_b))
+        
+        return out
+    
+    def describe(self) -> List[Dict[str, Any]]:
+        """List the pair feature names in matrix column order"""
+        return [{'index': idx, 'name': name} for idx, name in enumerate(FEATURE_NAMES)]
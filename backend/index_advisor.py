@@ -0,0 +1,193 @@
+"""
+EXPLAIN-based index advisor for the analyzer queries
+
+    python index_advisor.py [--min-rows N] [--workload NAME ...] [--json]
+
+Runs every registered analyzer workload against the configured database,
+EXPLAINs each distinct SELECT it issues and flags full table scans and
+filesorts. Exits with status 1 when anything is flagged, so it can guard
+against regressions when new queries are added.
+"""
+from typing import Dict, List, Any, Callable, Iterable, Optional, Sequence
+import argparse
+import json
+import logging
+from datetime import date, timedelta
+from config import config
+from database import DatabaseConnector, get_db_connection
+from cache import result_cache
+from roi_calculator import ROICalculator
+from capital_analyzer import CapitalAnalyzer
+from bottleneck_detector import BottleneckDetector
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_ROWS = 1000  # Smaller estimated scans are not worth an index
+
+
+def _window():
+    today = date.today()
+    return (today - timedelta(days=365)).isoformat(), today.isoformat()
+
+
+# Analyzer calls whose queries are checked: name -> fn(db, firm_id)
+WORKLOADS: Dict[str, Callable[[Any, int], Any]] = {
+    'roi.calculate_roi': lambda db, firm_id: ROICalculator(db).calculate_roi(firm_id),
+    'roi.calculate_roi[window]': lambda db, firm_id: ROICalculator(db).calculate_roi(firm_id, *_window()),
+    'roi.calculate_roi_trends': lambda db, firm_id: ROICalculator(db).calculate_roi_trends(firm_id),
+    'roi.calculate_all_firms_roi': lambda db, firm_id: ROICalculator(db).calculate_all_firms_roi(),
+    'roi.calculate_all_firms_roi[window]':
+        lambda db, firm_id: ROICalculator(db).calculate_all_firms_roi(*_window()),
+    'roi.calculate_roi_bulk': lambda db, firm_id: ROICalculator(db).calculate_roi_bulk([firm_id]),
+    'capital.calculate_staff_efficiency':
+        lambda db, firm_id: CapitalAnalyzer(db).calculate_staff_efficiency(firm_id),
+    'capital.calculate_aggregate_metrics': lambda db, firm_id: CapitalAnalyzer(db).calculate_aggregate_metrics(),
+    'capital.identify_productivity_outliers':
+        lambda db, firm_id: CapitalAnalyzer(db).identify_productivity_outliers(*_window()),
+    'capital.calculate_productivity_bulk':
+        lambda db, firm_id: CapitalAnalyzer(db).calculate_productivity_bulk([firm_id]),
+    'capital.calculate_department_breakdown':
+        lambda db, firm_id: CapitalAnalyzer(db).calculate_department_breakdown(),
+    'bottleneck.detect_sales_bottlenecks': lambda db, firm_id: BottleneckDetector(db).detect_sales_bottlenecks(),
+    'bottleneck.detect_bottlenecks': lambda db, firm_id: BottleneckDetector(db).detect_bottlenecks()
+}
+
+
+def register_workload(name: str, fn: Callable[[Any, int], Any]):
+    """Add an analyzer call to the advisor's checks"""
+    WORKLOADS[name] = fn
+
+
+def assess_plan(plan: Sequence[Dict[str, Any]], min_rows: int = DEFAULT_MIN_ROWS) -> List[Dict[str, Any]]:
+    """Flag full table scans and filesorts in EXPLAIN rows
+    
+    Derived tables (``<derivedN>``) and scans estimated below min_rows
+    are not flagged.
+    """
+    findings = []
+    for row in plan:
+        table = row.get('table') or ''
+        rows = int(row.get('rows') or 0)
+        extra = row.get('Extra') or ''
+        if table.startswith('<') or rows < min_rows:
+            continue
+        if row.get('type') == 'ALL':
+            findings.append({
+                'kind': 'full_scan',
+                'table': table,
+                'rows': rows,
+                'possible_keys': row.get('possible_keys'),
+                'message': f"Full scan of {table} (~{rows} rows)"
+            })
+        if 'Using filesort' in extra:
+            findings.append({
+                'kind': 'filesort',
+                'table': table,
+                'rows': rows,
+                'message': f"Filesort over {table} (~{rows} rows)"
+            })
+    return findings
+
+
+class ExplainingConnector(DatabaseConnector):
+    """DatabaseConnector that EXPLAINs every SELECT before running it
+    
+    Queries still run (uncached) so analyzers get real rows and follow
+    the same code paths. Plans are collected once per distinct query
+    text, along with the workloads that issued it.
+    """
+    
+    def __init__(self, connection, min_rows: int = DEFAULT_MIN_ROWS):
+        super().__init__(use_cache=False)
+        self.connection = connection
+        self.min_rows = min_rows
+        self.workload: Optional[str] = None
+        self.plans: Dict[str, Dict[str, Any]] = {}
+    
+    def _explain(self, query: str, params: tuple = None):
+        text = ' '.join(query.split())
+        entry = self.plans.get(text)
+        if entry is None:
+            entry = self.plans[text] = {'query': text, 'workloads': [], 'plan': [], 'findings': []}
+            try:
+                with self.connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN ' + query, params or ())
+                    entry['plan'] = list(cursor.fetchall())
+                entry['findings'] = assess_plan(entry['plan'], self.min_rows)
+            except Exception as e:
+                entry['error'] = str(e)
+        if self.workload and self.workload not in entry['workloads']:
+            entry['workloads'].append(self.workload)
+    
+    def execute_query(self, query: str, params: tuple = None,
+                      cache: bool = False) -> List[Dict[str, Any]]:
+        if query.lstrip()[:6].upper() == 'SELECT':
+            self._explain(query, params)
+        return super().execute_query(query, params, cache=False)
+    
+    def stream_query(self, query: str, params: tuple = None, chunk_size: int = None):
+        self._explain(query, params)
+        return super().stream_query(query, params, chunk_size)
+
+
+def run_advisor(db, workloads: Iterable[str] = None, min_rows: int = DEFAULT_MIN_ROWS) -> Dict[str, Any]:
+    """Run workloads through an ExplainingConnector and report flagged plans"""
+    names = list(workloads or WORKLOADS)
+    unknown = set(names) - set(WORKLOADS)
+    if unknown:
+        raise ValueError(f"Unknown workloads: {sorted(unknown)}")
+    
+    first = db.execute_query("SELECT MIN(firm_id) as firm_id FROM firm", cache=False)[0]['firm_id']
+    explainer = ExplainingConnector(db.connection, min_rows)
+    errors = []
+    for name in names:
+        explainer.workload = name
+        result_cache.clear()  # Cached analyzer results would skip their queries
+        try:
+            WORKLOADS[name](explainer, first or 0)
+        except Exception as e:
+            errors.append({'workload': name, 'error': str(e)})
+    
+    queries = list(explainer.plans.values())
+    flagged = [entry for entry in queries if entry['findings'] or entry.get('error')]
+    return {
+        'use_rollup_tables': config.USE_ROLLUP_TABLES,
+        'min_rows': min_rows,
+        'queries_checked': len(queries),
+        'flagged_count': len(flagged),
+        'flagged': flagged,
+        'queries': queries,
+        'workload_errors': errors
+    }
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="EXPLAIN the analyzer queries and flag full scans and filesorts")
+    parser.add_argument('--min-rows', type=int, default=DEFAULT_MIN_ROWS,
+                        help="Ignore scans estimated below this many rows")
+    parser.add_argument('--workload', action='append', dest='workloads', choices=sorted(WORKLOADS),
+                        help="Only run this workload (repeatable)")
+    parser.add_argument('--json', action='store_true', help="Print the full report as JSON")
+    args = parser.parse_args(argv)
+    
+    with get_db_connection() as db:
+        report = run_advisor(db, args.workloads, args.min_rows)
+    
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        for entry in report['flagged']:
+            print(f"[{', '.join(entry['workloads'])}]\n  {entry['query']}")
+            for finding in entry['findings']:
+                print(f"  - {finding['message']}")
+            if entry.get('error'):
+                print(f"  - EXPLAIN failed: {entry['error']}")
+        for error in report['workload_errors']:
+            print(f"[{error['workload']}] failed: {error['error']}")
+        print(f"{report['queries_checked']} queries checked, {report['flagged_count']} flagged")
+    return 1 if report['flagged_count'] or report['workload_errors'] else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    raise SystemExit(main())
@@ -3,14 +3,25 @@ Merger equity analysis and recommendations
 """
 from typing import Dict, List, Any
 import logging
+import numpy as np
+from config import config
+from roi_calculator import ROICalculator
 
 logger = logging.getLogger(__name__)
 
+SYNERGY_RATE = 0.10  # Cost reduction from economies of scale
+MERGER_COST_RATE = 0.05  # Merger cost as a share of combined costs
+
+def recommend(roi: float) -> str:
+    """Map a merger ROI to a recommendation"""
+    return 'Proceed' if roi > 20 else 'Review' if roi > 0 else 'Decline'
+
 class MergerAnalyzer:
     """Analyzes merger opportunities and equity distribution"""
     
-    def __init__(self, db):
+    def __init__(self, db, snapshot=None):
         self.db = db
+        self.snapshot = snapshot
     
     def analyze_merger(self, firm_a_id: int, firm_b_id: int) -> Dict[str, Any]:
         """Analyze merger opportunity between two firms"""
@@ -23,11 +34,11 @@ class MergerAnalyzer:
         combined_costs = firm_a['costs'] + firm_b['costs']
         
         # Estimate synergies (10% cost reduction from economies of scale)
-        estimated_synergies = combined_costs * 0.10
+        estimated_synergies = combined_costs * SYNERGY_RATE
         
         # Calculate ROI
         net_benefit = combined_revenue - (combined_costs - estimated_synergies)
-        merger_cost = combined_costs * 0.05  # Assume 5% of costs for merger
+        merger_cost = combined_costs * MERGER_COST_RATE  # Assume 5% of costs for merger
         roi = ((net_benefit - merger_cost) / merger_cost) * 100 if merger_cost > 0 else 0
         
         # Equity distribution based on revenue contribution
@@ -48,19 +59,19 @@ class MergerAnalyzer:
                 'firm_a_percentage': equity_a,
                 'firm_b_percentage': equity_b
             },
-            'recommendation': 'Proceed' if roi > 20 else 'Review' if roi > 0 else 'Decline'
+            'recommendation': recommend(roi)
         }
     
     def _get_firm_metrics(self, firm_id: int) -> Dict[str, Any]:
         """Get key metrics for a firm"""
         revenue_query = "SELECT COALESCE(SUM(total_amount), 0) as revenue FROM sales WHERE firm_id = %s"
-        revenue = self.db.execute_query(revenue_query, (firm_id,))[0]['revenue']
+        revenue = self.db.execute_query(revenue_query, (firm_id,), cache=True)[0]['revenue']
         
         costs_query = "SELECT COALESCE(SUM(salary), 0) as costs FROM staff WHERE firm_id = %s"
-        costs = self.db.execute_query(costs_query, (firm_id,))[0]['costs']
+        costs = self.db.execute_query(costs_query, (firm_id,), cache=True)[0]['costs']
         
         firm_query = "SELECT firm_name FROM firm WHERE firm_id = %s"
-        firm_name = self.db.execute_query(firm_query, (firm_id,))[0]['firm_name']
+        firm_name = self.db.execute_query(firm_query, (firm_id,), cache=True)[0]['firm_name']
         
         return {
             'firm_id': firm_id,
@@ -68,3 +79,142 @@ class MergerAnalyzer:
             'revenue': float(revenue),
             'costs': float(costs)
         }
+    
+    def _load_firm_vectors(self) -> Dict[str, Any]:
+        """Load firm ids, names, revenue and cost vectors for every firm"""
+        totals = ROICalculator(self.db, snapshot=self.snapshot).load_firm_totals()
+        
+        if self.snapshot is not None:
+            names = list(self.snapshot.firm_names)
+        else:
+            rows = self.db.execute_query("SELECT firm_id, firm_name FROM firm ORDER BY firm_id", cache=True)
+            names = [row['firm_name'] for row in rows]
+        
+        return {
+            'firm_ids': totals['firm_ids'],
+            'firm_names': names,
+            'revenue': totals['revenue'],
+            'costs': totals['costs']
+        }
+    
+    @staticmethod
+    def pair_roi(revenue_a: np.ndarray, costs_a: np.ndarray,
+                 revenue_b: np.ndarray, costs_b: np.ndarray) -> np.ndarray:
+        """Vectorized merger ROI, broadcasting over any shapes (same formula as analyze_merger)"""
+        combined_revenue = revenue_a + revenue_b
+        combined_costs = costs_a + costs_b
+        estimated_synergies = combined_costs * SYNERGY_RATE
+        net_benefit = combined_revenue - (combined_costs - estimated_synergies)
+        merger_cost = combined_costs * MERGER_COST_RATE
+        
+        roi = np.zeros(np.broadcast(combined_revenue, combined_costs).shape)
+        np.divide(net_benefit - merger_cost, merger_cost, out=roi, where=merger_cost > 0)
+        roi *= 100
+        return roi
+    
+    def screen_all_pairs(self, top_k: int = 20, per_firm_k: int = 3,
+                         block_elements: int = None) -> Dict[str, Any]:
+        """Screen every firm pair and return the best merger candidates
+        
+        Evaluates all N x N pairs with NumPy broadcasting in row blocks of
+        about block_elements cells, so memory stays bounded. Returns the
+        global top_k unordered pairs and each firm's top per_firm_k partners.
+        """
+        block_elements = block_elements or config.MERGER_SCREEN_BLOCK_ELEMENTS
+        vectors = self._load_firm_vectors()
+        revenue, costs = vectors['revenue'], vectors['costs']
+        n = len(revenue)
+        
+        if n < 2:
+            return {'firm_count': n, 'pairs_evaluated': 0, 'top_pairs': [], 'per_firm': {}}
+        
+        top_k = min(top_k, n * (n - 1) // 2)
+        per_firm_k = min(per_firm_k, n - 1)
+        block_rows = max(1, block_elements // n)
+        columns = np.arange(n)
+        
+        best_roi = np.empty(0)
+        best_a = np.empty(0, dtype=np.int64)
+        best_b = np.empty(0, dtype=np.int64)
+        partner_idx = np.empty((n, per_firm_k), dtype=np.int64)
+        
+        for start in range(0, n, block_rows):
+            stop = min(start + block_rows, n)
+            rows = np.arange(start, stop)
+            roi = self.pair_roi(revenue[rows, None], costs[rows, None], revenue, costs)
+            
+            # Each firm's best partners (any other firm)
+            roi[rows - start, rows] = -np.inf
+            if per_firm_k:
+                candidates = np.argpartition(-roi, per_firm_k - 1, axis=1)[:, :per_firm_k]
+                candidate_roi = np.take_along_axis(roi, candidates, axis=1)
+                order = np.argsort(-candidate_roi, axis=1, kind='stable')
+                partner_idx[start:stop] = np.take_along_axis(candidates, order, axis=1)
+            
+            # Global best unordered pairs (upper triangle only)
+            if top_k:
+                roi[columns[None, :] <= rows[:, None]] = -np.inf
+                flat = roi.ravel()
+                keep = min(top_k, flat.size)
+                selected = np.argpartition(-flat, keep - 1)[:keep]
+                
+                best_roi = np.concatenate((best_roi, flat[selected]))
+                best_a = np.concatenate((best_a, rows[selected // n]))
+                best_b = np.concatenate((best_b, selected % n))
+                if len(best_roi) > top_k:
+                    survivors = np.argpartition(-best_roi, top_k - 1)[:top_k]
+                    best_roi, best_a, best_b = best_roi[survivors], best_a[survivors], best_b[survivors]
+        
+        order = np.argsort(-best_roi, kind='stable')
+        top_pairs = self._describe_pairs(vectors, best_a[order], best_b[order])
+        
+        per_firm = {}
+        if per_firm_k:
+            firm_rows = np.repeat(np.arange(n), per_firm_k)
+            partners = self._describe_pairs(vectors, firm_rows, partner_idx.ravel())
+            firm_ids = vectors['firm_ids'].tolist()
+            for i, firm_id in enumerate(firm_ids):
+                per_firm[firm_id] = partners[i * per_firm_k:(i + 1) * per_firm_k]
+        
+        logger.info(f"Screened {n * (n - 1) // 2} merger pairs across {n} firms")
+        
+        return {
+            'firm_count': n,
+            'pairs_evaluated': n * (n - 1) // 2,
+            'top_pairs': top_pairs,
+            'per_firm': per_firm
+        }
+    
+    def _describe_pairs(self, vectors: Dict[str, Any], idx_a: np.ndarray,
+                        idx_b: np.ndarray) -> List[Dict[str, Any]]:
+        """Build result records for selected pairs"""
+        revenue, costs = vectors['revenue'], vectors['costs']
+        ra, rb, ca, cb = revenue[idx_a], revenue[idx_b], costs[idx_a], costs[idx_b]
+        roi = self.pair_roi(ra, ca, rb, cb)
+        combined_revenue = ra + rb
+        combined_costs = ca + cb
+        has_revenue = combined_revenue > 0
+        equity_a = np.zeros(len(idx_a))
+        np.divide(ra, combined_revenue, out=equity_a, where=has_revenue)
+        equity_a *= 100
+        equity_a[~has_revenue] = 50.0
+        
+        firm_ids, names = vectors['firm_ids'], vectors['firm_names']
+        return [{
+            'firm_a_id': int(firm_ids[a]),
+            'firm_a_name': names[a],
+            'firm_b_id': int(firm_ids[b]),
+            'firm_b_name': names[b],
+            'combined_revenue': rev,
+            'combined_costs': cost,
+            'estimated_synergies': cost * SYNERGY_RATE,
+            'roi_percentage': r,
+            'equity_distribution': {
+                'firm_a_percentage': eq,
+                'firm_b_percentage': 100 - eq
+            },
+            'recommendation': recommend(r)
+        } for a, b, rev, cost, r, eq in zip(
+            idx_a.tolist(), idx_b.tolist(), combined_revenue.tolist(),
+            combined_costs.tolist(), roi.tolist(), equity_a.tolist()
+        )]
@@ -0,0 +1,177 @@
+"""
+Merger success scoring with request micro-batching
+"""
+from typing import Dict, List, Any, Callable, Optional, Sequence, Tuple
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+from config import config
+from feature_extractor import FeatureExtractor
+from model_registry import model_registry
+
+logger = logging.getLogger(__name__)
+
+
+class _ScoreRequest:
+    __slots__ = ('X', 'future')
+    
+    def __init__(self, X: np.ndarray):
+        self.X = X
+        self.future: Future = Future()
+
+
+class MicroBatcher:
+    """Coalesces concurrent predict calls into one batched call
+    
+    A background thread takes the first queued request, then keeps
+    collecting requests until ``max_batch_size`` rows are gathered or
+    ``max_wait_ms`` has passed, and runs ``predict_fn`` once over the
+    stacked rows. Each caller's future resolves to its own slice of the
+    result plus the size of the batch it was served in. Requests that
+    are already at least ``max_batch_size`` rows bypass the queue.
+    """
+    
+    def __init__(self, predict_fn: Callable[[np.ndarray], np.ndarray],
+                 max_batch_size: int = None, max_wait_ms: float = None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size or config.SCORING_MAX_BATCH_SIZE
+        self.max_wait = (config.SCORING_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[_ScoreRequest]" = queue.Queue()
+        self._carry: Optional[_ScoreRequest] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'batches': 0,
+            'requests': 0,
+            'rows': 0,
+            'max_batch_rows': 0,
+            'direct_requests': 0
+        }
+        self._histogram: Dict[int, int] = {}
+    
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='score-batcher', daemon=True)
+                    self._thread.start()
+    
+    def predict(self, X: np.ndarray, timeout: float = None) -> Tuple[np.ndarray, int]:
+        """Score rows, returning (probabilities, rows in the batch that served them)"""
+        X = np.ascontiguousarray(X)
+        if X.shape[0] >= self.max_batch_size:
+            probabilities = np.asarray(self.predict_fn(X)).ravel()
+            self._record(X.shape[0], 1, direct=True)
+            return probabilities, X.shape[0]
+        
+        request = _ScoreRequest(X)
+        self._ensure_started()
+        self._queue.put(request)
+        return request.future.result(timeout)
+    
+    def _next_batch(self) -> List[_ScoreRequest]:
+        """Collect requests until the batch is full or the wait window closes"""
+        first = self._carry or self._queue.get()
+        self._carry = None
+        batch, rows = [first], first.X.shape[0]
+        deadline = time.monotonic() + self.max_wait
+        
+        while rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if rows + request.X.shape[0] > self.max_batch_size:
+                self._carry = request
+                break
+            batch.append(request)
+            rows += request.X.shape[0]
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            sizes = [request.X.shape[0] for request in batch]
+            rows = sum(sizes)
+            try:
+                X = batch[0].X if len(batch) == 1 else np.concatenate([r.X for r in batch])
+                probabilities = np.asarray(self.predict_fn(X)).ravel()
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            
+            offset = 0
+            for request, size in zip(batch, sizes):
+                request.future.set_result((probabilities[offset:offset + size], rows))
+                offset += size
+            self._record(rows, len(batch))
+    
+    def _record(self, rows: int, requests: int, direct: bool = False):
+        bucket = 1 << max(rows - 1, 0).bit_length()
+        with self._stats_lock:
+            self._stats['batches'] += 1
+            self._stats['requests'] += requests
+            self._stats['rows'] += rows
+            self._stats['max_batch_rows'] = max(self._stats['max_batch_rows'], rows)
+            if direct:
+                self._stats['direct_requests'] += 1
+            self._histogram[bucket] = self._histogram.get(bucket, 0) + 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Get achieved batch sizes and counters"""
+        with self._stats_lock:
+            batches = self._stats['batches']
+            return {
+                **self._stats,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'queued': self._queue.qsize(),
+                'mean_batch_rows': self._stats['rows'] / batches if batches else 0.0,
+                'mean_requests_per_batch': self._stats['requests'] / batches if batches else 0.0,
+                'batch_rows_histogram': {f"<={bucket}": count
+                                         for bucket, count in sorted(self._histogram.items())}
+            }
+
+
+def _predict_active(X: np.ndarray) -> np.ndarray:
+    """Success probabilities from the currently active model"""
+    _, probabilities = model_registry.get().predict(X)
+    return probabilities
+
+
+score_batcher = MicroBatcher(_predict_active)
+
+
+def score_pairs(connection_factory: Callable, pairs: Sequence[Tuple[int, int]],
+                threshold: float = 0.5, snapshot=None) -> Dict[str, Any]:
+    """Score merger pairs with the active PSNN model through the micro-batcher
+    
+    The database connection is only held while building features, not
+    while waiting for the batch window.
+    """
+    model_registry.get()  # Fail fast when no model has been published
+    with connection_factory() as db:
+        X = FeatureExtractor(db, snapshot=snapshot).pair_features(pairs)
+    probabilities, batch_rows = score_batcher.predict(X)
+    
+    scores = [
+        {
+            'firm_a_id': int(firm_a_id),
+            'firm_b_id': int(firm_b_id),
+            'success_probability': float(probability),
+            'predicted_success': bool(probability > threshold)
+        }
+        for (firm_a_id, firm_b_id), probability in zip(pairs, probabilities.tolist())
+    ]
+    return {
+        'scores': scores,
+        'count': len(scores),
+        'model_version': model_registry.active_version(),
+        'batch_rows': batch_rows
+    }
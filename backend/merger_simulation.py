@@ -0,0 +1,204 @@
+"""
+Monte Carlo merger simulation
+"""
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import config
+from merger_analyzer import MergerAnalyzer, SYNERGY_RATE, MERGER_COST_RATE
+from roi_calculator import ROICalculator
+
+logger = logging.getLogger(__name__)
+
+# Distributions of the assumptions analyze_merger fixes as point values
+DEFAULT_ASSUMPTIONS: Dict[str, Dict[str, Any]] = {
+    'synergy_rate': {'distribution': 'triangular', 'low': 0.02, 'mode': SYNERGY_RATE, 'high': 0.20},
+    'merger_cost_rate': {'distribution': 'triangular', 'low': 0.03, 'mode': MERGER_COST_RATE, 'high': 0.10},
+    'revenue_retention': {'distribution': 'normal', 'mean': 0.97, 'std': 0.05, 'low': 0.5, 'high': 1.2}
+}
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+def sample(spec: Dict[str, Any], rng: np.random.Generator, size: int) -> np.ndarray:
+    """Draw samples from a distribution spec
+    
+    Supported distributions: fixed, uniform, normal, lognormal, triangular
+    and beta. Optional low/high bounds clip normal and lognormal draws.
+    """
+    kind = spec.get('distribution', 'fixed')
+    
+    if kind == 'fixed':
+        draws = np.full(size, float(spec['value']))
+    elif kind == 'uniform':
+        draws = rng.uniform(spec['low'], spec['high'], size)
+    elif kind == 'normal':
+        draws = rng.normal(spec['mean'], spec['std'], size)
+    elif kind == 'lognormal':
+        draws = rng.lognormal(spec['mean'], spec['sigma'], size)
+    elif kind == 'triangular':
+        draws = rng.triangular(spec['low'], spec['mode'], spec['high'], size)
+    elif kind == 'beta':
+        draws = spec.get('low', 0.0) + rng.beta(spec['a'], spec['b'], size) * \
+            (spec.get('high', 1.0) - spec.get('low', 0.0))
+    else:
+        raise ValueError(f"Unknown distribution: {kind}")
+    
+    if kind in ('normal', 'lognormal') and ('low' in spec or 'high' in spec):
+        np.clip(draws, spec.get('low', -np.inf), spec.get('high', np.inf), out=draws)
+    return draws
+
+
+def resolve_assumptions(overrides: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Dict[str, Any]]:
+    """Merge assumption overrides into the defaults, rejecting unknown names"""
+    assumptions = dict(DEFAULT_ASSUMPTIONS)
+    for name, spec in (overrides or {}).items():
+        if name not in DEFAULT_ASSUMPTIONS:
+            raise ValueError(f"Unknown assumption: {name}")
+        assumptions[name] = spec
+    return assumptions
+
+
+def pair_rng(seed: int, firm_a_id: int, firm_b_id: int) -> np.random.Generator:
+    """Random generator for one pair, independent of how pairs are batched"""
+    return np.random.default_rng(np.random.SeedSequence([seed, firm_a_id, firm_b_id]))
+
+
+def simulate_roi(revenue_a: float, costs_a: float, revenue_b: float, costs_b: float,
+                 n_draws: int, rng: np.random.Generator,
+                 assumptions: Dict[str, Dict[str, Any]]) -> np.ndarray:
+    """Simulate merger ROI draws (same formula as analyze_merger)"""
+    synergy_rate = sample(assumptions['synergy_rate'], rng, n_draws)
+    merger_cost_rate = sample(assumptions['merger_cost_rate'], rng, n_draws)
+    retention_a = sample(assumptions['revenue_retention'], rng, n_draws)
+    retention_b = sample(assumptions['revenue_retention'], rng, n_draws)
+    
+    combined_revenue = revenue_a * retention_a + revenue_b * retention_b
+    combined_costs = costs_a + costs_b
+    net_benefit = combined_revenue - combined_costs * (1 - synergy_rate)
+    merger_cost = combined_costs * merger_cost_rate
+    
+    roi = np.zeros(n_draws)
+    np.divide(net_benefit - merger_cost, merger_cost, out=roi, where=merger_cost > 0)
+    roi *= 100
+    return roi
+
+
+def summarize_roi(roi: np.ndarray) -> Dict[str, Any]:
+    """Summarize ROI draws into percentiles, downside risk and a recommendation"""
+    band_shares = {
+        'Proceed': float(np.mean(roi > 20)),
+        'Review': float(np.mean((roi > 0) & (roi <= 20))),
+        'Decline': float(np.mean(roi <= 0))
+    }
+    recommendation = max(band_shares, key=band_shares.get)
+    percentiles = np.percentile(roi, PERCENTILES)
+    
+    return {
+        'n_draws': int(len(roi)),
+        'mean_roi': float(roi.mean()),
+        'std_roi': float(roi.std()),
+        'roi_percentiles': {f'p{p}': float(v) for p, v in zip(PERCENTILES, percentiles)},
+        'probability_negative_roi': float(np.mean(roi < 0)),
+        'recommendation_shares': band_shares,
+        'recommendation': recommendation,
+        'confidence': band_shares[recommendation]
+    }
+
+
+def _simulate_chunk(pairs: List[Tuple[int, int, float, float, float, float]], n_draws: int,
+                    seed: int, assumptions: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Simulate a chunk of pairs (runs inside pool worker processes)"""
+    results = []
+    for firm_a_id, firm_b_id, revenue_a, costs_a, revenue_b, costs_b in pairs:
+        rng = pair_rng(seed, firm_a_id, firm_b_id)
+        roi = simulate_roi(revenue_a, costs_a, revenue_b, costs_b, n_draws, rng, assumptions)
+        results.append({'firm_a_id': firm_a_id, 'firm_b_id': firm_b_id, **summarize_roi(roi)})
+    return results
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ProcessPoolExecutor:
+    """Get the shared simulation process pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=config.SIMULATION_WORKERS)
+    return _executor
+
+
+class MergerSimulator:
+    """Monte Carlo simulation of merger outcomes under uncertain assumptions"""
+    
+    def __init__(self, db, snapshot=None):
+        self.db = db
+        self.snapshot = snapshot
+    
+    def simulate_merger(self, firm_a_id: int, firm_b_id: int, n_draws: int = None,
+                        seed: int = None, assumptions: Dict[str, Dict[str, Any]] = None
+                        ) -> Dict[str, Any]:
+        """Simulate one merger and summarize the ROI distribution"""
+        n_draws = n_draws or config.SIMULATION_DRAWS
+        seed = config.SIMULATION_SEED if seed is None else seed
+        assumptions = resolve_assumptions(assumptions)
+        
+        analyzer = MergerAnalyzer(self.db)
+        firm_a = analyzer._get_firm_metrics(firm_a_id)
+        firm_b = analyzer._get_firm_metrics(firm_b_id)
+        
+        rng = pair_rng(seed, firm_a_id, firm_b_id)
+        roi = simulate_roi(firm_a['revenue'], firm_a['costs'], firm_b['revenue'],
+                           firm_b['costs'], n_draws, rng, assumptions)
+        
+        return {
+            'firm_a': firm_a,
+            'firm_b': firm_b,
+            'seed': seed,
+            'assumptions': assumptions,
+            **summarize_roi(roi)
+        }
+    
+    def simulate_batch(self, pairs: Sequence[Tuple[int, int]], n_draws: int = None,
+                       seed: int = None, assumptions: Dict[str, Dict[str, Any]] = None
+                       ) -> List[Dict[str, Any]]:
+        """Simulate many mergers, spreading large batches across the process pool
+        
+        Each pair gets its own seeded generator, so results do not depend
+        on how pairs are split between workers. Only the firms named in
+        pairs are loaded.
+        """
+        n_draws = n_draws or config.SIMULATION_DRAWS
+        seed = config.SIMULATION_SEED if seed is None else seed
+        assumptions = resolve_assumptions(assumptions)
+        
+        firm_ids = list(dict.fromkeys(firm_id for pair in pairs for firm_id in pair))
+        totals = ROICalculator(self.db, snapshot=self.snapshot).load_firm_totals(firm_ids=firm_ids)
+        position = {firm_id: idx for idx, firm_id in enumerate(totals['firm_ids'].tolist())}
+        revenue, costs = totals['revenue'].tolist(), totals['costs'].tolist()
+        
+        jobs = []
+        for firm_a_id, firm_b_id in pairs:
+            if firm_a_id not in position or firm_b_id not in position:
+                raise ValueError(f"Unknown firm in pair ({firm_a_id}, {firm_b_id})")
+            a, b = position[firm_a_id], position[firm_b_id]
+            jobs.append((firm_a_id, firm_b_id, revenue[a], costs[a], revenue[b], costs[b]))
+        
+        if len(jobs) < config.SIMULATION_PARALLEL_MIN_PAIRS or config.SIMULATION_WORKERS <= 1:
+            return _simulate_chunk(jobs, n_draws, seed, assumptions)
+        
+        chunk_size = max(1, -(-len(jobs) // (config.SIMULATION_WORKERS * 4)))
+        chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+        futures = [get_executor().submit(_simulate_chunk, chunk, n_draws, seed, assumptions)
+                   for chunk in chunks]
+        
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        
+        logger.info(f"Simulated {len(results)} mergers with {n_draws} draws each")
+        return results
@@ -0,0 +1,207 @@
+"""
+Process-wide registry of versioned PSNN models
+"""
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+import os
+import tempfile
+import threading
+import time
+from config import config
+from psnn_model import PartialSigmoidNN
+
+logger = logging.getLogger(__name__)
+
+MODEL_EXTENSION = '.psnn'
+
+
+class ModelNotFoundError(LookupError):
+    """Raised when no published version of a model exists"""
+
+
+class ModelRegistry:
+    """Loads each published model version once per process
+    
+    Versions live at ``<model_dir>/<name>/<version>.psnn`` and are never
+    modified after publishing. Files are memory-mapped read-only, so every
+    worker process serving the same version shares the same page-cache
+    pages. The active version per name is swapped atomically, and workers
+    pick up versions published by other processes within
+    ``refresh_seconds``.
+    """
+    
+    def __init__(self, model_dir: str = None, refresh_seconds: int = None):
+        self.model_dir = model_dir or config.MODEL_DIR
+        self.refresh_seconds = config.MODEL_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._lock = threading.Lock()
+        self._loaded: Dict[Tuple[str, int], PartialSigmoidNN] = {}
+        self._active: Dict[str, Tuple[int, PartialSigmoidNN]] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._pinned: Dict[str, bool] = {}
+    
+    def _model_path(self, name: str, version: int) -> str:
+        return os.path.join(self.model_dir, name, f"{version}{MODEL_EXTENSION}")
+    
+    def versions(self, name: str) -> List[int]:
+        """Published versions of a model, oldest first"""
+        try:
+            entries = os.listdir(os.path.join(self.model_dir, name))
+        except FileNotFoundError:
+            return []
+        return sorted(int(entry[:-len(MODEL_EXTENSION)]) for entry in entries
+                      if entry.endswith(MODEL_EXTENSION) and entry[:-len(MODEL_EXTENSION)].isdigit())
+    
+    def latest_version(self, name: str) -> Optional[int]:
+        versions = self.versions(name)
+        return versions[-1] if versions else None
+    
+    def load(self, name: str, version: int) -> PartialSigmoidNN:
+        """Get a specific version, loading it on first use"""
+        key = (name, version)
+        model = self._loaded.get(key)
+        if model is None:
+            with self._lock:
+                model = self._loaded.get(key)
+                if model is None:
+                    path = self._model_path(name, version)
+                    if not os.path.exists(path):
+                        raise ModelNotFoundError(f"Model {name} version {version} not found")
+                    started = time.perf_counter()
+                    model = PartialSigmoidNN.from_file(path)
+                    self._loaded[key] = model
+                    logger.info(f"Loaded model {name} v{version} in "
+                                f"{(time.perf_counter() - started) * 1000:.2f} ms")
+        return model
+    
+    def get(self, name: str = None, version: int = None) -> PartialSigmoidNN:
+        """Get the active model for a name, or a specific version"""
+        name = name or config.DEFAULT_MODEL_NAME
+        if version is not None:
+            return self.load(name, version)
+        
+        active = self._active.get(name)
+        if active is None or self._refresh_due(name):
+            active = self._refresh(name)
+        return active[1]
+    
+    def active_version(self, name: str = None) -> Optional[int]:
+        active = self._active.get(name or config.DEFAULT_MODEL_NAME)
+        return active[0] if active else None
+    
+    def _refresh_due(self, name: str) -> bool:
+        return not self._pinned.get(name) and \
+            time.monotonic() - self._checked_at.get(name, 0.0) > self.refresh_seconds
+    
+    def _refresh(self, name: str) -> Tuple[int, PartialSigmoidNN]:
+        """Activate the newest published version if it differs from the active one"""
+        self._checked_at[name] = time.monotonic()
+        active = self._active.get(name)
+        if active is not None and self._pinned.get(name):
+            return active
+        
+        latest = self.latest_version(name)
+        if latest is None:
+            if active is not None:
+                return active
+            raise ModelNotFoundError(f"No published versions of model {name}")
+        if active is None or active[0] != latest:
+            active = self.activate(name, latest, pin=False)
+        return active
+    
+    def activate(self, name: str, version: int, pin: bool = True) -> Tuple[int, PartialSigmoidNN]:
+        """Atomically make a version the active one
+        
+        Pinned versions (the default for explicit activation, e.g. a
+        rollback) stay active until activate is called again with
+        pin=False.
+        """
+        model = self.load(name, version)
+        active = (version, model)
+        with self._lock:
+            previous = self._active.get(name)
+            self._active[name] = active
+            self._pinned[name] = pin
+            # Drop other versions so their mappings can be released
+            for key in [key for key in self._loaded if key[0] == name and key[1] != version]:
+                del self._loaded[key]
+        if previous is None or previous[0] != version:
+            logger.info(f"Activated model {name} v{version}")
+        return active
+    
+    def publish(self, name: str, model: PartialSigmoidNN, activate: bool = True,
+                parent_version: int = None) -> int:
+        """Save a model as the next version and (optionally) activate it
+        
+        The version and parent version are stamped into the model metadata,
+        giving a checkpoint trail. The file is fully written under a
+        temporary name before it appears under its version path, so readers
+        never see a partial version.
+        """
+        directory = os.path.join(self.model_dir, name)
+        os.makedirs(directory, exist_ok=True)
+        
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            # Hard-link into place: atomic, and fails instead of overwriting when
+            # another process published the same version number first
+            while True:
+                version = (self.latest_version(name) or 0) + 1
+                model.metadata['version'] = version
+                model.metadata['parent_version'] = parent_version
+                model.save_model(tmp_path)
+                try:
+                    os.link(tmp_path, self._model_path(name, version))
+                    break
+                except FileExistsError:
+                    continue
+        finally:
+            os.remove(tmp_path)
+        
+        logger.info(f"Published model {name} v{version}")
+        if activate:
+            self.activate(name, version, pin=False)
+        return version
+    
+    def retrain(self, name: str, X, y, activate: bool = True, **fit_kwargs) -> int:
+        """Warm-start the active version on new samples and publish the result
+        
+        Works on a private in-memory copy, so the version being served is
+        never modified. Extra arguments go to PartialSigmoidNN.partial_fit.
+        """
+        name = name or config.DEFAULT_MODEL_NAME
+        self.get(name)
+        parent = self.active_version(name)
+        model = PartialSigmoidNN.from_file(self._model_path(name, parent), mmap=False)
+        model.partial_fit(X, y, **fit_kwargs)
+        return self.publish(name, model, activate=activate, parent_version=parent)
+    
+    def lineage(self, name: str = None, version: int = None) -> List[Dict[str, Any]]:
+        """Follow parent links from a version (default: active) back to its root"""
+        name = name or config.DEFAULT_MODEL_NAME
+        version = version if version is not None else self.active_version(name) or self.latest_version(name)
+        
+        trail = []
+        while version is not None:
+            metadata = PartialSigmoidNN.from_file(self._model_path(name, version)).metadata
+            history = metadata.get('history') or []
+            trail.append({
+                'version': version,
+                'parent_version': metadata.get('parent_version'),
+                'last_training': history[-1] if history else None
+            })
+            version = metadata.get('parent_version')
+        return trail
+    
+    def stats(self) -> Dict[str, Any]:
+        """Describe active and loaded model versions"""
+        with self._lock:
+            return {
+                'model_dir': self.model_dir,
+                'active': {name: version for name, (version, _) in self._active.items()},
+                'pinned': [name for name, pinned in self._pinned.items() if pinned],
+                'loaded': sorted(f"{name}:v{version}" for name, version in self._loaded)
+            }
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,199 @@
+"""
+Chi-squared feature selection and cross-validated grid search for the PSNN model
+"""
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+import itertools
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from config import config
+from psnn_model import PartialSigmoidNN
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PARAM_GRID: Dict[str, List[Any]] = {
+    'hidden_size': [16, 32, 64],
+    'n_bias': [2.0, 5.0, 10.0],
+    'learning_rate': [0.01, 0.05, 0.1]
+}
+
+
+def chi2_scores(X: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Chi-squared statistic of every feature against the class labels
+    
+    Computed for all features in one pass from the class-by-feature
+    contingency matrix. Features are shifted to be non-negative first.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y).ravel()
+    X = X - np.minimum(X.min(axis=0), 0)
+    
+    classes = np.unique(y)
+    Y = (y[:, None] == classes[None, :]).astype(np.float64)
+    observed = Y.T @ X
+    expected = np.outer(Y.mean(axis=0), X.sum(axis=0))
+    
+    terms = np.zeros_like(observed)
+    np.divide((observed - expected) ** 2, expected, out=terms, where=expected > 0)
+    return terms.sum(axis=0)
+
+
+def select_k_best(X: np.ndarray, y: np.ndarray, k: int = 16,
+                  feature_names: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+    """Rank features by Chi2 score and keep the k best (in original column order)"""
+    scores = chi2_scores(X, y)
+    ranked = np.argsort(-scores, kind='stable')
+    selected = np.sort(ranked[:k])
+    
+    return {
+        'indices': selected.tolist(),
+        'names': [feature_names[i] for i in selected] if feature_names is not None else None,
+        'scores': scores.tolist(),
+        'ranking': ranked.tolist()
+    }
+
+
+def stratified_kfold(y: np.ndarray, n_splits: int = 5,
+                     seed: Optional[int] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Split sample indices into k folds that preserve the class ratio"""
+    y = np.asarray(y).ravel()
+    rng = np.random.default_rng(seed)
+    fold_of = np.empty(len(y), dtype=np.int64)
+    
+    for label in np.unique(y):
+        members = rng.permutation(np.flatnonzero(y == label))
+        for fold, part in enumerate(np.array_split(members, n_splits)):
+            fold_of[part] = fold
+    
+    return [(np.flatnonzero(fold_of != fold), np.flatnonzero(fold_of == fold))
+            for fold in range(n_splits)]
+
+
+def roc_auc(y_true: np.ndarray, scores: np.ndarray) -> float:
+    """Area under the ROC curve from score ranks (ties get the average rank)"""
+    y_true = np.asarray(y_true).ravel()
+    scores = np.asarray(scores).ravel()
+    n_pos = int(np.count_nonzero(y_true == 1))
+    n_neg = len(y_true) - n_pos
+    if n_pos == 0 or n_neg == 0:
+        return float('nan')
+    
+    _, inverse, counts = np.unique(scores, return_inverse=True, return_counts=True)
+    ranks = (np.cumsum(counts) - (counts - 1) / 2.0)[inverse]
+    return float((ranks[y_true == 1].sum() - n_pos * (n_pos + 1) / 2.0) / (n_pos * n_neg))
+
+
+def minority_class(y: np.ndarray) -> int:
+    """Label of the less frequent class (merger failures in the M&A data)"""
+    labels, counts = np.unique(np.asarray(y).ravel(), return_counts=True)
+    return int(labels[np.argmin(counts)])
+
+
+def class_recall(y_true: np.ndarray, y_pred: np.ndarray, label: int) -> float:
+    """Share of samples with the given label that were predicted as that label"""
+    y_true = np.asarray(y_true).ravel()
+    members = y_true == label
+    if not members.any():
+        return float('nan')
+    return float(np.mean(np.asarray(y_pred).ravel()[members] == label))
+
+
+def expand_grid(param_grid: Dict[str, Sequence[Any]]) -> List[Dict[str, Any]]:
+    """All combinations of a parameter grid"""
+    names = sorted(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[n] for n in names))]
+
+
+# Data shared with pool workers through the initializer, so tasks only carry parameters
+_X: Optional[np.ndarray] = None
+_y: Optional[np.ndarray] = None
+_folds: List[Tuple[np.ndarray, np.ndarray]] = []
+
+
+def _init_worker(X: np.ndarray, y: np.ndarray, folds: List[Tuple[np.ndarray, np.ndarray]]):
+    global _X, _y, _folds
+    _X, _y, _folds = X, y, folds
+
+
+def _fit_fold(params: Dict[str, Any], fold: int, epochs: int, batch_size: int,
+              seed: int) -> Dict[str, Any]:
+    """Train on one fold's training split and score its held-out split"""
+    train_idx, test_idx = _folds[fold]
+    started = time.perf_counter()
+    
+    model = PartialSigmoidNN(input_size=_X.shape[1], hidden_size=params['hidden_size'],
+                             n_bias=params['n_bias'])
+    # Reinitialize from a per-fold generator so results do not depend on scheduling
+    rng = np.random.default_rng([seed, fold])
+    model.W1 = rng.standard_normal(model.W1.shape) * np.sqrt(2.0 / model.input_size)
+    model.W2 = rng.standard_normal(model.W2.shape) * np.sqrt(2.0 / model.hidden_size)
+    
+    history = model.train_minibatch(_X[train_idx], _y[train_idx], epochs=epochs,
+                                    batch_size=batch_size, learning_rate=params['learning_rate'],
+                                    seed=seed + fold, verbose=False)
+    predictions, probabilities = model.predict(_X[test_idx])
+    
+    y_test = _y[test_idx]
+    label = minority_class(_y)
+    return {
+        'fold': fold,
+        'auc': roc_auc(y_test, probabilities),
+        'minority_recall': class_recall(y_test, predictions, label),
+        'accuracy': float(np.mean(predictions.ravel() == y_test.ravel())),
+        'epochs_run': len(history['loss']),
+        'train_seconds': time.perf_counter() - started
+    }
+
+
+def _summarize(params: Dict[str, Any], folds: List[Dict[str, Any]]) -> Dict[str, Any]:
+    result = {'params': params, 'folds': len(folds)}
+    for metric in ('auc', 'minority_recall', 'accuracy'):
+        values = np.array([fold[metric] for fold in folds], dtype=np.float64)
+        result[f'{metric}_mean'] = float(np.nanmean(values)) if not np.isnan(values).all() else None
+        result[f'{metric}_std'] = float(np.nanstd(values)) if not np.isnan(values).all() else None
+    result['train_seconds'] = float(sum(fold['train_seconds'] for fold in folds))
+    return result
+
+
+def grid_search(X: np.ndarray, y: np.ndarray, param_grid: Dict[str, Sequence[Any]] = None,
+                n_splits: int = None, epochs: int = 50, batch_size: int = 256,
+                seed: int = 42, workers: int = None) -> List[Dict[str, Any]]:
+    """Cross-validated grid search over hidden_size, n_bias and learning_rate
+    
+    Every (configuration, fold) pair is an independent training run spread
+    across a process pool; the data and folds are sent to each worker once.
+    Returns one summary per configuration, best mean AUC first.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32).reshape(-1, 1)
+    n_splits = n_splits or config.MODEL_SELECTION_FOLDS
+    workers = workers or config.MODEL_SELECTION_WORKERS
+    
+    grid = expand_grid(param_grid or DEFAULT_PARAM_GRID)
+    missing = {'hidden_size', 'n_bias', 'learning_rate'} - set(grid[0]) if grid else set()
+    if missing:
+        raise ValueError(f"Parameter grid is missing: {sorted(missing)}")
+    
+    folds = stratified_kfold(y, n_splits, seed)
+    tasks = [(params, fold) for params in grid for fold in range(n_splits)]
+    started = time.perf_counter()
+    
+    if workers <= 1:
+        _init_worker(X, y, folds)
+        fold_results = [_fit_fold(params, fold, epochs, batch_size, seed) for params, fold in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(X, y, folds)) as executor:
+            futures = [executor.submit(_fit_fold, params, fold, epochs, batch_size, seed)
+                       for params, fold in tasks]
+            fold_results = [future.result() for future in futures]
+    
+    results = []
+    for i, params in enumerate(grid):
+        results.append(_summarize(params, fold_results[i * n_splits:(i + 1) * n_splits]))
+    results.sort(key=lambda r: -np.inf if r['auc_mean'] is None else r['auc_mean'], reverse=True)
+    
+    logger.info(f"Evaluated {len(grid)} configurations x {n_splits} folds in "
+                f"{time.perf_counter() - started:.1f}s")
+    return results
@@ -0,0 +1,44 @@
+"""
+Keyset pagination with opaque continuation tokens
+"""
+from typing import Dict, Any, Optional
+import base64
+import hashlib
+import json
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a continuation token is malformed or used with other filters"""
+
+
+def _fingerprint(filters: Dict[str, Any]) -> str:
+    """Short digest of the filters a cursor was issued for"""
+    payload = json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def encode_cursor(table: str, last_key: int, filters: Dict[str, Any] = None) -> str:
+    """Encode the last primary key of a page into an opaque token"""
+    payload = {'t': table, 'k': last_key, 'f': _fingerprint(filters or {})}
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: Optional[str], table: str, filters: Dict[str, Any] = None) -> Optional[int]:
+    """Decode a token back into the last primary key seen (None for the first page)"""
+    if not token:
+        return None
+    
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+        last_key = int(payload['k'])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Malformed cursor: {e}")
+    
+    if payload.get('t') != table:
+        raise InvalidCursorError(f"Cursor was not issued for {table}")
+    if payload.get('f') != _fingerprint(filters or {}):
+        raise InvalidCursorError("Cursor was issued for different filters")
+    
+    return last_key
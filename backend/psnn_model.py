@@ -6,8 +6,20 @@ PLoS One
 """
 
 import numpy as np
-from typing import List, Tuple, Dict
+from typing import Any, List, Tuple, Dict, Optional
 import json
+import struct
+import time
+
+# Binary model layout: magic, header length (uint64), JSON header, then
+# 64-byte aligned raw arrays at the offsets listed in the header
+MODEL_MAGIC = b'PSNN\x00\x01\r\n'
+MODEL_ALIGNMENT = 64
+_ARRAY_NAMES = ('W1', 'b1', 'W2', 'b2', 'feature_mean', 'feature_std', 'feature_m2')
+
+
+def _align(offset: int) -> int:
+    return -(-offset // MODEL_ALIGNMENT) * MODEL_ALIGNMENT
 
 
 class PartialSigmoidNN:
@@ -38,6 +50,13 @@ class PartialSigmoidNN:
         # Feature statistics for standardization
         self.feature_mean = None
         self.feature_std = None
+        
+        # Running statistics behind feature_mean/feature_std (Welford)
+        self.n_seen = 0
+        self.feature_m2 = None
+        
+        # Free-form model metadata stored with the binary format
+        self.metadata: Dict[str, Any] = {}
     
     def partial_sigmoid(self, x: np.ndarray) -> np.ndarray:
         """
@@ -73,9 +92,48 @@ class PartialSigmoidNN:
         if fit:
             self.feature_mean = np.mean(X, axis=0)
             self.feature_std = np.std(X, axis=0) + 1e-8  # Avoid division by zero
+            self.n_seen = X.shape[0]
+            self.feature_m2 = np.var(X, axis=0, dtype=np.float64) * X.shape[0]
         
         return (X - self.feature_mean) / self.feature_std
     
+    def update_statistics(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Merge a batch into the running feature statistics (Chan/Welford)
+        
+        Returns:
+            Previous (feature_mean, feature_std)
+        """
+        X = np.asarray(X, dtype=np.float64)
+        n_b = X.shape[0]
+        mean_b = X.mean(axis=0)
+        m2_b = X.var(axis=0) * n_b
+        
+        n_a = self.n_seen
+        mean_a = np.asarray(self.feature_mean, dtype=np.float64)
+        n = n_a + n_b
+        delta = mean_b - mean_a
+        
+        old_mean, old_std = self.feature_mean, self.feature_std
+        dtype = old_mean.dtype
+        self.feature_mean = (mean_a + delta * n_b / n).astype(dtype)
+        self.feature_m2 = self.feature_m2 + m2_b + delta ** 2 * n_a * n_b / n
+        self.feature_std = (np.sqrt(self.feature_m2 / n) + 1e-8).astype(dtype)
+        self.n_seen = n
+        return old_mean, old_std
+    
+    def _rescale_input_layer(self, old_mean: np.ndarray, old_std: np.ndarray):
+        """
+        Re-express W1/b1 for the current standardization so the network
+        computes the same function as under (old_mean, old_std):
+        W1' = diag(σ'/σ) W1 and b1' = b1 + ((μ' - μ) / σ) W1
+        """
+        W1 = self.W1.astype(np.float64)
+        shift = (np.asarray(self.feature_mean, np.float64) - old_mean) / old_std
+        scale = np.asarray(self.feature_std, np.float64) / old_std
+        self.b1 = (self.b1 + shift @ W1).astype(self.b1.dtype)
+        self.W1 = (W1 * scale[:, None]).astype(self.W1.dtype)
+    
     def forward(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
         """
         Forward propagation
@@ -102,13 +160,13 @@ class PartialSigmoidNN:
         """
         m = X.shape[0]
         
-        # Output layer gradients
-        dz2 = (a2 - y) * self.partial_sigmoid_derivative(z2)
+        # Output layer gradients (derivatives taken from the cached activations)
+        dz2 = (a2 - y) * (a2 * (1 - a2) * self.n_bias)
         dW2 = np.dot(a1.T, dz2) / m
         db2 = np.sum(dz2, axis=0, keepdims=True) / m
         
         # Hidden layer gradients
-        dz1 = np.dot(dz2, self.W2.T) * self.sigmoid_derivative(z1)
+        dz1 = np.dot(dz2, self.W2.T) * (a1 * (1 - a1))
         dW1 = np.dot(X.T, dz1) / m
         db1 = np.sum(dz1, axis=0, keepdims=True) / m
         
@@ -138,6 +196,7 @@ class PartialSigmoidNN:
             List of losses per epoch
         """
         # Standardize features
+        self._ensure_writable()
         X_std = self.standardize(X, fit=True)
         
         losses = []
@@ -155,6 +214,274 @@ class PartialSigmoidNN:
         
         return losses
     
+    def _ensure_writable(self):
+        """Copy weights that are read-only views (e.g. memory-mapped) before training"""
+        for name in ('W1', 'b1', 'W2', 'b2'):
+            value = getattr(self, name)
+            if not value.flags.writeable:
+                setattr(self, name, np.array(value))
+    
+    def _cast_parameters(self, dtype):
+        """Cast weights and standardization statistics to the given dtype"""
+        self.W1 = np.ascontiguousarray(self.W1, dtype=dtype)
+        self.b1 = np.ascontiguousarray(self.b1, dtype=dtype)
+        self.W2 = np.ascontiguousarray(self.W2, dtype=dtype)
+        self.b2 = np.ascontiguousarray(self.b2, dtype=dtype)
+        if self.feature_mean is not None:
+            self.feature_mean = self.feature_mean.astype(dtype)
+            self.feature_std = self.feature_std.astype(dtype)
+    
+    def _allocate_buffers(self, batch_size: int, dtype=np.float32) -> Dict[str, np.ndarray]:
+        """Preallocate activation and gradient buffers for one mini-batch"""
+        return {
+            'a1': np.empty((batch_size, self.hidden_size), dtype=dtype),
+            'tmp1': np.empty((batch_size, self.hidden_size), dtype=dtype),
+            'dz1': np.empty((batch_size, self.hidden_size), dtype=dtype),
+            'a2': np.empty((batch_size, 1), dtype=dtype),
+            'err': np.empty((batch_size, 1), dtype=dtype),
+            'dz2': np.empty((batch_size, 1), dtype=dtype),
+            'dW1': np.empty_like(self.W1, dtype=dtype),
+            'db1': np.empty_like(self.b1, dtype=dtype),
+            'dW2': np.empty_like(self.W2, dtype=dtype),
+            'db2': np.empty_like(self.b2, dtype=dtype)
+        }
+    
+    def _minibatch_step(self, X: np.ndarray, y: np.ndarray, buffers: Dict[str, np.ndarray],
+                        learning_rate: float) -> float:
+        """One forward/backward pass over a mini-batch using preallocated buffers
+        
+        Gradients match backward(); the activations are computed in place and
+        reused for the derivatives. Returns the batch MSE loss.
+        """
+        m = X.shape[0]
+        a1, tmp1, dz1 = buffers['a1'][:m], buffers['tmp1'][:m], buffers['dz1'][:m]
+        a2, err, dz2 = buffers['a2'][:m], buffers['err'][:m], buffers['dz2'][:m]
+        dW1, db1, dW2, db2 = buffers['dW1'], buffers['db1'], buffers['dW2'], buffers['db2']
+        
+        # Hidden layer: a1 = sigmoid(X W1 + b1)
+        np.dot(X, self.W1, out=a1)
+        a1 += self.b1
+        np.clip(a1, -500, 500, out=a1)
+        np.negative(a1, out=a1)
+        np.exp(a1, out=a1)
+        a1 += 1
+        np.reciprocal(a1, out=a1)
+        
+        # Output layer: a2 = 1 / (1 + n * exp(-(a1 W2 + b2)))
+        np.dot(a1, self.W2, out=a2)
+        a2 += self.b2
+        np.clip(a2, -500, 500, out=a2)
+        np.negative(a2, out=a2)
+        np.exp(a2, out=a2)
+        a2 *= self.n_bias
+        a2 += 1
+        np.reciprocal(a2, out=a2)
+        
+        np.subtract(a2, y, out=err)
+        loss = 0.5 * float(np.dot(err[:, 0], err[:, 0])) / m
+        
+        # Output layer gradients
+        np.subtract(1, a2, out=dz2)
+        dz2 *= a2
+        dz2 *= self.n_bias
+        dz2 *= err
+        np.dot(a1.T, dz2, out=dW2)
+        np.sum(dz2, axis=0, keepdims=True, out=db2)
+        
+        # Hidden layer gradients
+        np.dot(dz2, self.W2.T, out=dz1)
+        np.subtract(1, a1, out=tmp1)
+        tmp1 *= a1
+        dz1 *= tmp1
+        np.dot(X.T, dz1, out=dW1)
+        np.sum(dz1, axis=0, keepdims=True, out=db1)
+        
+        # Update weights
+        step = learning_rate / m
+        for param, grad in ((self.W2, dW2), (self.b2, db2), (self.W1, dW1), (self.b1, db1)):
+            grad *= step
+            param -= grad
+        
+        return loss
+    
+    def _mse(self, X_std: np.ndarray, y: np.ndarray) -> float:
+        """MSE loss on standardized features"""
+        _, _, _, a2 = self.forward(X_std)
+        return float(np.mean(0.5 * (y - a2) ** 2))
+    
+    def train_minibatch(self, X: np.ndarray, y: np.ndarray, epochs: int = 100,
+                        batch_size: int = 256, learning_rate: float = 0.01,
+                        validation_split: float = 0.1, patience: Optional[int] = 10,
+                        min_delta: float = 1e-6, shuffle: bool = True,
+                        seed: Optional[int] = None, verbose: bool = True) -> Dict[str, List[float]]:
+        """
+        Train with shuffled mini-batches in float32
+        
+        Args:
+            X: Training features (n_samples, n_features)
+            y: Training labels (n_samples, 1) - 1 for success, 0 for failure
+            epochs: Maximum number of epochs
+            batch_size: Samples per gradient step
+            learning_rate: Learning rate
+            validation_split: Fraction of samples held out for early stopping
+            patience: Epochs without improvement before stopping (None disables)
+            min_delta: Minimum loss decrease that counts as an improvement
+            shuffle: Reshuffle the training set every epoch
+            seed: Seed for the split and shuffling
+            verbose: Print training progress
+        
+        Returns:
+            History with per-epoch 'loss', 'val_loss' and 'epoch_time' (seconds).
+            The weights from the best monitored epoch are restored.
+        """
+        rng = np.random.default_rng(seed)
+        X = np.asarray(X, dtype=np.float32)
+        y = np.asarray(y, dtype=np.float32).reshape(-1, 1)
+        
+        # Hold out a validation split
+        order = rng.permutation(X.shape[0])
+        n_val = int(X.shape[0] * validation_split)
+        val_idx, train_idx = order[:n_val], order[n_val:]
+        
+        self._cast_parameters(np.float32)
+        self._ensure_writable()
+        X_train = self.standardize(X[train_idx], fit=True).astype(np.float32)
+        self.feature_mean = self.feature_mean.astype(np.float32)
+        self.feature_std = self.feature_std.astype(np.float32)
+        y_train = y[train_idx]
+        X_val = self.standardize(X[val_idx]).astype(np.float32) if n_val else None
+        y_val = y[val_idx] if n_val else None
+        
+        n_train = X_train.shape[0]
+        batch_size = min(batch_size, n_train)
+        buffers = self._allocate_buffers(batch_size)
+        X_epoch = np.empty_like(X_train)
+        y_epoch = np.empty_like(y_train)
+        
+        history = {'loss': [], 'val_loss': [], 'epoch_time': []}
+        best_loss = np.inf
+        best_params = None
+        wait = 0
+        
+        for epoch in range(epochs):
+            started = time.perf_counter()
+            
+            if shuffle:
+                perm = rng.permutation(n_train)
+                np.take(X_train, perm, axis=0, out=X_epoch)
+                np.take(y_train, perm, axis=0, out=y_epoch)
+            else:
+                X_epoch[...] = X_train
+                y_epoch[...] = y_train
+            
+            total_loss = 0.0
+            for start in range(0, n_train, batch_size):
+                stop = min(start + batch_size, n_train)
+                batch_loss = self._minibatch_step(X_epoch[start:stop], y_epoch[start:stop],
+                                                  buffers, learning_rate)
+                total_loss += batch_loss * (stop - start)
+            
+            loss = total_loss / n_train
+            val_loss = self._mse(X_val, y_val) if n_val else None
+            history['loss'].append(loss)
+            history['val_loss'].append(val_loss)
+            history['epoch_time'].append(time.perf_counter() - started)
+            
+            if verbose and (epoch + 1) % 10 == 0:
+                val_text = f" - Val Loss: {val_loss:.4f}" if val_loss is not None else ""
+                print(f"Epoch {epoch + 1}/{epochs} - Loss: {loss:.4f}{val_text} "
+                      f"- {history['epoch_time'][-1] * 1000:.1f} ms")
+            
+            # Early stopping on validation loss (training loss without a split)
+            monitored = val_loss if val_loss is not None else loss
+            if monitored < best_loss - min_delta:
+                best_loss = monitored
+                best_params = (self.W1.copy(), self.b1.copy(), self.W2.copy(), self.b2.copy())
+                wait = 0
+            else:
+                wait += 1
+                if patience is not None and wait >= patience:
+                    if verbose:
+                        print(f"Early stopping at epoch {epoch + 1}")
+                    break
+        
+        if best_params is not None:
+            self.W1, self.b1, self.W2, self.b2 = best_params
+        
+        return history
+    
+    def partial_fit(self, X: np.ndarray, y: np.ndarray, epochs: int = 10,
+                    batch_size: int = 256, learning_rate: float = 0.01,
+                    prior_samples: Optional[int] = None, seed: Optional[int] = None,
+                    verbose: bool = False) -> Dict[str, Any]:
+        """
+        Continue training from the current weights on new samples only
+        
+        Standardization statistics are merged with running estimates and
+        the input layer is rescaled to match, so the model is unchanged
+        before the new samples are applied. Cost scales with len(X), not
+        with the full training history.
+        
+        Args:
+            X: New features (n_samples, n_features)
+            y: New labels (n_samples, 1) - 1 for success, 0 for failure
+            epochs: Passes over the new samples
+            batch_size: Samples per gradient step
+            learning_rate: Learning rate
+            prior_samples: Sample count behind the existing statistics, for
+                models saved without one (e.g. older JSON files)
+            seed: Seed for shuffling
+            verbose: Print progress
+        
+        Returns:
+            The training-history entry recorded in metadata['history']
+        """
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y).reshape(-1, 1)
+        self._ensure_writable()
+        
+        if self.feature_mean is None:
+            self.standardize(X, fit=True)
+        else:
+            if self.feature_m2 is None or not self.n_seen:
+                if not prior_samples:
+                    raise ValueError("Model has no running statistics; pass prior_samples")
+                self.n_seen = prior_samples
+                self.feature_m2 = (np.asarray(self.feature_std, np.float64) - 1e-8) ** 2 * prior_samples
+            old_mean, old_std = self.update_statistics(X)
+            self._rescale_input_layer(np.asarray(old_mean, np.float64), np.asarray(old_std, np.float64))
+        
+        dtype = self.W1.dtype
+        X_std = self.standardize(X).astype(dtype)
+        y = y.astype(dtype)
+        batch_size = min(batch_size, X_std.shape[0])
+        buffers = self._allocate_buffers(batch_size, dtype)
+        rng = np.random.default_rng(seed)
+        
+        started = time.perf_counter()
+        loss = None
+        for epoch in range(epochs):
+            perm = rng.permutation(X_std.shape[0])
+            total_loss = 0.0
+            for start in range(0, len(perm), batch_size):
+                idx = perm[start:start + batch_size]
+                total_loss += self._minibatch_step(X_std[idx], y[idx], buffers, learning_rate) * len(idx)
+            loss = total_loss / len(perm)
+            if verbose:
+                print(f"Epoch {epoch + 1}/{epochs} - Loss: {loss:.4f}")
+        
+        entry = {
+            'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'mode': 'partial_fit',
+            'samples': int(X.shape[0]),
+            'n_seen': int(self.n_seen),
+            'epochs': epochs,
+            'loss': loss,
+            'seconds': time.perf_counter() - started
+        }
+        self.metadata.setdefault('history', []).append(entry)
+        return entry
+    
     def predict(self, X: np.ndarray, threshold: float = 0.5) -> Tuple[np.ndarray, np.ndarray]:
         """
         Predict merger success
@@ -174,7 +501,102 @@ class PartialSigmoidNN:
         return predictions, probabilities
     
     def save_model(self, filepath: str):
-        """Save model weights and parameters"""
+        """Save model weights and parameters
+        
+        Paths ending in .json use the JSON format; anything else gets the
+        binary format, which load_model memory-maps without copying.
+        """
+        if filepath.endswith('.json'):
+            self._save_json(filepath)
+        else:
+            self._save_binary(filepath)
+    
+    def load_model(self, filepath: str, mmap: bool = True):
+        """Load model weights and parameters (format detected from the file)"""
+        with open(filepath, 'rb') as f:
+            magic = f.read(len(MODEL_MAGIC))
+        
+        if magic == MODEL_MAGIC:
+            self._load_binary(filepath, mmap)
+        else:
+            self._load_json(filepath)
+    
+    @classmethod
+    def from_file(cls, filepath: str, mmap: bool = True) -> 'PartialSigmoidNN':
+        """Load a saved model without initializing random weights first"""
+        model = cls.__new__(cls)
+        model.metadata = {}
+        model.load_model(filepath, mmap)
+        return model
+    
+    def _save_binary(self, filepath: str):
+        """Write the header and 64-byte aligned raw arrays"""
+        arrays = {}
+        layout = {}
+        offset = 0
+        for name in _ARRAY_NAMES:
+            value = getattr(self, name)
+            if value is None:
+                continue
+            value = np.ascontiguousarray(value)
+            arrays[name] = value
+            layout[name] = {'dtype': value.dtype.str, 'shape': list(value.shape), 'offset': offset}
+            offset = _align(offset + value.nbytes)
+        
+        header = json.dumps({
+            'format_version': 1,
+            'arrays': layout,
+            'n_bias': self.n_bias,
+            'input_size': self.input_size,
+            'hidden_size': self.hidden_size,
+            'n_seen': self.n_seen,
+            'metadata': self.metadata
+        }).encode('utf-8')
+        data_start = _align(len(MODEL_MAGIC) + 8 + len(header))
+        
+        with open(filepath, 'wb') as f:
+            f.write(MODEL_MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            for name, value in arrays.items():
+                f.seek(data_start + layout[name]['offset'])
+                f.write(value.tobytes())
+            f.truncate(data_start + offset)
+    
+    def _load_binary(self, filepath: str, mmap: bool = True):
+        """Map the arrays of a binary model file (read-only views when mmap=True)"""
+        with open(filepath, 'rb') as f:
+            f.seek(len(MODEL_MAGIC))
+            (header_len,) = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_len).decode('utf-8'))
+        if header.get('format_version') != 1:
+            raise ValueError(f"Unsupported model format version: {header.get('format_version')}")
+        
+        data_start = _align(len(MODEL_MAGIC) + 8 + header_len)
+        if mmap:
+            buffer = np.memmap(filepath, dtype=np.uint8, mode='r')
+        else:
+            buffer = np.fromfile(filepath, dtype=np.uint8)
+        
+        for name in _ARRAY_NAMES:
+            spec = header['arrays'].get(name)
+            if spec is None:
+                setattr(self, name, None)
+                continue
+            dtype = np.dtype(spec['dtype'])
+            start = data_start + spec['offset']
+            count = int(np.prod(spec['shape'], dtype=np.int64))
+            value = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape'])
+            setattr(self, name, value)
+        
+        self.n_bias = header['n_bias']
+        self.input_size = header['input_size']
+        self.hidden_size = header['hidden_size']
+        self.n_seen = header.get('n_seen', 0)
+        self.metadata = header.get('metadata') or {}
+    
+    def _save_json(self, filepath: str):
+        """Save model weights and parameters as JSON lists"""
         model_data = {
             'W1': self.W1.tolist(),
             'b1': self.b1.tolist(),
@@ -184,14 +606,17 @@ class PartialSigmoidNN:
             'feature_std': self.feature_std.tolist() if self.feature_std is not None else None,
             'n_bias': self.n_bias,
             'input_size': self.input_size,
-            'hidden_size': self.hidden_size
+            'hidden_size': self.hidden_size,
+            'n_seen': self.n_seen,
+            'feature_m2': self.feature_m2.tolist() if self.feature_m2 is not None else None,
+            'metadata': self.metadata
         }
         
         with open(filepath, 'w') as f:
             json.dump(model_data, f)
     
-    def load_model(self, filepath: str):
-        """Load model weights and parameters"""
+    def _load_json(self, filepath: str):
+        """Load model weights and parameters from JSON lists"""
         with open(filepath, 'r') as f:
             model_data = json.load(f)
         
@@ -204,3 +629,6 @@ class PartialSigmoidNN:
         self.n_bias = model_data['n_bias']
         self.input_size = model_data['input_size']
         self.hidden_size = model_data['hidden_size']
+        self.n_seen = model_data.get('n_seen', 0)
+        self.feature_m2 = np.array(model_data['feature_m2']) if model_data.get('feature_m2') else None
+        self.metadata = model_data.get('metadata') or {}
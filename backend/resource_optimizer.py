@@ -1,19 +1,139 @@
 """
 Resource allocation optimization
 """
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 import logging
+import time
+from datetime import date
+import numpy as np
+from config import config
+from analytics_snapshot import month_index
+from bottleneck_detector import BottleneckDetector, month_of, month_start
 
 logger = logging.getLogger(__name__)
 
+ELASTICITY_BOUNDS: Tuple[float, float] = (0.1, 0.9)  # Keeps every revenue curve concave
+ELASTICITY_PRIOR_STRENGTH = 1.0  # Headcount variation (sum of squared log deviations) worth the pooled prior
+
+CELL_QUERY = """
+    SELECT
+        s.firm_id,
+        f.firm_name,
+        s.department,
+        COUNT(*) as staff_count,
+        COALESCE(SUM(s.salary), 0) as salary
+    FROM staff s
+    JOIN firm f ON f.firm_id = s.firm_id
+    GROUP BY s.firm_id, f.firm_name, s.department
+"""
+
+HIRES_QUERY = """
+    SELECT
+        firm_id,
+        DATE_FORMAT(hire_date, '%%Y-%%m') as period,
+        COUNT(*) as hires
+    FROM staff
+    WHERE hire_date IS NULL OR hire_date < %s
+    GROUP BY firm_id, DATE_FORMAT(hire_date, '%%Y-%%m')
+"""
+
+
+def estimate_elasticity(revenue: np.ndarray, headcount: np.ndarray,
+                        prior: Optional[np.ndarray] = None) -> np.ndarray:
+    """Per-row revenue elasticity of headcount from monthly history
+    
+    Fits log(revenue) = c + beta * log(headcount) for every firm at once
+    and shrinks each slope toward ``prior`` in proportion to how much the
+    firm's headcount actually varied, so firms with flat headcount fall
+    back to the prior. Results are clipped to ELASTICITY_BOUNDS.
+    """
+    observed = (revenue > 0) & (headcount > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x = np.where(observed, np.log(headcount), 0.0)
+        y = np.where(observed, np.log(revenue), 0.0)
+    n = observed.sum(axis=1)
+    safe_n = np.maximum(n, 1)
+    x_mean = x.sum(axis=1) / safe_n
+    y_mean = y.sum(axis=1) / safe_n
+    dx = np.where(observed, x - x_mean[:, None], 0.0)
+    sxx = (dx ** 2).sum(axis=1)
+    sxy = (dx * np.where(observed, y - y_mean[:, None], 0.0)).sum(axis=1)
+    
+    if prior is None:
+        prior = np.full(len(revenue), np.mean(ELASTICITY_BOUNDS))
+    elasticity = (sxy + ELASTICITY_PRIOR_STRENGTH * prior) / (sxx + ELASTICITY_PRIOR_STRENGTH)
+    return np.clip(elasticity, *ELASTICITY_BOUNDS)
+
+
+def pooled_elasticity(revenue: np.ndarray, headcount: np.ndarray) -> float:
+    """Cross-sectional elasticity across firms (the shrinkage prior)"""
+    usable = (revenue > 0) & (headcount > 0)
+    if usable.sum() < 3:
+        return float(np.mean(ELASTICITY_BOUNDS))
+    x, y = np.log(headcount[usable]), np.log(revenue[usable])
+    sxx = ((x - x.mean()) ** 2).sum()
+    if sxx <= 0:
+        return float(np.mean(ELASTICITY_BOUNDS))
+    return float(np.clip(((x - x.mean()) * (y - y.mean())).sum() / sxx, *ELASTICITY_BOUNDS))
+
+
+def solve_allocation(staff: np.ndarray, unit_cost: np.ndarray, scale: np.ndarray,
+                     elasticity: np.ndarray, headcount_budget: float, salary_budget: float,
+                     max_change: float, min_return: float = 0.0) -> Dict[str, Any]:
+    """Greedy marginal-gain allocation over concave revenue curves
+    
+    Each cell (firm x department) earns ``scale * h ** elasticity`` with h
+    staff at ``unit_cost`` per head and may move by at most ``max_change`` of
+    its current headcount (at least one person, never below one person). Every cell starts at
+    its lower bound; the freed headcount and salary are then handed out one
+    person at a time, best marginal revenue per salary dollar first. With
+    elasticity < 1 each cell's gains decrease, so ranking all candidate
+    hires at once and taking the longest prefix that fits both budgets is
+    the greedy solution, computed with a single sort.
+    """
+    staff = staff.astype(np.int64)
+    allowed = np.floor(staff * max_change).astype(np.int64)
+    if max_change > 0:
+        allowed = np.maximum(allowed, 1)
+    lower = np.maximum(staff - allowed, np.minimum(staff, 1))
+    upper = staff + allowed
+    
+    free_headcount = headcount_budget - lower.sum()
+    free_salary = salary_budget - (lower * unit_cost).sum()
+    if free_headcount < 0 or free_salary < 0:
+        raise ValueError("Budget is below the minimum staffing allowed by max_change")
+    
+    # One candidate per possible hire above the lower bound
+    span = upper - lower
+    cell = np.repeat(np.arange(len(staff)), span)
+    offsets = np.concatenate(([0], np.cumsum(span)[:-1]))
+    level = (lower[cell] + np.arange(len(cell)) - offsets[cell]).astype(np.float64)
+    gain = scale[cell] * ((level + 1) ** elasticity[cell] - level ** elasticity[cell])
+    ratio = gain / unit_cost[cell]
+    
+    order = np.argsort(-ratio, kind='stable')
+    fits = (np.arange(1, len(order) + 1) <= free_headcount) & \
+        (np.cumsum(unit_cost[cell[order]]) <= free_salary) & (ratio[order] > min_return)
+    taken = len(order) if fits.all() else int(np.argmin(fits))
+    
+    planned = lower + np.bincount(cell[order[:taken]], minlength=len(staff))
+    revenue_delta = scale * (planned.astype(np.float64) ** elasticity - staff.astype(np.float64) ** elasticity)
+    marginal = ratio[order[taken - 1]] if taken else 0.0
+    return {'planned': planned, 'revenue_delta': revenue_delta, 'marginal_return': float(marginal)}
+
+
 class ResourceOptimizer:
     """Optimizes resource allocation based on historical data"""
     
-    def __init__(self, db):
+    def __init__(self, db, snapshot=None):
         self.db = db
+        self.snapshot = snapshot
     
     def analyze_staff_distribution(self) -> List[Dict[str, Any]]:
         """Analyze current staff distribution across firms"""
+        if self.snapshot is not None:
+            return self._snapshot_staff_distribution()
+        
         query = """
             SELECT 
                 f.firm_id,
@@ -30,7 +150,7 @@ class ResourceOptimizer:
             ) sales ON f.firm_id = sales.firm_id
             GROUP BY f.firm_id, f.firm_name
         """
-        results = self.db.execute_query(query)
+        results = self.db.execute_query(query, cache=True)
         
         return [{
             'firm_id': row['firm_id'],
@@ -40,25 +160,244 @@ class ResourceOptimizer:
             'revenue_per_employee': float(row['revenue_per_employee'])
         } for row in results]
     
-    def recommend_staff_reallocation(self) -> List[Dict[str, Any]]:
-        """Recommend staff reallocation based on performance"""
-        distribution = self.analyze_staff_distribution()
-        
-        if not distribution:
-            return []
-        
-        avg_rpe = sum(d['revenue_per_employee'] for d in distribution) / len(distribution)
-        
-        recommendations = []
-        for firm in distribution:
-            if firm['revenue_per_employee'] < avg_rpe * 0.7 and firm['staff_count'] > 5:
-                recommendations.append({
-                    'firm_id': firm['firm_id'],
-                    'firm_name': firm['firm_name'],
-                    'current_staff': firm['staff_count'],
-                    'recommended_staff': int(firm['staff_count'] * 0.8),
-                    'reason': 'Below-average revenue per employee',
-                    'expected_impact': 'Cost reduction without significant revenue loss'
-                })
-        
-        return recommendations
+    def _allocation_inputs(self, history_months: int) -> Dict[str, Any]:
+        """Firm x department staffing cells plus per-firm monthly revenue and headcount"""
+        last_month = month_of(date.today()) - 1
+        first_month = last_month - history_months + 1
+        
+        if self.snapshot is not None:
+            snapshot = self.snapshot
+            known = snapshot.staff_firm >= 0
+            n_departments = len(snapshot.department_categories) + 1
+            key = snapshot.staff_firm[known].astype(np.int64) * n_departments + \
+                snapshot.staff_department[known].astype(np.int64) + 1
+            cells, inverse = np.unique(key, return_inverse=True)
+            used_firms, cell_firm = np.unique(cells // n_departments, return_inverse=True)
+            labels = [None] + snapshot.department_categories
+            
+            firm_ids = snapshot.firm_ids[used_firms]
+            firm_names = [snapshot.firm_names[i] for i in used_firms.tolist()]
+            departments = [labels[code] for code in (cells % n_departments).tolist()]
+            staff = np.bincount(inverse, minlength=len(cells))
+            salary = np.bincount(inverse, weights=snapshot.staff_salary[known], minlength=len(cells))
+            
+            hire_day = snapshot.staff_hire_day[known]
+            hired = hire_day != np.iinfo(np.int32).min
+            hire_firm = np.searchsorted(used_firms, snapshot.staff_firm[known])
+            hire_month = np.where(hired, month_index(hire_day), first_month)
+            hire_count = np.ones(len(hire_month))
+        else:
+            rows = self.db.execute_query(CELL_QUERY, cache=True)
+            rows = sorted(rows, key=lambda row: (row['firm_id'], row['department'] is not None,
+                                                 row['department'] or ''))
+            firm_ids = np.array(sorted({row['firm_id'] for row in rows}), dtype=np.int64)
+            names = {row['firm_id']: row['firm_name'] for row in rows}
+            firm_names = [names[firm_id] for firm_id in firm_ids.tolist()]
+            cell_firm = np.searchsorted(firm_ids, [row['firm_id'] for row in rows])
+            departments = [row['department'] for row in rows]
+            staff = np.array([int(row['staff_count']) for row in rows], dtype=np.int64)
+            salary = np.array([float(row['salary']) for row in rows], dtype=np.float64)
+            
+            hire_rows = self.db.execute_query(HIRES_QUERY, (month_start(last_month + 1),), cache=True)
+            hires = [row for row in hire_rows if row['firm_id'] in names]
+            hire_firm = np.searchsorted(firm_ids, [row['firm_id'] for row in hires])
+            hire_month = np.array([
+                first_month if row['period'] is None
+                else (int(row['period'][:4]) - 1970) * 12 + int(row['period'][5:7]) - 1
+                for row in hires
+            ], dtype=np.int64)
+            hire_count = np.array([int(row['hires']) for row in hires], dtype=np.float64)
+        
+        # Headcount at the end of each month, from hire dates
+        columns = np.clip(hire_month - first_month, 0, None)
+        in_window = columns < history_months
+        hires_by_month = np.zeros((len(firm_ids), history_months))
+        np.add.at(hires_by_month, (hire_firm[in_window], columns[in_window]), hire_count[in_window])
+        headcount = np.cumsum(hires_by_month, axis=1)
+        
+        history = BottleneckDetector(self.db, snapshot=self.snapshot).load_revenue_matrix(history_months)
+        revenue = np.full((len(firm_ids), history_months), np.nan)
+        positions = np.searchsorted(history['firm_ids'], firm_ids)
+        found = positions < len(history['firm_ids'])
+        found[found] = history['firm_ids'][positions[found]] == firm_ids[found]
+        revenue[found] = history['revenue'][positions[found]]
+        
+        return {
+            'firm_ids': firm_ids,
+            'firm_names': firm_names,
+            'cell_firm': cell_firm,
+            'departments': departments,
+            'staff': staff,
+            'salary': salary,
+            'revenue': revenue,
+            'headcount': headcount
+        }
+    
+    def _solve_plan(self, headcount_budget: Optional[int], salary_budget: Optional[float],
+                    max_change: Optional[float], min_return: float,
+                    history_months: Optional[int]) -> Dict[str, Any]:
+        """Fit the per-cell revenue curves and solve the allocation (all arrays)"""
+        max_change = config.RESOURCE_MAX_CHANGE if max_change is None else max_change
+        history_months = history_months or config.RESOURCE_HISTORY_MONTHS
+        if not 0 <= max_change <= 1:
+            raise ValueError("max_change must be between 0 and 1")
+        
+        data = self._allocation_inputs(history_months)
+        staff, salary, cell_firm = data['staff'], data['salary'], data['cell_firm']
+        n_firms = len(data['firm_ids'])
+        
+        # Elasticities: firm history shrunk toward the cross-sectional estimate
+        annual_revenue = np.nansum(data['revenue'][:, -12:], axis=1)
+        firm_staff = np.bincount(cell_firm, weights=staff, minlength=n_firms)
+        prior = pooled_elasticity(annual_revenue, firm_staff)
+        elasticity = estimate_elasticity(data['revenue'], data['headcount'], np.full(n_firms, prior))
+        
+        # Per-cell curves: revenue share by salary (headcount where salaries are missing)
+        firm_salary = np.bincount(cell_firm, weights=salary, minlength=n_firms)
+        share = np.where(firm_salary[cell_firm] > 0, salary / np.maximum(firm_salary[cell_firm], 1e-12),
+                         staff / np.maximum(firm_staff[cell_firm], 1))
+        cell_elasticity = elasticity[cell_firm]
+        scale = annual_revenue[cell_firm] * share / staff ** cell_elasticity
+        unit_cost = salary / staff
+        positive_costs = unit_cost[unit_cost > 0]
+        unit_cost = np.where(unit_cost > 0, unit_cost,
+                             np.median(positive_costs) if len(positive_costs) else 1.0)
+        
+        current_headcount = int(staff.sum())
+        current_salary = float((staff * unit_cost).sum())
+        headcount_budget = current_headcount if headcount_budget is None else headcount_budget
+        salary_budget = current_salary if salary_budget is None else salary_budget
+        
+        solution = solve_allocation(staff, unit_cost, scale, cell_elasticity, headcount_budget,
+                                    salary_budget, max_change, min_return)
+        current_revenue = float((scale * staff.astype(np.float64) ** cell_elasticity).sum())
+        return {
+            **data,
+            **solution,
+            'unit_cost': unit_cost,
+            'elasticity': cell_elasticity,
+            'pooled_elasticity': prior,
+            'current_revenue': current_revenue,
+            'headcount': {'current': current_headcount, 'planned': int(solution['planned'].sum()),
+                          'budget': headcount_budget},
+            'salary': {'current': current_salary,
+                       'planned': float((solution['planned'] * unit_cost).sum()),
+                       'budget': salary_budget}
+        }
+    
+    def optimize_allocation(self, headcount_budget: Optional[int] = None,
+                            salary_budget: Optional[float] = None, max_change: float = None,
+                            min_return: float = 0.0, history_months: int = None,
+                            limit: Optional[int] = None) -> Dict[str, Any]:
+        """Reallocate staff across firms and departments to maximize expected revenue
+        
+        Each firm's revenue is modelled as a concave power curve of headcount
+        with an elasticity estimated from its revenue and headcount history.
+        Firm revenue (trailing 12 months) is attributed to departments by
+        salary share. Budgets default to the current totals, so the plan is a
+        pure reallocation; min_return is the revenue per salary dollar a hire
+        must add. Revenue figures are annual. Allocations are the changed
+        cells, largest revenue effect first (the top ``limit`` if given).
+        """
+        started = time.perf_counter()
+        plan = self._solve_plan(headcount_budget, salary_budget, max_change, min_return, history_months)
+        staff, planned, revenue_delta = plan['staff'], plan['planned'], plan['revenue_delta']
+        cell_firm, unit_cost = plan['cell_firm'], plan['unit_cost']
+        
+        changed = np.flatnonzero(planned != staff)
+        order = np.lexsort((cell_firm[changed], -np.abs(revenue_delta[changed]).round(6)))
+        changed = changed[order[:limit] if limit else order]
+        
+        firm_names, departments = plan['firm_names'], plan['departments']
+        change = planned[changed] - staff[changed]
+        allocations = [{
+            'firm_id': firm_id,
+            'firm_name': firm_names[firm],
+            'department': departments[i],
+            'current_staff': current,
+            'recommended_staff': current + delta,
+            'change': delta,
+            'average_salary': cost,
+            'salary_delta': delta * cost,
+            'revenue_delta': revenue,
+            'elasticity': beta
+        } for i, firm, firm_id, current, delta, cost, revenue, beta in zip(
+            changed.tolist(), cell_firm[changed].tolist(), plan['firm_ids'][cell_firm[changed]].tolist(),
+            staff[changed].tolist(), change.tolist(), unit_cost[changed].tolist(),
+            revenue_delta[changed].tolist(), plan['elasticity'][changed].tolist()
+        )]
+        
+        revenue_change = float(revenue_delta.sum())
+        return {
+            'allocations': allocations,
+            'changed_cells': int(len(order)),
+            'current_revenue': plan['current_revenue'],
+            'expected_revenue': plan['current_revenue'] + revenue_change,
+            'expected_revenue_delta': revenue_change,
+            'headcount': plan['headcount'],
+            'salary': plan['salary'],
+            'pooled_elasticity': plan['pooled_elasticity'],
+            'marginal_return': plan['marginal_return'],
+            'cells': len(staff),
+            'solve_ms': (time.perf_counter() - started) * 1000
+        }
+    
+    def recommend_staff_reallocation(self, headcount_budget: Optional[int] = None,
+                                     salary_budget: Optional[float] = None,
+                                     max_change: float = None) -> List[Dict[str, Any]]:
+        """Recommend staff reallocation per firm from the optimized allocation plan"""
+        plan = self._solve_plan(headcount_budget, salary_budget, max_change, 0.0, None)
+        staff, planned, cell_firm = plan['staff'], plan['planned'], plan['cell_firm']
+        n_firms = len(plan['firm_ids'])
+        
+        firm_staff = np.bincount(cell_firm, weights=staff, minlength=n_firms).astype(np.int64)
+        firm_planned = np.bincount(cell_firm, weights=planned, minlength=n_firms).astype(np.int64)
+        firm_delta = np.bincount(cell_firm, weights=plan['revenue_delta'], minlength=n_firms)
+        
+        # Per-firm change descriptions, biggest department moves first
+        changed = np.flatnonzero(planned != staff)
+        change = planned[changed] - staff[changed]
+        changed = changed[np.lexsort((-np.abs(change), cell_firm[changed]))]
+        reasons: Dict[int, List[str]] = {}
+        departments = plan['departments']
+        for i, firm, delta in zip(changed.tolist(), cell_firm[changed].tolist(),
+                                  (planned[changed] - staff[changed]).tolist()):
+            reasons.setdefault(firm, []).append(
+                f"{'add' if delta > 0 else 'reduce'} {departments[i] or 'unassigned'} by {abs(delta)}")
+        
+        firms = sorted(reasons, key=lambda firm: -abs(firm_delta[firm]))
+        for firm in firms:
+            reason = ', '.join(reasons[firm])
+            reasons[firm] = reason[0].upper() + reason[1:]
+        return [{
+            'firm_id': int(plan['firm_ids'][firm]),
+            'firm_name': plan['firm_names'][firm],
+            'current_staff': int(firm_staff[firm]),
+            'recommended_staff': int(firm_planned[firm]),
+            'reason': reasons[firm],
+            'expected_impact': f"Expected annual revenue change of ${firm_delta[firm]:,.0f}"
+        } for firm in firms]
+    
+    def _snapshot_staff_distribution(self) -> List[Dict[str, Any]]:
+        """Snapshot equivalent of the staff distribution query
+        
+        Mirrors the query's join semantics: firm revenue is repeated for
+        every staff row before summing, so revenue_per_employee equals the
+        firm's revenue whenever it has staff.
+        """
+        snapshot = self.snapshot
+        staff_count = snapshot.staff_count_by_firm
+        revenue = snapshot.revenue_by_firm_total
+        total_revenue = revenue * np.maximum(staff_count, 1)
+        revenue_per_employee = np.where(staff_count > 0, revenue, 0.0)
+        
+        return [{
+            'firm_id': firm_id,
+            'firm_name': firm_name,
+            'staff_count': count,
+            'total_revenue': firm_revenue,
+            'revenue_per_employee': rpe
+        } for firm_id, firm_name, count, firm_revenue, rpe in zip(
+            snapshot.firm_ids.tolist(), snapshot.firm_names, staff_count.tolist(),
+            total_revenue.tolist(), revenue_per_employee.tolist()
+        )]
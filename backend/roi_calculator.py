@@ -1,22 +1,29 @@
 """
 ROI calculation and analysis engine
 """
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence
 import logging
 from datetime import datetime
+import numpy as np
+from config import config
 from database import get_db_connection
+from analytics_snapshot import format_period
 
 logger = logging.getLogger(__name__)
 
 class ROICalculator:
     """Calculates ROI metrics for firms"""
     
-    def __init__(self, db):
+    def __init__(self, db, snapshot=None):
         self.db = db
+        self.snapshot = snapshot
     
     def calculate_total_revenue(self, firm_id: int, start_date: str = None, 
                                 end_date: str = None) -> float:
         """Calculate total revenue for a firm"""
+        if self.snapshot is not None:
+            return self.snapshot.firm_revenue(firm_id, start_date, end_date)
+        
         query = """
             SELECT COALESCE(SUM(total_amount), 0) as total_revenue
             FROM sales
@@ -32,17 +39,27 @@ class ROICalculator:
             query += " AND sale_date <= %s"
             params.append(end_date)
         
-        result = self.db.execute_query(query, tuple(params))
+        result = self.db.execute_query(query, tuple(params), cache=True)
         return float(result[0]['total_revenue'])
     
     def calculate_total_costs(self, firm_id: int) -> float:
         """Calculate total salary costs for a firm"""
-        query = """
-            SELECT COALESCE(SUM(salary), 0) as total_salary
-            FROM staff
-            WHERE firm_id = %s
-        """
-        result = self.db.execute_query(query, (firm_id,))
+        if self.snapshot is not None:
+            return float(self.snapshot.firm_metric(self.snapshot.salary_by_firm, firm_id, 0.0))
+        
+        if config.USE_ROLLUP_TABLES:
+            query = """
+                SELECT COALESCE(SUM(total_salary), 0) as total_salary
+                FROM firm_staff_totals
+                WHERE firm_id = %s
+            """
+        else:
+            query = """
+                SELECT COALESCE(SUM(salary), 0) as total_salary
+                FROM staff
+                WHERE firm_id = %s
+            """
+        result = self.db.execute_query(query, (firm_id,), cache=True)
         return float(result[0]['total_salary'])
     
     def calculate_roi(self, firm_id: int, start_date: str = None, 
@@ -56,6 +73,12 @@ class ROICalculator:
         else:
             roi_percentage = ((revenue - costs) / costs) * 100
         
+        return self._build_roi_record(firm_id, revenue, costs, roi_percentage)
+    
+    @staticmethod
+    def _build_roi_record(firm_id: int, revenue: float, costs: float,
+                          roi_percentage: float) -> Dict[str, Any]:
+        """Build the ROI result record shared by the per-firm and bulk paths"""
         return {
             'firm_id': firm_id,
             'revenue': revenue,
@@ -66,16 +89,144 @@ class ROICalculator:
             'calculated_at': datetime.now().isoformat()
         }
     
+    @staticmethod
+    def compute_roi_percentages(revenue: np.ndarray, costs: np.ndarray) -> np.ndarray:
+        """Vectorized ROI: 0 for no revenue and no cost, inf for revenue with no cost"""
+        roi = np.zeros_like(revenue, dtype=np.float64)
+        has_costs = costs != 0
+        np.divide(revenue - costs, costs, out=roi, where=has_costs)
+        roi *= 100
+        roi[~has_costs & (revenue != 0)] = np.inf
+        return roi
+    
+    def load_firm_totals(self, start_date: str = None, end_date: str = None,
+                         firm_ids: Optional[Sequence[int]] = None) -> Dict[str, np.ndarray]:
+        """Load revenue and salary cost for every firm in grouped queries
+        
+        Returns aligned arrays ordered by firm_id. When firm_ids is given,
+        only those firms are loaded (ids not in the firm table are left
+        out), using chunked IN lists. With USE_ROLLUP_TABLES, costs and
+        all-time revenue are read from the rollup tables.
+        """
+        if self.snapshot is not None:
+            if firm_ids is None:
+                rows = slice(None)
+            else:
+                positions = {self.snapshot.firm_index(firm_id) for firm_id in firm_ids}
+                rows = np.array(sorted(positions - {None}), dtype=np.int64)
+            return {
+                'firm_ids': self.snapshot.firm_ids[rows],
+                'revenue': self.snapshot.revenue_by_firm(start_date, end_date)[rows],
+                'costs': self.snapshot.salary_by_firm[rows]
+            }
+        
+        if config.USE_ROLLUP_TABLES and not start_date and not end_date:
+            revenue_query = """
+                SELECT firm_id, COALESCE(SUM(total_revenue), 0) as total_revenue
+                FROM sales_monthly_rollup
+                WHERE 1=1
+            """
+        else:
+            revenue_query = """
+                SELECT firm_id, COALESCE(SUM(total_amount), 0) as total_revenue
+                FROM sales
+                WHERE 1=1
+            """
+        if config.USE_ROLLUP_TABLES:
+            costs_query = """
+                SELECT firm_id, total_salary
+                FROM firm_staff_totals
+            """
+        else:
+            costs_query = """
+                SELECT firm_id, COALESCE(SUM(salary), 0) as total_salary
+                FROM staff
+            """
+        if firm_ids is None:
+            firms = self.db.execute_query("SELECT firm_id FROM firm ORDER BY firm_id", cache=True)
+        else:
+            firms = self.db.execute_query_in("SELECT firm_id FROM firm WHERE firm_id IN ({ids})", firm_ids)
+            revenue_query += " AND firm_id IN ({ids})"
+            costs_query += " WHERE firm_id IN ({ids})"
+        firm_ids = np.sort(np.fromiter((row['firm_id'] for row in firms), dtype=np.int64, count=len(firms)))
+        
+        params = []
+        
+        if start_date:
+            revenue_query += " AND sale_date >= %s"
+            params.append(start_date)
+        
+        if end_date:
+            revenue_query += " AND sale_date <= %s"
+            params.append(end_date)
+        
+        revenue_query += " GROUP BY firm_id"
+        if not config.USE_ROLLUP_TABLES:
+            costs_query += " GROUP BY firm_id"
+        params = tuple(params) if params else None
+        if '{ids}' in revenue_query:
+            revenue_rows = self.db.execute_query_in(revenue_query, firm_ids.tolist(), params)
+            cost_rows = self.db.execute_query_in(costs_query, firm_ids.tolist())
+        else:
+            revenue_rows = self.db.execute_query(revenue_query, params, cache=True)
+            cost_rows = self.db.execute_query(costs_query, cache=True)
+        
+        position = {int(firm_id): idx for idx, firm_id in enumerate(firm_ids)}
+        revenue = np.zeros(len(firm_ids), dtype=np.float64)
+        costs = np.zeros(len(firm_ids), dtype=np.float64)
+        
+        for row in revenue_rows:
+            idx = position.get(row['firm_id'])
+            if idx is not None:
+                revenue[idx] = float(row['total_revenue'])
+        
+        for row in cost_rows:
+            idx = position.get(row['firm_id'])
+            if idx is not None:
+                costs[idx] = float(row['total_salary'])
+        
+        return {'firm_ids': firm_ids, 'revenue': revenue, 'costs': costs}
+    
+    def calculate_roi_bulk(self, firm_ids: Sequence[int], start_date: str = None,
+                           end_date: str = None) -> Dict[str, Any]:
+        """Calculate ROI for a list of firms, keyed by firm_id
+        
+        Resolves all firms with a constant number of grouped queries per
+        chunk of ids. Ids that are not in the firm table are listed under
+        'missing'.
+        """
+        totals = self.load_firm_totals(start_date, end_date, firm_ids)
+        roi = self.compute_roi_percentages(totals['revenue'], totals['costs'])
+        results = {
+            firm_id: self._build_roi_record(firm_id, revenue, costs, roi_percentage)
+            for firm_id, revenue, costs, roi_percentage in zip(
+                totals['firm_ids'].tolist(), totals['revenue'].tolist(),
+                totals['costs'].tolist(), roi.tolist()
+            )
+        }
+        return {
+            'results': results,
+            'missing': [firm_id for firm_id in dict.fromkeys(firm_ids) if firm_id not in results],
+            'count': len(results)
+        }
+    
     def calculate_all_firms_roi(self, start_date: str = None, 
                                 end_date: str = None) -> List[Dict[str, Any]]:
-        """Calculate ROI for all firms"""
-        query = "SELECT firm_id FROM firm"
-        firms = self.db.execute_query(query)
+        """Calculate ROI for all firms
+        
+        Uses a constant number of grouped queries instead of two
+        aggregate queries per firm.
+        """
+        totals = self.load_firm_totals(start_date, end_date)
+        roi = self.compute_roi_percentages(totals['revenue'], totals['costs'])
         
-        roi_results = []
-        for firm in firms:
-            roi = self.calculate_roi(firm['firm_id'], start_date, end_date)
-            roi_results.append(roi)
+        roi_results = [
+            self._build_roi_record(firm_id, revenue, costs, roi_percentage)
+            for firm_id, revenue, costs, roi_percentage in zip(
+                totals['firm_ids'].tolist(), totals['revenue'].tolist(),
+                totals['costs'].tolist(), roi.tolist()
+            )
+        ]
         
         # Sort by ROI percentage descending
         roi_results.sort(key=lambda x: x['roi_percentage'], reverse=True)
@@ -85,18 +236,15 @@ class ROICalculator:
     
     def calculate_roi_trends(self, firm_id: int, periods: int = 12) -> List[Dict[str, Any]]:
         """Calculate ROI trends over time (monthly)"""
-        query = """
-            SELECT 
-                DATE_FORMAT(sale_date, '%Y-%m') as period,
-                SUM(total_amount) as revenue
-            FROM sales
-            WHERE firm_id = %s
-            GROUP BY DATE_FORMAT(sale_date, '%Y-%m')
-            ORDER BY period DESC
-            LIMIT %s
-        """
+        if self.snapshot is not None:
+            months, revenues = self.snapshot.firm_monthly_revenue(firm_id)
+            results = [
+                {'period': format_period(month), 'revenue': revenue}
+                for month, revenue in zip(months[::-1][:periods].tolist(), revenues[::-1][:periods].tolist())
+            ]
+        else:
+            results = self._query_monthly_revenue(firm_id, periods)
         
-        results = self.db.execute_query(query, (firm_id, periods))
         costs = self.calculate_total_costs(firm_id)
         monthly_cost = costs / 12  # Approximate monthly cost
         
@@ -113,6 +261,31 @@ class ROICalculator:
         trends.reverse()  # Chronological order
         return trends
     
+    def _query_monthly_revenue(self, firm_id: int, periods: int) -> List[Dict[str, Any]]:
+        """Load the most recent monthly revenue rows for a firm, newest first"""
+        if config.USE_ROLLUP_TABLES:
+            query = """
+                SELECT period, total_revenue as revenue
+                FROM sales_monthly_rollup
+                WHERE firm_id = %s AND transaction_count > 0
+                ORDER BY period DESC
+                LIMIT %s
+            """
+            return self.db.execute_query(query, (firm_id, periods), cache=True)
+        
+        query = """
+            SELECT 
+                DATE_FORMAT(sale_date, '%%Y-%%m') as period,
+                SUM(total_amount) as revenue
+            FROM sales
+            WHERE firm_id = %s
+            GROUP BY DATE_FORMAT(sale_date, '%%Y-%%m')
+            ORDER BY period DESC
+            LIMIT %s
+        """
+        
+        return self.db.execute_query(query, (firm_id, periods), cache=True)
+    
     def get_negative_roi_firms(self) -> List[Dict[str, Any]]:
         """Get firms with negative ROI"""
         all_roi = self.calculate_all_firms_roi()
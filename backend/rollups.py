@@ -0,0 +1,168 @@
+"""
+Rebuild and verify the trigger-maintained rollup tables
+
+    python rollups.py verify [--fix]
+    python rollups.py rebuild [--firm-id ID ...]
+
+See database/migrations/001_sales_rollups.sql for the tables and triggers.
+"""
+from typing import Dict, List, Any, Optional, Sequence, Tuple
+import argparse
+import json
+import logging
+import time
+from database import get_db_connection
+from cache import invalidate_tables
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_TABLES = ('sales_monthly_rollup', 'firm_staff_totals')
+
+RAW_MONTHLY_QUERY = """
+    SELECT
+        firm_id,
+        DATE_FORMAT(sale_date, '%%Y-%%m') as period,
+        COUNT(*) as transaction_count,
+        COALESCE(SUM(quantity), 0) as total_quantity,
+        SUM(total_amount) as total_revenue
+    FROM sales{where}
+    GROUP BY firm_id, DATE_FORMAT(sale_date, '%%Y-%%m')
+"""
+
+ROLLUP_MONTHLY_QUERY = """
+    SELECT firm_id, period, transaction_count, total_quantity, total_revenue
+    FROM sales_monthly_rollup{where}
+"""
+
+RAW_STAFF_QUERY = """
+    SELECT firm_id, COUNT(*) as staff_count, COALESCE(SUM(salary), 0) as total_salary
+    FROM staff{where}
+    GROUP BY firm_id
+"""
+
+ROLLUP_STAFF_QUERY = """
+    SELECT firm_id, staff_count, total_salary
+    FROM firm_staff_totals{where}
+"""
+
+
+def _where(firm_ids: Optional[Sequence[int]]) -> str:
+    if firm_ids is None:
+        return ""
+    return f"\n    WHERE firm_id IN ({', '.join(str(int(firm_id)) for firm_id in firm_ids)})"
+
+
+def rebuild_rollups(db, firm_ids: Optional[Sequence[int]] = None) -> Dict[str, int]:
+    """Recompute the rollup tables (or the given firms' rows) from the raw tables
+    
+    Runs as one transaction. The INSERT ... SELECT locks the sales and
+    staff rows it reads, so concurrent writes wait for the rebuild rather
+    than being lost or counted twice. An empty firm_ids rebuilds nothing.
+    """
+    if firm_ids is not None and not len(firm_ids):
+        return {'monthly_rows': 0, 'staff_rows': 0}
+    where = _where(firm_ids)
+    statements = [
+        f"DELETE FROM sales_monthly_rollup{where}",
+        "INSERT INTO sales_monthly_rollup "
+        "(firm_id, period, transaction_count, total_quantity, total_revenue)" +
+        RAW_MONTHLY_QUERY.format(where=where),
+        f"DELETE FROM firm_staff_totals{where}",
+        "INSERT INTO firm_staff_totals (firm_id, staff_count, total_salary)" +
+        RAW_STAFF_QUERY.format(where=where)
+    ]
+    
+    started = time.perf_counter()
+    counts = []
+    try:
+        with db.connection.cursor() as cursor:
+            for statement in statements:
+                counts.append(cursor.execute(statement, ()))
+        db.connection.commit()
+    except Exception:
+        db.connection.rollback()
+        raise
+    finally:
+        invalidate_tables(ROLLUP_TABLES + ('sales', 'staff'))
+    
+    logger.info(f"Rebuilt rollups for {'all firms' if firm_ids is None else f'{len(firm_ids)} firms'} "
+                f"in {time.perf_counter() - started:.2f}s")
+    return {'monthly_rows': counts[1], 'staff_rows': counts[3]}
+
+
+def _compare(raw: List[Dict[str, Any]], rollup: List[Dict[str, Any]], key_fields: Tuple[str, ...],
+             value_fields: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """Rows whose values differ; a missing row counts as all zeros"""
+    def index(rows):
+        return {tuple(row[field] for field in key_fields):
+                tuple(round(float(row[field] or 0), 2) for field in value_fields) for row in rows}
+    
+    raw_rows, rollup_rows = index(raw), index(rollup)
+    zeros = (0.0,) * len(value_fields)
+    mismatches = []
+    for key in sorted(set(raw_rows) | set(rollup_rows)):
+        expected, actual = raw_rows.get(key, zeros), rollup_rows.get(key, zeros)
+        if expected != actual:
+            mismatches.append({
+                **dict(zip(key_fields, key)),
+                'expected': dict(zip(value_fields, expected)),
+                'actual': dict(zip(value_fields, actual))
+            })
+    return mismatches
+
+
+def verify_rollups(db, firm_ids: Optional[Sequence[int]] = None) -> Dict[str, Any]:
+    """Compare the rollup tables with aggregates of the raw tables (none for an empty firm_ids)"""
+    started = time.perf_counter()
+    if firm_ids is not None and not len(firm_ids):
+        return {'ok': True, 'monthly_mismatches': [], 'staff_mismatches': [], 'firms_affected': [],
+                'seconds': time.perf_counter() - started}
+    where = _where(firm_ids)
+    monthly = _compare(
+        db.execute_query(RAW_MONTHLY_QUERY.format(where=where), cache=False),
+        db.execute_query(ROLLUP_MONTHLY_QUERY.format(where=where), cache=False),
+        ('firm_id', 'period'), ('transaction_count', 'total_quantity', 'total_revenue')
+    )
+    staff = _compare(
+        db.execute_query(RAW_STAFF_QUERY.format(where=where), cache=False),
+        db.execute_query(ROLLUP_STAFF_QUERY.format(where=where), cache=False),
+        ('firm_id',), ('staff_count', 'total_salary')
+    )
+    return {
+        'ok': not monthly and not staff,
+        'monthly_mismatches': monthly,
+        'staff_mismatches': staff,
+        'firms_affected': sorted({row['firm_id'] for row in monthly + staff}),
+        'seconds': time.perf_counter() - started
+    }
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rebuild or verify the sales and staff rollup tables")
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    rebuild = subcommands.add_parser('rebuild', help="Recompute rollups from the raw tables")
+    rebuild.add_argument('--firm-id', type=int, action='append', dest='firm_ids',
+                         help="Only rebuild this firm (repeatable)")
+    verify = subcommands.add_parser('verify', help="Compare rollups with the raw tables")
+    verify.add_argument('--firm-id', type=int, action='append', dest='firm_ids',
+                        help="Only verify this firm (repeatable)")
+    verify.add_argument('--fix', action='store_true', help="Rebuild the firms that do not match")
+    args = parser.parse_args(argv)
+    
+    with get_db_connection() as db:
+        if args.command == 'rebuild':
+            print(json.dumps(rebuild_rollups(db, args.firm_ids)))
+            return 0
+        
+        report = verify_rollups(db, args.firm_ids)
+        print(json.dumps(report, indent=2, default=str))
+        if not report['ok'] and args.fix:
+            rebuild_rollups(db, report['firms_affected'])
+            report = verify_rollups(db, report['firms_affected'])
+            print(json.dumps({'fixed': report['ok']}))
+        return 0 if report['ok'] else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
@@ -0,0 +1,269 @@
+"""
+Sales rollup cube over firm x territory x segment x product x month
+"""
+from typing import Dict, List, Any, Sequence, Tuple
+import logging
+import time
+from datetime import date
+import numpy as np
+from config import config
+from cache import result_cache
+from analytics_snapshot import format_period
+from bottleneck_detector import (DETECTORS, DEFAULT_THRESHOLDS, run_detectors,
+                                 describe_findings, month_of, month_start)
+
+logger = logging.getLogger(__name__)
+
+DIMENSIONS = ('firm_id', 'territory', 'customer_segment', 'product_id', 'period')
+MEASURES = ('revenue', 'quantity', 'transactions')
+
+CUBE_QUERY = """
+    SELECT
+        firm_id,
+        territory,
+        customer_segment,
+        product_id,
+        DATE_FORMAT(sale_date, '%%Y-%%m') as period,
+        COUNT(*) as transactions,
+        COALESCE(SUM(quantity), 0) as quantity,
+        SUM(total_amount) as revenue
+    FROM sales
+    WHERE sale_date >= %s AND sale_date < %s
+    GROUP BY firm_id, territory, customer_segment, product_id, DATE_FORMAT(sale_date, '%%Y-%%m')
+"""
+
+
+def _encode(values: Sequence[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """Dictionary-encode values into int32 codes (NULL is a regular member)"""
+    lookup: Dict[Any, int] = {}
+    codes = np.fromiter((lookup.setdefault(value, len(lookup)) for value in values),
+                        dtype=np.int32, count=len(values))
+    return codes, list(lookup)
+
+
+def _with_null(codes: np.ndarray, labels: List[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """Map -1 (NULL) codes from the analytics snapshot onto an explicit None member"""
+    codes = codes.astype(np.int32)
+    if (codes < 0).any():
+        codes[codes < 0] = len(labels)
+        labels = list(labels) + [None]
+    return codes, list(labels)
+
+
+class SalesCube:
+    """Sparse (COO) rollup cube of sales measures
+    
+    Each cell is one non-empty (firm, territory, segment, product, month)
+    combination with its revenue, quantity and transaction count.
+    Dimensions are dictionary-encoded so any slice, rollup or monthly
+    series is a mask plus a bincount over compact arrays.
+    """
+    
+    def __init__(self, codes: Dict[str, np.ndarray], labels: Dict[str, List[Any]],
+                 measures: Dict[str, np.ndarray], first_month: int, n_months: int):
+        self.codes = codes
+        self.labels = labels
+        self.measures = measures
+        self.first_month = first_month
+        self.n_months = n_months
+        self.labels['period'] = [format_period(first_month + m) for m in range(n_months)]
+        self._positions = {dim: {label: idx for idx, label in enumerate(values)}
+                           for dim, values in self.labels.items()}
+        self.built_at = time.time()
+    
+    @classmethod
+    def from_rows(cls, rows, first_month: int, n_months: int) -> 'SalesCube':
+        """Build from rows of the grouped cube query (an iterable of row chunks)"""
+        rows = [row for chunk in rows for row in chunk]
+        codes, labels = {}, {}
+        for dim in ('firm_id', 'territory', 'customer_segment', 'product_id'):
+            codes[dim], labels[dim] = _encode([row[dim] for row in rows])
+        codes['period'] = np.array([
+            (int(row['period'][:4]) - 1970) * 12 + int(row['period'][5:7]) - 1 - first_month
+            for row in rows
+        ], dtype=np.int32)
+        measures = {
+            'revenue': np.array([float(row['revenue']) for row in rows], dtype=np.float64),
+            'quantity': np.array([int(row['quantity']) for row in rows], dtype=np.int64),
+            'transactions': np.array([int(row['transactions']) for row in rows], dtype=np.int64)
+        }
+        return cls(codes, labels, measures, first_month, n_months)
+    
+    @classmethod
+    def from_snapshot(cls, snapshot, first_month: int, n_months: int) -> 'SalesCube':
+        """Build from the analytics snapshot's encoded sales columns"""
+        keep = (snapshot.sales_firm >= 0) & (snapshot.sales_month >= first_month) & \
+            (snapshot.sales_month < first_month + n_months)
+        firm, firm_labels = _encode(snapshot.firm_ids[snapshot.sales_firm[keep]].tolist())
+        territory, territory_labels = _with_null(snapshot.sales_territory[keep],
+                                                 snapshot.territory_categories)
+        segment, segment_labels = _with_null(snapshot.sales_segment[keep], snapshot.segment_categories)
+        product, product_labels = _encode(
+            [None if p < 0 else p for p in snapshot.sales_product[keep].tolist()])
+        month = (snapshot.sales_month[keep] - first_month).astype(np.int64)
+        
+        sizes = (len(firm_labels), len(territory_labels), len(segment_labels), len(product_labels), n_months)
+        key = np.ravel_multi_index((firm, territory, segment, product, month), sizes)
+        cells, inverse = np.unique(key, return_inverse=True)
+        firm, territory, segment, product, month = np.unravel_index(cells, sizes)
+        
+        codes = {
+            'firm_id': firm.astype(np.int32),
+            'territory': territory.astype(np.int32),
+            'customer_segment': segment.astype(np.int32),
+            'product_id': product.astype(np.int32),
+            'period': month.astype(np.int32)
+        }
+        labels = {
+            'firm_id': firm_labels,
+            'territory': territory_labels,
+            'customer_segment': segment_labels,
+            'product_id': product_labels
+        }
+        measures = {
+            'revenue': np.bincount(inverse, weights=snapshot.sales_amount[keep], minlength=len(cells)),
+            'quantity': np.bincount(inverse, weights=snapshot.sales_quantity[keep],
+                                    minlength=len(cells)).astype(np.int64),
+            'transactions': np.bincount(inverse, minlength=len(cells)).astype(np.int64)
+        }
+        return cls(codes, labels, measures, first_month, n_months)
+    
+    @property
+    def n_cells(self) -> int:
+        return len(self.measures['revenue'])
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in self.codes.values()) + sum(a.nbytes for a in self.measures.values())
+    
+    def mask(self, filters: Dict[str, Any] = None) -> np.ndarray:
+        """Boolean cell mask for equality/membership filters on any dimension
+        
+        Filter values may be a single value or a list. 'start_period' and
+        'end_period' ('YYYY-MM') bound the month range inclusively.
+        """
+        selected = np.ones(self.n_cells, dtype=bool)
+        for name, value in (filters or {}).items():
+            if value is None:
+                continue
+            if name in ('start_period', 'end_period'):
+                month = (int(value[:4]) - 1970) * 12 + int(value[5:7]) - 1 - self.first_month
+                selected &= (self.codes['period'] >= month) if name == 'start_period' \
+                    else (self.codes['period'] <= month)
+                continue
+            if name not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension: {name}")
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            positions = [self._positions[name][v] for v in values if v in self._positions[name]]
+            selected &= np.isin(self.codes[name], positions)
+        return selected
+    
+    def _group(self, by: Sequence[str], selected: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Group selected cells by dimensions: (group codes per dim, cell -> group index)"""
+        for dim in by:
+            if dim not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension: {dim}")
+        if not by:
+            return np.zeros((0, 1), dtype=np.int64), np.zeros(int(selected.sum()), dtype=np.int64)
+        sizes = tuple(len(self.labels[dim]) for dim in by)
+        key = np.ravel_multi_index(tuple(self.codes[dim][selected] for dim in by), sizes)
+        groups, inverse = np.unique(key, return_inverse=True)
+        return np.array(np.unravel_index(groups, sizes)), inverse
+    
+    def _group_labels(self, by: Sequence[str], group_codes: np.ndarray, idx: int) -> Dict[str, Any]:
+        return {dim: self.labels[dim][group_codes[d, idx]] for d, dim in enumerate(by)}
+    
+    def rollup(self, by: Sequence[str], filters: Dict[str, Any] = None,
+               limit: int = None) -> List[Dict[str, Any]]:
+        """Aggregate measures by any subset of dimensions, largest revenue first"""
+        selected = self.mask(filters)
+        group_codes, inverse = self._group(by, selected)
+        n_groups = group_codes.shape[1] if by else 1
+        totals = {
+            measure: np.bincount(inverse, weights=values[selected], minlength=n_groups)
+            for measure, values in self.measures.items()
+        }
+        total_revenue = totals['revenue'].sum()
+        
+        order = np.argsort(-totals['revenue'], kind='stable')
+        if limit:
+            order = order[:limit]
+        return [
+            {
+                **(self._group_labels(by, group_codes, idx) if by else {}),
+                'revenue': float(totals['revenue'][idx]),
+                'quantity': int(totals['quantity'][idx]),
+                'transactions': int(totals['transactions'][idx]),
+                'revenue_share': float(totals['revenue'][idx] / total_revenue) if total_revenue else 0.0
+            }
+            for idx in order.tolist()
+        ]
+    
+    def monthly_matrix(self, by: Sequence[str], filters: Dict[str, Any] = None,
+                       measure: str = 'revenue') -> Dict[str, Any]:
+        """Dense group x month series of a measure
+        
+        Months before a group's first activity are NaN and later empty
+        months are 0, the layout the bottleneck detectors expect.
+        """
+        by = [dim for dim in by if dim != 'period']
+        selected = self.mask(filters)
+        group_codes, inverse = self._group(by, selected)
+        n_groups = group_codes.shape[1] if by else 1
+        
+        flat = inverse * self.n_months + self.codes['period'][selected]
+        matrix = np.bincount(flat, weights=self.measures[measure][selected],
+                             minlength=n_groups * self.n_months).reshape(n_groups, self.n_months)
+        first_seen = np.full(n_groups, self.n_months)
+        np.minimum.at(first_seen, inverse, self.codes['period'][selected])
+        matrix[np.arange(self.n_months)[None, :] < first_seen[:, None]] = np.nan
+        
+        return {
+            'groups': [self._group_labels(by, group_codes, idx) for idx in range(n_groups)] if by else [{}],
+            'periods': self.labels['period'],
+            'first_month': self.first_month,
+            'values': matrix
+        }
+    
+    def detect_bottlenecks(self, by: Sequence[str], filters: Dict[str, Any] = None,
+                           detectors: Sequence[str] = None, thresholds: Dict[str, float] = None,
+                           include_current_month: bool = False) -> List[Dict[str, Any]]:
+        """Run the bottleneck detectors over every group of a slice"""
+        detectors = list(detectors or DETECTORS)
+        unknown = (set(detectors) - set(DETECTORS)) | (set(thresholds or {}) - set(DEFAULT_THRESHOLDS))
+        if unknown:
+            raise ValueError(f"Unknown detectors or thresholds: {sorted(unknown)}")
+        
+        data = self.monthly_matrix(by, filters)
+        values = data['values']
+        if not include_current_month and self.first_month + self.n_months - 1 >= month_of(date.today()):
+            values = values[:, :-1]
+        
+        results = run_detectors(values, thresholds, detectors)
+        findings = describe_findings(np.arange(len(data['groups'])), self.first_month, results)
+        for finding in findings:
+            group = data['groups'][finding.pop('firm_id')]
+            finding.update(group)
+        return findings
+
+
+def get_sales_cube(db, snapshot=None, lookback_months: int = None) -> SalesCube:
+    """Build the sales cube, or reuse the cached one until sales change"""
+    lookback_months = lookback_months or config.SALES_CUBE_LOOKBACK_MONTHS
+    last_month = month_of(date.today())
+    first_month = last_month - lookback_months + 1
+    
+    def build() -> SalesCube:
+        started = time.perf_counter()
+        if snapshot is not None:
+            cube = SalesCube.from_snapshot(snapshot, first_month, lookback_months)
+        else:
+            chunks = db.stream_query(CUBE_QUERY, (month_start(first_month), month_start(last_month + 1)),
+                                     chunk_size=config.STREAM_CHUNK_SIZE)
+            cube = SalesCube.from_rows(chunks, first_month, lookback_months)
+        logger.info(f"Built sales cube with {cube.n_cells} cells ({cube.nbytes} bytes) in "
+                    f"{time.perf_counter() - started:.2f}s")
+        return cube
+    
+    key = ('sales_cube', first_month, lookback_months, snapshot.built_at if snapshot is not None else None)
+    return result_cache.get_or_compute(key, build, ('sales',))
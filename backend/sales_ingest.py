@@ -0,0 +1,359 @@
+"""
+Streaming bulk loader for sales files (CSV with a header row, or NDJSON)
+
+    python sales_ingest.py FILE [--format csv|ndjson] [--source-key KEY] [--rejects PATH] [--restart]
+
+Needs database migrations 001 and 003.
+"""
+from typing import Dict, List, Any, Callable, Iterator, Optional, Sequence, Set, Tuple
+import argparse
+import csv
+import gzip
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from decimal import Decimal
+from config import config
+from database import get_db_connection
+from cache import invalidate_tables, tables_written
+from data_loader import DataValidator, SALES_INSERT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+MAX_ERROR_SAMPLES = 20
+
+INSERT_SALES_QUERY = f"""
+    INSERT INTO sales ({', '.join(SALES_INSERT_COLUMNS)})
+    VALUES ({', '.join(['%s'] * len(SALES_INSERT_COLUMNS))})
+"""
+
+UPSERT_ROLLUP_QUERY = """
+    INSERT INTO sales_monthly_rollup (firm_id, period, transaction_count, total_quantity, total_revenue)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        transaction_count = transaction_count + VALUES(transaction_count),
+        total_quantity = total_quantity + VALUES(total_quantity),
+        total_revenue = total_revenue + VALUES(total_revenue)
+"""
+
+CHECKPOINT_QUERY = """
+    SELECT source_size, records_done, rows_inserted, rows_rejected, completed
+    FROM ingest_checkpoint
+    WHERE source = %s
+"""
+
+SAVE_CHECKPOINT_QUERY = """
+    INSERT INTO ingest_checkpoint (source, source_size, records_done, rows_inserted, rows_rejected, completed)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        source_size = VALUES(source_size),
+        records_done = VALUES(records_done),
+        rows_inserted = VALUES(rows_inserted),
+        rows_rejected = VALUES(rows_rejected),
+        completed = VALUES(completed)
+"""
+
+
+def detect_format(path: str) -> str:
+    """File format from the extension (.csv, .ndjson/.jsonl/.json, optionally .gz)"""
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    raise ValueError(f"Cannot tell the format of {path}; pass one of {FORMATS}")
+
+
+def iter_records(path: str, fmt: str = None) -> Iterator[Optional[Dict[str, Any]]]:
+    """Yield the records of a sales file one at a time
+    
+    CSV column names come from the header row. Blank lines are skipped;
+    NDJSON lines that are not JSON objects are yielded as None.
+    """
+    fmt = fmt or detect_format(path)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8', newline='') as source:
+        if fmt == 'csv':
+            reader = csv.reader(source)
+            header = [name.strip().lower() for name in next(reader, [])]
+            for values in reader:
+                if values:
+                    yield dict(zip(header, values))
+        else:
+            for line in source:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield record if isinstance(record, dict) else None
+
+
+class _Batch:
+    __slots__ = ('rows', 'rollup', 'records_end', 'rejects')
+    
+    def __init__(self):
+        self.rows: List[tuple] = []
+        self.rollup: Dict[Tuple[int, str], List[int]] = {}  # (firm_id, period) -> [count, quantity, cents]
+        self.records_end = 0
+        self.rejects: List[Dict[str, Any]] = []
+
+
+_DONE = object()
+
+
+class SalesIngestPipeline:
+    """Loads a sales file with parsing and inserting running concurrently
+    
+    A parser thread reads and validates records (DataValidator rules,
+    against the firms present at the start) into batches on a bounded
+    queue. The calling thread inserts each batch with one executemany
+    (a multi-row INSERT) and commits every ``commit_rows`` rows together
+    with the monthly rollup totals of those rows and the checkpoint. A
+    failed load therefore resumes after its last commit without losing
+    or duplicating rows.
+    """
+    
+    def __init__(self, db, batch_rows: int = None, commit_rows: int = None, queue_batches: int = None,
+                 progress_seconds: float = None, progress: Callable[[Dict[str, Any]], None] = None):
+        self.db = db
+        self.batch_rows = batch_rows or config.INGEST_BATCH_ROWS
+        self.commit_rows = max(commit_rows or config.INGEST_COMMIT_ROWS, self.batch_rows)
+        self.queue_batches = queue_batches or config.INGEST_QUEUE_BATCHES
+        self.progress_seconds = config.INGEST_PROGRESS_SECONDS if progress_seconds is None else progress_seconds
+        self.progress = progress
+    
+    def _parse(self, records: Iterator[Optional[Dict[str, Any]]], first_record: int, firm_ids: Set[int],
+               batches: queue.Queue, stop: threading.Event, stats: Dict[str, Any]):
+        """Parser thread: validate records into batches until the file ends or the writer stops"""
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        validate = DataValidator.validate_sales_row
+        record_no = first_record
+        try:
+            batch = _Batch()
+            started = time.perf_counter()
+            for record in records:
+                record_no += 1
+                values, errors = validate(record, firm_ids) if record is not None else (None, ["Invalid JSON object"])
+                if values is None:
+                    batch.rejects.append({'record': record_no, 'errors': errors, 'data': record})
+                else:
+                    batch.rows.append(values)
+                    key = (values[0], values[3][:7])
+                    totals = batch.rollup.get(key)
+                    if totals is None:
+                        batch.rollup[key] = [1, values[4], round(values[6] * 100)]
+                    else:
+                        totals[0] += 1
+                        totals[1] += values[4]
+                        totals[2] += round(values[6] * 100)
+                
+                if len(batch.rows) + len(batch.rejects) >= self.batch_rows:
+                    batch.records_end = record_no
+                    stats['parse_seconds'] += time.perf_counter() - started
+                    if not put(batch):
+                        return
+                    batch = _Batch()
+                    started = time.perf_counter()
+            batch.records_end = record_no
+            stats['parse_seconds'] += time.perf_counter() - started
+            if put(batch):
+                put(_DONE)
+        except Exception as e:
+            put(e)
+    
+    def load(self, path: str, source_key: str = None, fmt: str = None, restart: bool = False,
+             rejects_path: str = None) -> Dict[str, Any]:
+        """Load a sales file, resuming from its checkpoint when one exists
+        
+        The checkpoint is keyed by source_key (default: the file name) and
+        must match the file size. A completed source is not loaded again.
+        restart=True ignores the checkpoint, e.g. for a new file reusing a
+        key. Rejected records are appended to rejects_path as NDJSON and
+        flushed before the checkpoint that covers them is committed, so a
+        crash can repeat rejects on resume but never lose them.
+        """
+        source_key = source_key or os.path.basename(path)
+        source_size = os.path.getsize(path)
+        fmt = fmt or detect_format(path)
+        
+        stats = {
+            'source': source_key,
+            'resumed_from': 0,
+            'records_read': 0,
+            'rows_inserted': 0,
+            'rows_rejected': 0,
+            'rows_per_second': 0.0,
+            'seconds': 0.0,
+            'parse_seconds': 0.0,
+            'insert_seconds': 0.0,
+            'commits': 0,
+            'completed': False,
+            'skipped': False,
+            'error_samples': []
+        }
+        totals = {'inserted': 0, 'rejected': 0}
+        checkpoint = self.db.execute_query(CHECKPOINT_QUERY, (source_key,), cache=False)
+        if checkpoint and not restart:
+            checkpoint = checkpoint[0]
+            if int(checkpoint['source_size']) != source_size:
+                raise ValueError(f"Checkpoint for {source_key} is for a {checkpoint['source_size']}-byte file, "
+                                 f"not {source_size} bytes; restart to load it from the start")
+            if checkpoint['completed']:
+                logger.info(f"{source_key} was already loaded")
+                return {**stats, 'completed': True, 'skipped': True}
+            stats['resumed_from'] = int(checkpoint['records_done'])
+            totals = {'inserted': int(checkpoint['rows_inserted']), 'rejected': int(checkpoint['rows_rejected'])}
+            logger.info(f"Resuming {source_key} after record {stats['resumed_from']}")
+        
+        firm_ids = {row['firm_id'] for row in self.db.execute_query("SELECT firm_id FROM firm", cache=False)}
+        records = itertools.islice(iter_records(path, fmt), stats['resumed_from'], None)
+        batches: queue.Queue = queue.Queue(maxsize=self.queue_batches)
+        stop = threading.Event()
+        parser = threading.Thread(target=self._parse, name='sales-ingest-parser',
+                                  args=(records, stats['resumed_from'], firm_ids, batches, stop, stats),
+                                  daemon=True)
+        
+        connection = self.db.connection
+        rejects_file = open(rejects_path, 'a', encoding='utf-8') if rejects_path else None
+        started = last_report = time.perf_counter()
+        pending_rows, pending_rollup, pending_rejects = 0, {}, []
+        records_done = stats['resumed_from']
+        
+        def commit(completed: bool = False):
+            nonlocal pending_rows, pending_rollup, pending_rejects
+            if rejects_file is not None and pending_rejects:
+                for reject in pending_rejects:
+                    rejects_file.write(json.dumps(reject, default=str) + "\n")
+                rejects_file.flush()
+            if pending_rollup:
+                cursor.executemany(UPSERT_ROLLUP_QUERY, [
+                    (firm_id, period, count, quantity, Decimal(cents).scaleb(-2))
+                    for (firm_id, period), (count, quantity, cents) in pending_rollup.items()
+                ])
+            cursor.execute(SAVE_CHECKPOINT_QUERY, (
+                source_key, source_size, records_done,
+                totals['inserted'] + stats['rows_inserted'] + pending_rows,
+                totals['rejected'] + stats['rows_rejected'] + len(pending_rejects), completed
+            ))
+            connection.commit()
+            invalidate_tables(tables_written(INSERT_SALES_QUERY))
+            
+            stats['rows_inserted'] += pending_rows
+            stats['rows_rejected'] += len(pending_rejects)
+            stats['commits'] += 1
+            for reject in pending_rejects:
+                if len(stats['error_samples']) < MAX_ERROR_SAMPLES:
+                    stats['error_samples'].append({'record': reject['record'], 'errors': reject['errors']})
+            pending_rows, pending_rollup, pending_rejects = 0, {}, []
+        
+        cursor = connection.cursor()
+        try:
+            # Rollup totals are applied per transaction instead of by the per-row trigger
+            cursor.execute("SET @skip_sales_rollup_trigger = 1")
+            parser.start()
+            while True:
+                batch = batches.get()
+                if batch is _DONE:
+                    break
+                if isinstance(batch, Exception):
+                    raise batch
+                
+                if batch.rows:
+                    insert_started = time.perf_counter()
+                    cursor.executemany(INSERT_SALES_QUERY, batch.rows)
+                    stats['insert_seconds'] += time.perf_counter() - insert_started
+                pending_rows += len(batch.rows)
+                pending_rejects.extend(batch.rejects)
+                for key, (count, quantity, cents) in batch.rollup.items():
+                    totals_row = pending_rollup.get(key)
+                    if totals_row is None:
+                        pending_rollup[key] = [count, quantity, cents]
+                    else:
+                        totals_row[0] += count
+                        totals_row[1] += quantity
+                        totals_row[2] += cents
+                records_done = batch.records_end
+                
+                if pending_rows >= self.commit_rows:
+                    commit()
+                
+                now = time.perf_counter()
+                if now - last_report >= self.progress_seconds:
+                    last_report = now
+                    stats['records_read'] = records_done - stats['resumed_from']
+                    stats['seconds'] = now - started
+                    stats['rows_per_second'] = stats['rows_inserted'] / stats['seconds']
+                    logger.info(f"{source_key}: {stats['rows_inserted']} rows committed, "
+                                f"{stats['rows_per_second']:.0f} rows/s")
+                    if self.progress is not None:
+                        self.progress(dict(stats))
+            
+            commit(completed=True)
+            stats['completed'] = True
+        except Exception:
+            stop.set()
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            stop.set()
+            try:
+                cursor.execute("SET @skip_sales_rollup_trigger = NULL")
+                cursor.close()
+            except Exception:
+                # Never hand a connection that skips rollup maintenance back to the pool
+                self.db._broken = True
+            if parser.is_alive():
+                parser.join()
+            if rejects_file is not None:
+                rejects_file.close()
+            stats['records_read'] = records_done - stats['resumed_from']
+            stats['seconds'] = time.perf_counter() - started
+            stats['rows_per_second'] = stats['rows_inserted'] / stats['seconds'] if stats['seconds'] else 0.0
+        
+        logger.info(f"Loaded {stats['rows_inserted']} sales from {source_key} "
+                    f"({stats['rows_rejected']} rejected) in {stats['seconds']:.1f}s, "
+                    f"{stats['rows_per_second']:.0f} rows/s")
+        return stats
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk load a CSV or NDJSON sales file")
+    parser.add_argument('path', help="Sales file (.csv, .ndjson/.jsonl, optionally gzipped)")
+    parser.add_argument('--format', choices=FORMATS, help="Override the format detected from the extension")
+    parser.add_argument('--source-key', help="Checkpoint key (default: the file name)")
+    parser.add_argument('--rejects', help="Append rejected records to this NDJSON file")
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+    parser.add_argument('--batch-rows', type=int, help="Rows per multi-row INSERT")
+    parser.add_argument('--commit-rows', type=int, help="Rows per transaction and checkpoint")
+    args = parser.parse_args(argv)
+    
+    with get_db_connection() as db:
+        pipeline = SalesIngestPipeline(db, batch_rows=args.batch_rows, commit_rows=args.commit_rows)
+        stats = pipeline.load(args.path, args.source_key, args.format, args.restart, args.rejects)
+    print(json.dumps(stats, indent=2, default=str))
+    return 0 if stats['completed'] else 1
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(main())
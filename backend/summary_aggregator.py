@@ -0,0 +1,199 @@
+"""
+Executive summary aggregation for the dashboard KPI cards
+"""
+from typing import Dict, Any, Callable, Optional
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from config import config
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_QUERY = """
+    SELECT
+        (SELECT COALESCE(SUM(total_amount), 0) FROM sales) as total_revenue,
+        (SELECT COUNT(*) FROM firm) as total_firms,
+        (SELECT COUNT(*) FROM staff) as total_staff,
+        (
+            SELECT COALESCE(AVG(CASE
+                WHEN COALESCE(c.total_salary, 0) <> 0 THEN
+                    CAST(COALESCE(r.total_revenue, 0) - c.total_salary AS DOUBLE)
+                    / CAST(c.total_salary AS DOUBLE) * 100
+                WHEN COALESCE(r.total_revenue, 0) = 0 THEN 0
+            END), 0)
+            FROM firm f
+            LEFT JOIN (
+                SELECT firm_id, SUM(total_amount) as total_revenue
+                FROM sales
+                GROUP BY firm_id
+            ) r ON f.firm_id = r.firm_id
+            LEFT JOIN (
+                SELECT firm_id, SUM(salary) as total_salary
+                FROM staff
+                GROUP BY firm_id
+            ) c ON f.firm_id = c.firm_id
+        ) as average_roi
+"""
+
+FIRM_TOTALS_QUERY = """
+    SELECT
+        f.firm_id,
+        COALESCE(r.total_revenue, 0) as total_revenue,
+        COALESCE(c.total_salary, 0) as total_salary,
+        COALESCE(c.staff_count, 0) as staff_count
+    FROM firm f
+    LEFT JOIN (
+        SELECT firm_id, SUM(total_amount) as total_revenue
+        FROM sales
+        GROUP BY firm_id
+    ) r ON f.firm_id = r.firm_id
+    LEFT JOIN (
+        SELECT firm_id, SUM(salary) as total_salary, COUNT(*) as staff_count
+        FROM staff
+        GROUP BY firm_id
+    ) c ON f.firm_id = c.firm_id
+"""
+
+
+def _firm_roi(revenue: float, costs: float) -> Optional[float]:
+    """ROI contribution of one firm to the average (None when infinite)"""
+    if costs == 0:
+        return 0.0 if revenue == 0 else None
+    return ((revenue - costs) / costs) * 100
+
+
+class SummaryAggregator:
+    """Computes the dashboard summary in a single round trip"""
+    
+    def __init__(self, db):
+        self.db = db
+    
+    def get_summary(self) -> Dict[str, Any]:
+        """Get total revenue, firm count, staff count and average ROI"""
+        row = self.db.execute_query(SUMMARY_QUERY, cache=False)[0]
+        
+        return {
+            'total_revenue': float(row['total_revenue']),
+            'total_firms': int(row['total_firms']),
+            'total_staff': int(row['total_staff']),
+            'average_roi': float(row['average_roi'])
+        }
+
+
+class RunningSummary:
+    """Running aggregate of the dashboard summary
+    
+    Loaded from per-firm totals, then kept current by record_sale so
+    reads cost O(1) regardless of firm count. Once the aggregate is older
+    than ``max_age`` seconds it is reloaded in a background thread while
+    the previous one keeps being served, which also bounds drift from
+    writes made by other processes. Until the first load finishes, reads
+    fall back to SummaryAggregator's single-row query.
+    """
+    
+    def __init__(self, max_age: int = None):
+        self.max_age = config.SUMMARY_REFRESH_SECONDS if max_age is None else max_age
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._reset()
+        self._loaded_at: Optional[float] = None
+    
+    def _reset(self):
+        self._revenue: Dict[int, float] = {}
+        self._costs: Dict[int, float] = {}
+        self._roi: Dict[int, Optional[float]] = {}
+        self._total_revenue = 0.0
+        self._total_staff = 0
+        self._roi_sum = 0.0
+        self._roi_count = 0
+    
+    def load(self, db):
+        """Rebuild the aggregate from the database"""
+        rows = db.execute_query(FIRM_TOTALS_QUERY, cache=False)
+        
+        with self._lock:
+            self._reset()
+            for row in rows:
+                firm_id = row['firm_id']
+                self._revenue[firm_id] = float(row['total_revenue'])
+                self._costs[firm_id] = float(row['total_salary'])
+                self._total_revenue += self._revenue[firm_id]
+                self._total_staff += int(row['staff_count'])
+                self._roi[firm_id] = None
+                self._update_roi(firm_id)
+            self._loaded_at = time.monotonic()
+        
+        logger.info(f"Loaded running summary for {len(rows)} firms")
+    
+    def is_stale(self) -> bool:
+        """Check whether the aggregate needs to be reloaded"""
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.max_age
+    
+    def ensure_fresh(self, connection_factory: Callable):
+        """Start a background reload if stale; only one reload runs at a time"""
+        if not self.is_stale() or not self._refresh_lock.acquire(blocking=False):
+            return
+        
+        def reload():
+            try:
+                with connection_factory() as db:
+                    self.load(db)
+            except Exception as e:
+                logger.error(f"Summary reload failed: {e}")
+            finally:
+                self._refresh_lock.release()
+        
+        threading.Thread(target=reload, name='summary-reload', daemon=True).start()
+    
+    def get(self, connection_factory: Callable) -> Dict[str, Any]:
+        """Get the summary, refreshing in the background when stale"""
+        self.ensure_fresh(connection_factory)
+        if self._loaded_at is None:
+            with connection_factory() as db:
+                return SummaryAggregator(db).get_summary()
+        return self.summary()
+    
+    def _update_roi(self, firm_id: int):
+        """Replace a firm's contribution to the ROI average"""
+        old_roi = self._roi.get(firm_id)
+        if old_roi is not None:
+            self._roi_sum -= old_roi
+            self._roi_count -= 1
+        
+        new_roi = _firm_roi(self._revenue.get(firm_id, 0.0), self._costs.get(firm_id, 0.0))
+        self._roi[firm_id] = new_roi
+        if new_roi is not None:
+            self._roi_sum += new_roi
+            self._roi_count += 1
+    
+    @contextmanager
+    def recording(self):
+        """Hold off reloads while sales are committed and passed to record_sale
+        
+        A reload that read the committed sales before record_sale ran would
+        otherwise count them twice.
+        """
+        with self._refresh_lock:
+            yield
+    
+    def record_sale(self, firm_id: int, amount: float):
+        """Apply a new sale to the aggregate (commit it inside recording())"""
+        with self._lock:
+            self._roi.setdefault(firm_id, None)
+            self._revenue[firm_id] = self._revenue.get(firm_id, 0.0) + amount
+            self._total_revenue += amount
+            self._update_roi(firm_id)
+    
+    def summary(self) -> Dict[str, Any]:
+        """Get the current summary without touching the database"""
+        with self._lock:
+            return {
+                'total_revenue': self._total_revenue,
+                'total_firms': len(self._roi),
+                'total_staff': self._total_staff,
+                'average_roi': self._roi_sum / self._roi_count if self._roi_count > 0 else 0.0
+            }
+
+
+running_summary = RunningSummary()
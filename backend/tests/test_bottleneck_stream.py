@@ -0,0 +1,106 @@
+"""
+BottleneckMonitor.apply_sales keeps the windows right for any delivery order
+"""
+from datetime import date
+import numpy as np
+import pytest
+from bottleneck_detector import month_of, month_start
+from bottleneck_stream import BottleneckMonitor
+
+LOOKBACK = 24
+
+
+def _sales():
+    """Two years of completed months: firm 1 collapses in the last one, firm 2 stays flat"""
+    current = month_of(date.today())
+    rows = []
+    for back in range(LOOKBACK, 0, -1):
+        sale_date = month_start(current - back).replace(day=10)
+        steady = 1000.0 + 10 * (back % 2)
+        rows.append({'firm_id': 1, 'sale_date': sale_date, 'total_amount': 100.0 if back == 1 else steady})
+        rows.append({'firm_id': 2, 'sale_date': sale_date, 'total_amount': steady})
+    for sale_id, row in enumerate(rows, start=1):
+        row['sale_id'] = sale_id
+    return rows
+
+
+def _window(monitor, firm_id):
+    return monitor._revenue[monitor._row[firm_id]].copy()
+
+
+@pytest.fixture
+def monitor():
+    # Never project the month in progress, so results do not depend on today's day
+    return BottleneckMonitor(lookback_months=LOOKBACK, detectors=('zscore',), project_after_days=32,
+                             poll_lag_ids=1000)
+
+
+def test_in_window_rows_fill_the_windows(monitor):
+    sales = _sales()
+    assert monitor.apply_sales(sales) == len(sales)
+    
+    firm_1 = _window(monitor, 1)
+    assert firm_1.shape == (LOOKBACK + 1,)
+    assert firm_1[:-2].tolist() == [1000.0 + 10 * (back % 2) for back in range(LOOKBACK, 1, -1)]
+    assert firm_1[-2] == 100.0
+    assert firm_1[-1] == 0.0  # Current month, no sales yet
+    assert monitor.stats()['high_water_sale_id'] == len(sales)
+    assert [(b['firm_id'], b['detector']) for b in monitor.bottlenecks()] == [(1, 'zscore')]
+
+
+def test_duplicates_are_applied_once(monitor):
+    sales = _sales()
+    monitor.apply_sales(sales)
+    before = monitor._revenue.copy()
+    
+    assert monitor.apply_sales(sales) == 0
+    assert monitor.apply_sales(sales[:5]) == 0
+    assert np.array_equal(monitor._revenue, before, equal_nan=True)
+    assert monitor.stats()['sales_applied'] == len(sales)
+
+
+def test_late_rows_below_the_high_water_mark_are_applied(monitor):
+    sales = _sales()
+    late = sales.pop(10)
+    monitor.apply_sales(sales)
+    firm_row = _window(monitor, late['firm_id'])
+    
+    assert monitor.apply_sales([late]) == 1
+    assert monitor.stats()['late_sales'] == 1
+    col = month_of(late['sale_date']) - monitor._first_month
+    assert _window(monitor, late['firm_id'])[col] == firm_row[col] + late['total_amount']
+    assert monitor.apply_sales([late]) == 0
+
+
+def test_future_rows_do_not_move_the_window(monitor):
+    sales = _sales()
+    monitor.apply_sales(sales)
+    first_month, before = monitor._first_month, monitor._revenue.copy()
+    bottlenecks = monitor.bottlenecks()
+    current = month_of(date.today())
+    future = [
+        {'sale_id': 1001, 'firm_id': 2, 'sale_date': month_start(current + 1), 'total_amount': 50.0},
+        {'sale_id': 1002, 'firm_id': 3, 'sale_date': month_start(current + LOOKBACK + 5).isoformat(),
+         'total_amount': 50.0}
+    ]
+    
+    assert monitor.apply_sales(future) == 0
+    assert monitor.stats()['future_sales'] == 2
+    assert monitor._first_month == first_month
+    assert np.array_equal(monitor._revenue, before, equal_nan=True)
+    assert 3 not in monitor._row
+    assert monitor.bottlenecks() == bottlenecks
+    
+    # Current-month sales still land in the last column
+    assert monitor.apply_sales([{'sale_id': 1003, 'firm_id': 2, 'sale_date': date.today(),
+                                 'total_amount': 75.0}]) == 1
+    assert _window(monitor, 2)[-1] == 75.0
+    assert monitor.stats()['sales_skipped'] == 0
+
+
+def test_rows_older_than_the_window_are_skipped(monitor):
+    monitor.apply_sales(_sales())
+    old = month_start(month_of(date.today()) - LOOKBACK - 3)
+    
+    assert monitor.apply_sales([{'sale_id': 2000, 'firm_id': 1, 'sale_date': old, 'total_amount': 1.0}]) == 0
+    assert monitor.stats()['sales_skipped'] == 1
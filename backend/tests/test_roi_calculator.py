@@ -0,0 +1,122 @@
+"""
+The bulk ROI paths must match the per-firm calculate_roi results
+"""
+import sqlite3
+import pytest
+from config import config
+from database import DatabaseConnector
+from roi_calculator import ROICalculator
+
+SCHEMA = """
+    CREATE TABLE firm (firm_id INTEGER PRIMARY KEY, firm_name TEXT);
+    CREATE TABLE staff (staff_id INTEGER PRIMARY KEY, firm_id INTEGER, salary REAL);
+    CREATE TABLE sales (sale_id INTEGER PRIMARY KEY, firm_id INTEGER, sale_date TEXT,
+                        quantity INTEGER, total_amount REAL);
+    CREATE TABLE sales_monthly_rollup (firm_id INTEGER, period TEXT, transaction_count INTEGER,
+                                       total_quantity INTEGER, total_revenue REAL);
+    CREATE TABLE firm_staff_totals (firm_id INTEGER PRIMARY KEY, staff_count INTEGER, total_salary REAL);
+"""
+
+# firm_id -> (salaries, [(sale_date, total_amount), ...])
+FIRMS = {
+    1: ([50000.0, 62000.5], [('2023-11-03', 40000.0), ('2024-02-14', 90000.25), ('2024-05-30', 15000.0)]),
+    2: ([120000.0], [('2024-01-01', 30000.0), ('2024-06-30', 1000.0)]),
+    3: ([45000.0, 45000.0], []),  # No sales
+    4: ([], [('2024-03-10', 25000.0)]),  # No staff cost, revenue in the window
+    5: ([], []),  # No staff cost and no sales
+    6: ([80000.0], [('2022-07-01', 500000.0)]),  # Sales only outside the window
+    7: ([], [('2022-01-15', 1200.0)])  # No staff cost, revenue only outside the window
+}
+
+WINDOW = ('2024-01-01', '2024-06-30')
+
+
+class StubDB:
+    """sqlite stand-in for DatabaseConnector, formatting queries like pymysql"""
+    
+    execute_query_in = DatabaseConnector.execute_query_in
+    
+    def __init__(self):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+        for firm_id, (salaries, sales) in FIRMS.items():
+            self.connection.execute("INSERT INTO firm VALUES (?, ?)", (firm_id, f"Firm {firm_id}"))
+            self.connection.executemany("INSERT INTO staff (firm_id, salary) VALUES (?, ?)",
+                                        [(firm_id, salary) for salary in salaries])
+            self.connection.executemany(
+                "INSERT INTO sales (firm_id, sale_date, quantity, total_amount) VALUES (?, ?, 1, ?)",
+                [(firm_id, sale_date, amount) for sale_date, amount in sales])
+        self.connection.executescript("""
+            INSERT INTO sales_monthly_rollup
+            SELECT firm_id, substr(sale_date, 1, 7), COUNT(*), SUM(quantity), SUM(total_amount)
+            FROM sales GROUP BY firm_id, substr(sale_date, 1, 7);
+            INSERT INTO firm_staff_totals
+            SELECT firm_id, COUNT(*), SUM(salary) FROM staff GROUP BY firm_id;
+        """)
+        self.queries = 0
+    
+    def execute_query(self, query, params=None, cache=True):
+        # pymysql %-formats every query, so literal percent signs arrive as '%%'
+        self.queries += 1
+        query = query.replace('%s', '?').replace('%%', '%')
+        return [dict(row) for row in self.connection.execute(query, params or ())]
+
+
+@pytest.fixture(params=[False, True], ids=['raw', 'rollup'])
+def calculator(request, monkeypatch):
+    monkeypatch.setattr(config, 'USE_ROLLUP_TABLES', request.param)
+    return ROICalculator(StubDB())
+
+
+def _comparable(record):
+    return {key: value for key, value in record.items() if key != 'calculated_at'}
+
+
+def _assert_same(bulk, single):
+    assert bulk['firm_id'] == single['firm_id']
+    for key in ('revenue', 'costs', 'net_profit', 'roi_percentage'):
+        assert bulk[key] == pytest.approx(single[key]), key
+    assert bulk['is_negative'] == single['is_negative']
+
+
+@pytest.mark.parametrize('window', [(None, None), WINDOW, (WINDOW[0], None), (None, WINDOW[1])],
+                         ids=['all_time', 'window', 'from', 'until'])
+def test_all_firms_roi_matches_per_firm(calculator, window):
+    results = calculator.calculate_all_firms_roi(*window)
+    
+    assert sorted(result['firm_id'] for result in results) == sorted(FIRMS)
+    for result in results:
+        _assert_same(result, calculator.calculate_roi(result['firm_id'], *window))
+    roi = [result['roi_percentage'] for result in results]
+    assert roi == sorted(roi, reverse=True)
+
+
+@pytest.mark.parametrize('window', [(None, None), WINDOW], ids=['all_time', 'window'])
+def test_roi_bulk_matches_per_firm(calculator, window):
+    firm_ids = [5, 1, 3, 999, 4, 1]
+    bulk = calculator.calculate_roi_bulk(firm_ids, *window)
+    
+    assert bulk['missing'] == [999]
+    assert sorted(bulk['results']) == [1, 3, 4, 5]
+    for firm_id, result in bulk['results'].items():
+        _assert_same(result, calculator.calculate_roi(firm_id, *window))
+
+
+def test_edge_cases(calculator):
+    results = {result['firm_id']: _comparable(result) for result in calculator.calculate_all_firms_roi(*WINDOW)}
+    
+    # No sales: all cost, -100%
+    assert results[3]['revenue'] == 0 and results[3]['roi_percentage'] == pytest.approx(-100.0)
+    assert results[3]['is_negative']
+    # No staff cost: infinite ROI with revenue, zero without
+    assert results[4]['costs'] == 0 and results[4]['roi_percentage'] == float('inf')
+    assert results[5]['roi_percentage'] == 0 and not results[5]['is_negative']
+    assert results[7]['roi_percentage'] == 0
+    # Sales outside the window do not count
+    assert results[6]['revenue'] == 0
+
+
+def test_all_firms_roi_uses_constant_queries(calculator):
+    calculator.calculate_all_firms_roi(*WINDOW)
+    assert calculator.db.queries == 3
@@ -0,0 +1,124 @@
+-- Migration 001: firm x month sales rollup and firm staff totals
+-- MySQL 8.0+. Run with the mysql client (the triggers use DELIMITER):
+--   mysql -u root -p merger_roi_db < database/migrations/001_sales_rollups.sql
+-- Safe to re-run. Writes that land between creating the triggers and the
+-- backfill are absorbed by the backfill's upsert; run
+--   python backend/rollups.py verify
+-- afterwards and set USE_ROLLUP_TABLES=true once it reports no mismatches.
+
+-- Firm x month sales rollup
+CREATE TABLE IF NOT EXISTS sales_monthly_rollup (
+    firm_id INT NOT NULL,
+    period CHAR(7) NOT NULL,  -- 'YYYY-MM'
+    transaction_count INT NOT NULL DEFAULT 0,
+    total_quantity BIGINT NOT NULL DEFAULT 0,
+    total_revenue DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (firm_id, period),
+    FOREIGN KEY (firm_id) REFERENCES firm(firm_id) ON DELETE CASCADE,
+    INDEX idx_period (period)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Firm staff cost totals
+CREATE TABLE IF NOT EXISTS firm_staff_totals (
+    firm_id INT PRIMARY KEY,
+    staff_count INT NOT NULL DEFAULT 0,
+    total_salary DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    FOREIGN KEY (firm_id) REFERENCES firm(firm_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+DROP TRIGGER IF EXISTS trg_sales_rollup_insert;
+DROP TRIGGER IF EXISTS trg_sales_rollup_delete;
+DROP TRIGGER IF EXISTS trg_sales_rollup_update;
+DROP TRIGGER IF EXISTS trg_staff_totals_insert;
+DROP TRIGGER IF EXISTS trg_staff_totals_delete;
+DROP TRIGGER IF EXISTS trg_staff_totals_update;
+
+-- Rollup maintenance triggers (cascaded firm deletes are covered by the rollup foreign keys)
+CREATE TRIGGER trg_sales_rollup_insert AFTER INSERT ON sales FOR EACH ROW
+    INSERT INTO sales_monthly_rollup (firm_id, period, transaction_count, total_quantity, total_revenue)
+    VALUES (NEW.firm_id, DATE_FORMAT(NEW.sale_date, '%Y-%m'), 1, COALESCE(NEW.quantity, 0), NEW.total_amount)
+    ON DUPLICATE KEY UPDATE
+        transaction_count = transaction_count + 1,
+        total_quantity = total_quantity + VALUES(total_quantity),
+        total_revenue = total_revenue + VALUES(total_revenue);
+
+CREATE TRIGGER trg_sales_rollup_delete AFTER DELETE ON sales FOR EACH ROW
+    UPDATE sales_monthly_rollup
+    SET transaction_count = transaction_count - 1,
+        total_quantity = total_quantity - COALESCE(OLD.quantity, 0),
+        total_revenue = total_revenue - OLD.total_amount
+    WHERE firm_id = OLD.firm_id AND period = DATE_FORMAT(OLD.sale_date, '%Y-%m');
+
+DELIMITER //
+CREATE TRIGGER trg_sales_rollup_update AFTER UPDATE ON sales FOR EACH ROW
+BEGIN
+    UPDATE sales_monthly_rollup
+    SET transaction_count = transaction_count - 1,
+        total_quantity = total_quantity - COALESCE(OLD.quantity, 0),
+        total_revenue = total_revenue - OLD.total_amount
+    WHERE firm_id = OLD.firm_id AND period = DATE_FORMAT(OLD.sale_date, '%Y-%m');
+    INSERT INTO sales_monthly_rollup (firm_id, period, transaction_count, total_quantity, total_revenue)
+    VALUES (NEW.firm_id, DATE_FORMAT(NEW.sale_date, '%Y-%m'), 1, COALESCE(NEW.quantity, 0), NEW.total_amount)
+    ON DUPLICATE KEY UPDATE
+        transaction_count = transaction_count + 1,
+        total_quantity = total_quantity + VALUES(total_quantity),
+        total_revenue = total_revenue + VALUES(total_revenue);
+END//
+DELIMITER ;
+
+CREATE TRIGGER trg_staff_totals_insert AFTER INSERT ON staff FOR EACH ROW
+    INSERT INTO firm_staff_totals (firm_id, staff_count, total_salary)
+    VALUES (NEW.firm_id, 1, COALESCE(NEW.salary, 0))
+    ON DUPLICATE KEY UPDATE
+        staff_count = staff_count + 1,
+        total_salary = total_salary + VALUES(total_salary);
+
+CREATE TRIGGER trg_staff_totals_delete AFTER DELETE ON staff FOR EACH ROW
+    UPDATE firm_staff_totals
+    SET staff_count = staff_count - 1,
+        total_salary = total_salary - COALESCE(OLD.salary, 0)
+    WHERE firm_id = OLD.firm_id;
+
+DELIMITER //
+CREATE TRIGGER trg_staff_totals_update AFTER UPDATE ON staff FOR EACH ROW
+BEGIN
+    UPDATE firm_staff_totals
+    SET staff_count = staff_count - 1,
+        total_salary = total_salary - COALESCE(OLD.salary, 0)
+    WHERE firm_id = OLD.firm_id;
+    INSERT INTO firm_staff_totals (firm_id, staff_count, total_salary)
+    VALUES (NEW.firm_id, 1, COALESCE(NEW.salary, 0))
+    ON DUPLICATE KEY UPDATE
+        staff_count = staff_count + 1,
+        total_salary = total_salary + VALUES(total_salary);
+END//
+DELIMITER ;
+
+-- Backfill from the raw tables
+INSERT INTO sales_monthly_rollup (firm_id, period, transaction_count, total_quantity, total_revenue)
+SELECT firm_id, DATE_FORMAT(sale_date, '%Y-%m'), COUNT(*), COALESCE(SUM(quantity), 0), SUM(total_amount)
+FROM sales
+GROUP BY firm_id, DATE_FORMAT(sale_date, '%Y-%m')
+ON DUPLICATE KEY UPDATE
+    transaction_count = VALUES(transaction_count),
+    total_quantity = VALUES(total_quantity),
+    total_revenue = VALUES(total_revenue);
+
+INSERT INTO firm_staff_totals (firm_id, staff_count, total_salary)
+SELECT firm_id, COUNT(*), COALESCE(SUM(salary), 0)
+FROM staff
+GROUP BY firm_id
+ON DUPLICATE KEY UPDATE
+    staff_count = VALUES(staff_count),
+    total_salary = VALUES(total_salary);
+
+-- Monthly sales view (served from the rollup table)
+CREATE OR REPLACE VIEW v_monthly_sales AS
+SELECT 
+    firm_id,
+    period,
+    transaction_count,
+    total_quantity,
+    total_revenue
+FROM sales_monthly_rollup
+WHERE transaction_count > 0;
@@ -0,0 +1,23 @@
+-- Migration 002: composite covering indexes for the analyzer queries
+-- MySQL 8.0+:
+--   mysql -u root -p merger_roi_db < database/migrations/002_covering_indexes.sql
+-- Not re-runnable: check SHOW INDEX FROM sales / staff if it was partly applied.
+-- The single-column firm_id and sale_date indexes are dropped because they
+-- are prefixes of the new ones (which also serve the firm_id foreign keys).
+-- Check the resulting plans with: python backend/index_advisor.py
+
+-- SUM(total_amount) / COUNT(*) / SUM(quantity) WHERE firm_id = ? [AND sale_date BETWEEN ? AND ?],
+-- and the same grouped by firm_id, read from the index alone
+ALTER TABLE sales
+    ADD INDEX idx_firm_date_amount (firm_id, sale_date, total_amount, quantity),
+    ADD INDEX idx_date_firm_amount (sale_date, firm_id, total_amount),
+    DROP INDEX idx_firm_id,
+    DROP INDEX idx_sale_date,
+    ALGORITHM=INPLACE, LOCK=NONE;
+
+-- SUM(salary) WHERE firm_id = ?, and GROUP BY firm_id, department, role
+-- with salary and performance_score, read from the index alone
+ALTER TABLE staff
+    ADD INDEX idx_firm_dept_role_pay (firm_id, department, role, salary, performance_score),
+    DROP INDEX idx_firm_id,
+    ALGORITHM=INPLACE, LOCK=NONE;
@@ -0,0 +1,33 @@
+-- Migration 003: bulk sales ingest checkpoints and rollup trigger bypass
+-- MySQL 8.0+, after 001. Run with the mysql client (the trigger uses DELIMITER):
+--   mysql -u root -p merger_roi_db < database/migrations/003_bulk_ingest.sql
+-- Safe to re-run.
+
+-- Progress of bulk sales loads, committed with each loaded batch
+CREATE TABLE IF NOT EXISTS ingest_checkpoint (
+    source VARCHAR(255) PRIMARY KEY,
+    source_size BIGINT NOT NULL,
+    records_done BIGINT NOT NULL DEFAULT 0,
+    rows_inserted BIGINT NOT NULL DEFAULT 0,
+    rows_rejected BIGINT NOT NULL DEFAULT 0,
+    completed BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Bulk ingest (backend/sales_ingest.py) sets @skip_sales_rollup_trigger and upserts
+-- its own per-transaction totals instead of one rollup row per inserted sale
+DROP TRIGGER IF EXISTS trg_sales_rollup_insert;
+
+DELIMITER //
+CREATE TRIGGER trg_sales_rollup_insert AFTER INSERT ON sales FOR EACH ROW
+BEGIN
+    IF @skip_sales_rollup_trigger IS NULL THEN
+        INSERT INTO sales_monthly_rollup (firm_id, period, transaction_count, total_quantity, total_revenue)
+        VALUES (NEW.firm_id, DATE_FORMAT(NEW.sale_date, '%Y-%m'), 1, COALESCE(NEW.quantity, 0), NEW.total_amount)
+        ON DUPLICATE KEY UPDATE
+            transaction_count = transaction_count + 1,
+            total_quantity = total_quantity + VALUES(total_quantity),
+            total_revenue = total_revenue + VALUES(total_revenue);
+    END IF;
+END//
+DELIMITER ;
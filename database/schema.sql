@@ -2,6 +2,9 @@
 -- MySQL 8.0+
 
 -- Drop tables if they exist (for clean setup)
+DROP TABLE IF EXISTS ingest_checkpoint;
+DROP TABLE IF EXISTS sales_monthly_rollup;
+DROP TABLE IF EXISTS firm_staff_totals;
 DROP TABLE IF EXISTS sales;
 DROP TABLE IF EXISTS staff;
 DROP TABLE IF EXISTS firm;
@@ -33,7 +36,8 @@ CREATE TABLE staff (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (firm_id) REFERENCES firm(firm_id) ON DELETE CASCADE,
-    INDEX idx_firm_id (firm_id),
+    -- Covers per-firm salary totals and the firm x department x role grouping
+    INDEX idx_firm_dept_role_pay (firm_id, department, role, salary, performance_score),
     INDEX idx_department (department),
     INDEX idx_role (role)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -52,12 +56,117 @@ CREATE TABLE sales (
     customer_segment VARCHAR(100),
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (firm_id) REFERENCES firm(firm_id) ON DELETE CASCADE,
-    INDEX idx_firm_id (firm_id),
-    INDEX idx_sale_date (sale_date),
+    -- Covers per-firm revenue/volume totals, optionally within a date window
+    INDEX idx_firm_date_amount (firm_id, sale_date, total_amount, quantity),
+    -- Covers date-window scans across all firms (monthly series, windowed ROI)
+    INDEX idx_date_firm_amount (sale_date, firm_id, total_amount),
     INDEX idx_territory (territory),
     INDEX idx_product_id (product_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
+-- Rollup tables, kept current by the triggers below.
+-- Rebuild or verify them against the raw tables with: python backend/rollups.py verify|rebuild
+
+-- Firm x month sales rollup
+CREATE TABLE sales_monthly_rollup (
+    firm_id INT NOT NULL,
+    period CHAR(7) NOT NULL,  -- 'YYYY-MM'
+    transaction_count INT NOT NULL DEFAULT 0,
+    total_quantity BIGINT NOT NULL DEFAULT 0,
+    total_revenue DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (firm_id, period),
+    FOREIGN KEY (firm_id) REFERENCES firm(firm_id) ON DELETE CASCADE,
+    INDEX idx_period (period)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Firm staff cost totals
+CREATE TABLE firm_staff_totals (
+    firm_id INT PRIMARY KEY,
+    staff_count INT NOT NULL DEFAULT 0,
+    total_salary DECIMAL(18, 2) NOT NULL DEFAULT 0,
+    FOREIGN KEY (firm_id) REFERENCES firm(firm_id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Progress of bulk sales loads, committed with each loaded batch
+CREATE TABLE ingest_checkpoint (
+    source VARCHAR(255) PRIMARY KEY,
+    source_size BIGINT NOT NULL,
+    records_done BIGINT NOT NULL DEFAULT 0,
+    rows_inserted BIGINT NOT NULL DEFAULT 0,
+    rows_rejected BIGINT NOT NULL DEFAULT 0,
+    completed BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Rollup maintenance triggers (cascaded firm deletes are covered by the rollup foreign keys)
+-- Bulk ingest (backend/sales_ingest.py) sets @skip_sales_rollup_trigger and upserts
+-- its own per-transaction totals instead of one rollup row per inserted sale
+DELIMITER //
+CREATE TRIGGER trg_sales_rollup_insert AFTER INSERT ON sales FOR EACH ROW
+BEGIN
+    IF @skip_sales_rollup_trigger IS NULL THEN
+        INSERT INTO sales_monthly_rollup (firm_id, period, transaction_count, total_quantity, total_revenue)
+        VALUES (NEW.firm_id, DATE_FORMAT(NEW.sale_date, '%Y-%m'), 1, COALESCE(NEW.quantity, 0), NEW.total_amount)
+        ON DUPLICATE KEY UPDATE
+            transaction_count = transaction_count + 1,
+            total_quantity = total_quantity + VALUES(total_quantity),
+            total_revenue = total_revenue + VALUES(total_revenue);
+    END IF;
+END//
+DELIMITER ;
+
+CREATE TRIGGER trg_sales_rollup_delete AFTER DELETE ON sales FOR EACH ROW
+    UPDATE sales_monthly_rollup
+    SET transaction_count = transaction_count - 1,
+        total_quantity = total_quantity - COALESCE(OLD.quantity, 0),
+        total_revenue = total_revenue - OLD.total_amount
+    WHERE firm_id = OLD.firm_id AND period = DATE_FORMAT(OLD.sale_date, '%Y-%m');
+
+DELIMITER //
+CREATE TRIGGER trg_sales_rollup_update AFTER UPDATE ON sales FOR EACH ROW
+BEGIN
+    UPDATE sales_monthly_rollup
+    SET transaction_count = transaction_count - 1,
+        total_quantity = total_quantity - COALESCE(OLD.quantity, 0),
+        total_revenue = total_revenue - OLD.total_amount
+    WHERE firm_id = OLD.firm_id AND period = DATE_FORMAT(OLD.sale_date, '%Y-%m');
+    INSERT INTO sales_monthly_rollup (firm_id, period, transaction_count, total_quantity, total_revenue)
+    VALUES (NEW.firm_id, DATE_FORMAT(NEW.sale_date, '%Y-%m'), 1, COALESCE(NEW.quantity, 0), NEW.total_amount)
+    ON DUPLICATE KEY UPDATE
+        transaction_count = transaction_count + 1,
+        total_quantity = total_quantity + VALUES(total_quantity),
+        total_revenue = total_revenue + VALUES(total_revenue);
+END//
+DELIMITER ;
+
+CREATE TRIGGER trg_staff_totals_insert AFTER INSERT ON staff FOR EACH ROW
+    INSERT INTO firm_staff_totals (firm_id, staff_count, total_salary)
+    VALUES (NEW.firm_id, 1, COALESCE(NEW.salary, 0))
+    ON DUPLICATE KEY UPDATE
+        staff_count = staff_count + 1,
+        total_salary = total_salary + VALUES(total_salary);
+
+CREATE TRIGGER trg_staff_totals_delete AFTER DELETE ON staff FOR EACH ROW
+    UPDATE firm_staff_totals
+    SET staff_count = staff_count - 1,
+        total_salary = total_salary - COALESCE(OLD.salary, 0)
+    WHERE firm_id = OLD.firm_id;
+
+DELIMITER //
+CREATE TRIGGER trg_staff_totals_update AFTER UPDATE ON staff FOR EACH ROW
+BEGIN
+    UPDATE firm_staff_totals
+    SET staff_count = staff_count - 1,
+        total_salary = total_salary - COALESCE(OLD.salary, 0)
+    WHERE firm_id = OLD.firm_id;
+    INSERT INTO firm_staff_totals (firm_id, staff_count, total_salary)
+    VALUES (NEW.firm_id, 1, COALESCE(NEW.salary, 0))
+    ON DUPLICATE KEY UPDATE
+        staff_count = staff_count + 1,
+        total_salary = total_salary + VALUES(total_salary);
+END//
+DELIMITER ;
+
 -- Create views for common queries
 
 -- Firm summary view
@@ -80,13 +189,13 @@ LEFT JOIN (
 ) sales ON f.firm_id = sales.firm_id
 GROUP BY f.firm_id, f.firm_name, f.industry, f.total_capital;
 
--- Monthly sales view
+-- Monthly sales view (served from the rollup table)
 CREATE OR REPLACE VIEW v_monthly_sales AS
 SELECT 
     firm_id,
-    DATE_FORMAT(sale_date, '%Y-%m') as period,
-    COUNT(*) as transaction_count,
-    SUM(quantity) as total_quantity,
-    SUM(total_amount) as total_revenue
-FROM sales
-GROUP BY firm_id, DATE_FORMAT(sale_date, '%Y-%m');
+    period,
+    transaction_count,
+    total_quantity,
+    total_revenue
+FROM sales_monthly_rollup
+WHERE transaction_count > 0;
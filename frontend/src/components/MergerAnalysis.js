@@ -10,6 +10,8 @@ function MergerAnalysis() {
   const [selectedFirmA, setSelectedFirmA] = useState(null);
   const [selectedFirmB, setSelectedFirmB] = useState(null);
   const [analysis, setAnalysis] = useState(null);
+  const [simulation, setSimulation] = useState(null);
+  const [simulating, setSimulating] = useState(false);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
 
@@ -64,6 +66,7 @@ function MergerAnalysis() {
 
     setLoading(true);
     setError(null);
+    setSimulation(null);
 
     try {
       const result = await api.analyzeMerger(selectedFirmA.firm_id, selectedFirmB.firm_id);
@@ -75,6 +78,20 @@ function MergerAnalysis() {
     }
   };
 
+  const runSimulation = async () => {
+    setSimulating(true);
+    setError(null);
+
+    try {
+      const result = await api.simulateMerger(selectedFirmA.firm_id, selectedFirmB.firm_id);
+      setSimulation(result);
+    } catch (err) {
+      setError('Failed to run simulation: ' + err.message);
+    } finally {
+      setSimulating(false);
+    }
+  };
+
   const formatCurrency = (value) => {
     return new Intl.NumberFormat('en-US', {
       style: 'currency',
@@ -221,6 +238,49 @@ function MergerAnalysis() {
               <p>Costs: {formatCurrency(analysis.firm_b.costs)}</p>
             </div>
           </div>
+
+          <div className="simulation-section">
+            <button
+              className="analyze-button"
+              onClick={runSimulation}
+              disabled={simulating}
+            >
+              {simulating ? 'Simulating...' : 'Run Risk Simulation'}
+            </button>
+
+            {simulation && (
+              <>
+                <div className="result-header">
+                  <h4>Monte Carlo Simulation ({simulation.n_draws.toLocaleString()} scenarios)</h4>
+                  <span className={`recommendation ${simulation.recommendation.toLowerCase()}`}>
+                    {simulation.recommendation} ({(simulation.confidence * 100).toFixed(0)}% confidence)
+                  </span>
+                </div>
+
+                <div className="metrics-grid">
+                  <div className="metric-card">
+                    <div className="metric-label">Pessimistic ROI (P5)</div>
+                    <div className="metric-value">{simulation.roi_percentiles.p5.toFixed(2)}%</div>
+                  </div>
+
+                  <div className="metric-card highlight">
+                    <div className="metric-label">Median ROI (P50)</div>
+                    <div className="metric-value">{simulation.roi_percentiles.p50.toFixed(2)}%</div>
+                  </div>
+
+                  <div className="metric-card">
+                    <div className="metric-label">Optimistic ROI (P95)</div>
+                    <div className="metric-value">{simulation.roi_percentiles.p95.toFixed(2)}%</div>
+                  </div>
+
+                  <div className="metric-card">
+                    <div className="metric-label">Probability of Loss</div>
+                    <div className="metric-value">{(simulation.probability_negative_roi * 100).toFixed(1)}%</div>
+                  </div>
+                </div>
+              </>
+            )}
+          </div>
         </div>
       )}
     </div>
@@ -54,6 +54,13 @@ const api = {
     });
     return response.data;
   },
+
+  simulateMerger: async (firmAId, firmBId, nDraws = 100000) => {
+    const response = await apiClient.post('/api/merger/simulate', null, {
+      params: { firm_a_id: firmAId, firm_b_id: firmBId, n_draws: nDraws }
+    });
+    return response.data;
+  },
 };
 
 export default api;